@@ -0,0 +1,123 @@
+"""
+Lookup tables for the GameBoy cpu's 8 bit arithmetic and logic.
+
+The 8 bit add, subtract, AND, OR, XOR, increment, decrement and DAA
+operations are precomputed once at import: results in one table and the
+resulting flags in a second, packed the way the F register holds them
+(Z 0x80, N 0x40, H 0x20, C 0x10). An ALU instruction is then a lookup of
+its result and a lookup of its flags instead of computing carries and
+comparisons every time. CP uses the flags of SUB.
+
+The two operand tables are indexed with index(a, value, carry), which fits
+every combination of A, the operand and the carry in into 17 bits. AND, OR
+and XOR take no carry, so their tables stop at 16 bits.
+"""
+__author__ = 'Clayton Powell'
+
+Z = 0x80
+N = 0x40
+H = 0x20
+C = 0x10
+
+
+def index(a, value, carry=0):
+    """
+    Index into ADD, ADD_FLAGS, SUB and SUB_FLAGS.
+
+    Parameters
+    ----------
+    a : int
+        register A
+    value : int
+        8 bit operand
+    carry : int
+        carry in, 1 for ADC and SBC with the carry flag set, else 0
+    """
+    return (carry << 16) | (a << 8) | value
+
+
+def _add():
+    results = bytearray(0x20000)
+    flags = bytearray(0x20000)
+    for carry in (0, 1):
+        for a in range(256):
+            for value in range(256):
+                i = (carry << 16) | (a << 8) | value
+                total = a + value + carry
+                results[i] = total & 0xff
+                flags[i] = ((0 if total & 0xff else Z) |
+                            (H if (a & 0xf) + (value & 0xf) + carry > 0xf else 0) |
+                            (C if total > 0xff else 0))
+    return bytes(results), bytes(flags)
+
+
+def _sub():
+    results = bytearray(0x20000)
+    flags = bytearray(0x20000)
+    for carry in (0, 1):
+        for a in range(256):
+            for value in range(256):
+                i = (carry << 16) | (a << 8) | value
+                total = a - value - carry
+                results[i] = total & 0xff
+                flags[i] = ((0 if total & 0xff else Z) | N |
+                            (H if (a & 0xf) - (value & 0xf) - carry < 0 else 0) |
+                            (C if total < 0 else 0))
+    return bytes(results), bytes(flags)
+
+
+def _logic(operator, half):
+    """
+    Results and flags of a bitwise operation, indexed by index(a, value).
+    Only Z depends on the result, H is set by AND alone.
+    """
+    results = bytes(operator(a, value) for a in range(256)
+                    for value in range(256))
+    flags = results.translate(bytes([Z | half]) + bytes([half]) * 255)
+    return results, flags
+
+
+def _daa():
+    """
+    DAA results and flags indexed by (N, H, C flags << 8) | A, the carry
+    flag out is the only flag besides Z that DAA sets from the result.
+    """
+    results = bytearray(0x800)
+    flags = bytearray(0x800)
+    for nhc in range(8):
+        sub, half, carry = nhc >> 2, (nhc >> 1) & 1, nhc & 1
+        for a in range(256):
+            value = a
+            carry_out = carry
+            if not sub:
+                if carry or value > 0x99:
+                    value += 0x60
+                    carry_out = 1
+                if half or (value & 0xf) > 0x9:
+                    value += 0x06
+            else:
+                if carry:
+                    value -= 0x60
+                if half:
+                    value -= 0x06
+            value &= 0xff
+            i = (nhc << 8) | a
+            results[i] = value
+            flags[i] = (0 if value else Z) | (sub and N) | (C if carry_out else 0)
+    return bytes(results), bytes(flags)
+
+
+ADD, ADD_FLAGS = _add()
+SUB, SUB_FLAGS = _sub()
+AND, AND_FLAGS = _logic(int.__and__, H)
+OR, OR_FLAGS = _logic(int.__or__, 0)
+XOR, XOR_FLAGS = _logic(int.__xor__, 0)
+DAA, DAA_FLAGS = _daa()
+
+# one operand tables, indexed by the value before the operation
+INC = bytes((v + 1) & 0xff for v in range(256))
+INC_FLAGS = bytes((0 if (v + 1) & 0xff else Z) | (H if v & 0xf == 0xf else 0)
+                  for v in range(256))
+DEC = bytes((v - 1) & 0xff for v in range(256))
+DEC_FLAGS = bytes((0 if (v - 1) & 0xff else Z) | N | (H if v & 0xf == 0 else 0)
+                  for v in range(256))
@@ -0,0 +1,486 @@
+"""
+Audio processing unit for the GameBoy emulator.
+
+The four sound channels (two square waves, the first with a frequency sweep,
+the wave channel and the noise channel) and the frame sequencer clocking
+their length counters, envelopes and sweep are not stepped with the cpu.
+A write to a sound register only stores the value and appends it to a log
+with the cycle it happened at. Samples are made when the frontend asks for
+them with pull(): the time since the last pull is cut at every logged write
+and every frame sequencer step, and in between those points nothing about a
+channel changes, so each stretch is synthesised for all its samples at once
+with NumPy. The frontend should pull about once a frame, since the log
+and the samples are kept until it does.
+
+Channels are sampled every 4 cycles, so pull() returns float32 stereo
+samples at RATE (1048576 Hz), in -1 to 1. Turning that into 44.1 or 48 kHz
+is left to the output stage. Channels that are off are silent; a channel
+that is on goes through its DAC, so it can hold a DC offset.
+"""
+__author__ = 'Clayton Powell'
+import abc
+import functools
+import numpy as np
+
+CLOCK = 4194304
+CYCLES_PER_SAMPLE = 4
+RATE = CLOCK // CYCLES_PER_SAMPLE
+# the frame sequencer runs at 512 Hz
+SEQUENCER_CYCLES = 8192
+
+# Square wave duty patterns, 12.5%, 25%, 50% and 75%
+DUTY = np.array([[0, 0, 0, 0, 0, 0, 0, 1],
+                 [1, 0, 0, 0, 0, 0, 0, 1],
+                 [1, 0, 0, 0, 0, 1, 1, 1],
+                 [0, 1, 1, 1, 1, 1, 1, 0]], dtype=np.int16)
+
+# Noise clock divisors for NR43 bits 0-2
+DIVISORS = (8, 16, 32, 48, 64, 80, 96, 112)
+
+# Bits that always read as 1, for 0xFF10-0xFF3F
+READ_MASK = (0x80, 0x3f, 0x00, 0xff, 0xbf,
+             0xff, 0x3f, 0x00, 0xff, 0xbf,
+             0x7f, 0xff, 0x9f, 0xff, 0xbf,
+             0xff, 0xff, 0x00, 0x00, 0xbf,
+             0x00, 0x00, 0x70) + (0xff,) * 9 + (0x00,) * 16
+
+
+def _lfsr(width7):
+    """
+    Output of the noise channel's LFSR over one period, from the state a
+    trigger leaves it in.
+    """
+    lfsr = 0x7fff
+    out = []
+    for _ in range(127 if width7 else 32767):
+        bit = (lfsr ^ (lfsr >> 1)) & 1
+        lfsr = (lfsr >> 1) | (bit << 14)
+        if width7:
+            lfsr = (lfsr & ~0x40) | (bit << 6)
+        out.append(~lfsr & 1)
+    return np.array(out, dtype=np.int16)
+
+
+LFSR15 = _lfsr(False)
+LFSR7 = _lfsr(True)
+
+
+class Channel(abc.ABC):
+    """
+    Channel class with the state every channel shares: on/off, the DAC, the
+    length counter and the phase of its waveform in cycles.
+
+    Parameters
+    ----------
+    length : int
+        length counter reload, 64 or 256 for the wave channel
+    """
+
+    # waveform steps before it repeats
+    steps = 8
+
+    def __init__(self, length=64):
+        self.max_length = length
+        self.enabled = False
+        self.dac = False
+        self.length = 0
+        self.length_enable = False
+        self.frequency = 0
+        self.phase = 0
+
+    @property
+    @abc.abstractmethod
+    def period(self):
+        """
+        Cycles per waveform step.
+        """
+
+    def advance(self, cycles):
+        self.phase = (self.phase + cycles) % (self.period * self.steps)
+
+    def set_frequency(self, frequency):
+        # keep the waveform step, restart it at the new rate
+        step = self.phase // self.period
+        self.frequency = frequency
+        self.phase = step * self.period
+
+    def write_length(self, value):
+        self.length = self.max_length - value
+
+    def write_control(self, value):
+        """
+        NRx4, frequency high bits, length enable and trigger.
+        """
+        self.set_frequency((self.frequency & 0xff) | ((value & 0x07) << 8))
+        self.length_enable = bool(value & 0x40)
+        if value & 0x80:
+            self.trigger()
+
+    def trigger(self):
+        self.enabled = self.dac
+        if self.length == 0:
+            self.length = self.max_length
+        self.phase = 0
+
+    def clock_length(self):
+        if self.length_enable and self.length:
+            self.length -= 1
+            if self.length == 0:
+                self.enabled = False
+
+
+class Envelope(Channel):
+    """
+    Envelope class, a channel with a volume envelope (NRx2).
+    """
+
+    def __init__(self):
+        super(Envelope, self).__init__()
+        self.volume = 0
+        self.initial_volume = 0
+        self.increase = False
+        self.envelope_period = 0
+        self.envelope_timer = 0
+
+    def write_envelope(self, value):
+        self.initial_volume = value >> 4
+        self.increase = bool(value & 0x08)
+        self.envelope_period = value & 0x07
+        self.dac = bool(value & 0xf8)
+        if not self.dac:
+            self.enabled = False
+
+    def trigger(self):
+        super(Envelope, self).trigger()
+        self.volume = self.initial_volume
+        self.envelope_timer = self.envelope_period
+
+    def clock_envelope(self):
+        if not self.envelope_period:
+            return
+        self.envelope_timer -= 1
+        if self.envelope_timer <= 0:
+            self.envelope_timer = self.envelope_period
+            if self.increase and self.volume < 15:
+                self.volume += 1
+            elif not self.increase and self.volume > 0:
+                self.volume -= 1
+
+
+class Square(Envelope):
+    """
+    Square class, square wave channels 1 and 2, channel 1 with the sweep.
+    """
+
+    def __init__(self):
+        super(Square, self).__init__()
+        self.duty = 0
+        self.sweep_period = 0
+        self.sweep_negate = False
+        self.sweep_shift = 0
+        self.sweep_timer = 0
+        self.sweep_on = False
+        self.shadow = 0
+
+    @property
+    def period(self):
+        return (2048 - self.frequency) * 4
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.sweep_period = (value >> 4) & 0x07
+            self.sweep_negate = bool(value & 0x08)
+            self.sweep_shift = value & 0x07
+        elif reg == 1:
+            self.duty = value >> 6
+            self.write_length(value & 0x3f)
+        elif reg == 2:
+            self.write_envelope(value)
+        elif reg == 3:
+            self.set_frequency((self.frequency & 0x700) | value)
+        else:
+            self.write_control(value)
+
+    def trigger(self):
+        super(Square, self).trigger()
+        self.shadow = self.frequency
+        self.sweep_timer = self.sweep_period or 8
+        self.sweep_on = bool(self.sweep_period or self.sweep_shift)
+        if self.sweep_shift:
+            self._sweep_target()
+
+    def _sweep_target(self):
+        change = self.shadow >> self.sweep_shift
+        target = self.shadow - change if self.sweep_negate else self.shadow + change
+        if target > 2047:
+            self.enabled = False
+        return target
+
+    def clock_sweep(self):
+        self.sweep_timer -= 1
+        if self.sweep_timer > 0:
+            return
+        self.sweep_timer = self.sweep_period or 8
+        if self.sweep_on and self.sweep_period:
+            target = self._sweep_target()
+            if target <= 2047 and self.sweep_shift:
+                self.shadow = target
+                self.set_frequency(target)
+                self._sweep_target()
+
+    def synth(self, offsets):
+        steps = ((offsets + self.phase) // self.period) & 7
+        return DUTY[self.duty][steps] * self.volume
+
+
+class Wave(Channel):
+    """
+    Wave class, channel 3 playing the 32 4 bit samples of wave RAM.
+    """
+
+    steps = 32
+
+    def __init__(self):
+        super(Wave, self).__init__(length=256)
+        self.shift = 4
+        self.ram = np.zeros(32, dtype=np.int16)
+
+    @property
+    def period(self):
+        return (2048 - self.frequency) * 2
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.dac = bool(value & 0x80)
+            if not self.dac:
+                self.enabled = False
+        elif reg == 1:
+            self.write_length(value)
+        elif reg == 2:
+            # 0 mutes, 1-3 play at 100%, 50% and 25%
+            self.shift = (4, 0, 1, 2)[(value >> 5) & 3]
+        elif reg == 3:
+            self.set_frequency((self.frequency & 0x700) | value)
+        else:
+            self.write_control(value)
+
+    def write_ram(self, index, value):
+        self.ram[index * 2] = value >> 4
+        self.ram[index * 2 + 1] = value & 0x0f
+
+    def synth(self, offsets):
+        steps = ((offsets + self.phase) // self.period) & 31
+        return self.ram[steps] >> self.shift
+
+
+class Noise(Envelope):
+    """
+    Noise class, channel 4 playing the output of a 15 or 7 bit LFSR.
+    """
+
+    def __init__(self):
+        super(Noise, self).__init__()
+        self.divisor = 8
+        self.shift = 0
+        self.table = LFSR15
+
+    @property
+    def period(self):
+        return self.divisor << self.shift
+
+    @property
+    def steps(self):
+        return len(self.table)
+
+    def write(self, reg, value):
+        if reg == 1:
+            self.write_length(value & 0x3f)
+        elif reg == 2:
+            self.write_envelope(value)
+        elif reg == 3:
+            step = self.phase // self.period
+            self.shift = value >> 4
+            self.divisor = DIVISORS[value & 0x07]
+            self.table = LFSR7 if value & 0x08 else LFSR15
+            self.phase = (step % len(self.table)) * self.period
+        elif reg == 4:
+            self.length_enable = bool(value & 0x40)
+            if value & 0x80:
+                self.trigger()
+
+    def synth(self, offsets):
+        steps = ((offsets + self.phase) // self.period) % len(self.table)
+        return self.table[steps] * self.volume
+
+
+class APU(object):
+    """
+    APU class that maps the sound registers and synthesises their output.
+
+    Parameters
+    ----------
+    mmu : mmu.MMU
+        mmu the registers (0xFF10-0xFF26) and wave RAM (0xFF30-0xFF3F) are
+        mapped into
+    scheduler : scheduler.Scheduler
+        scheduler whose cycle counter timestamps the writes
+    """
+
+    def __init__(self, mmu, scheduler):
+        self.scheduler = scheduler
+        # register values as the cpu sees them, updated as they are written
+        self.registers = bytearray(0x30)
+        self.powered = True
+        # (cycle, address, value) of the writes not applied yet
+        self.writes = []
+        # state of everything below as of cycle self.time
+        self.time = scheduler.now
+        self.sequencer_step = 0
+        self.channels = (Square(), Square(), Wave(), Noise())
+        self.power = True
+        self.nr50 = 0x77
+        self.nr51 = 0xf3
+        self.registers[0x14] = self.nr50
+        self.registers[0x15] = self.nr51
+        self._chunks = []
+        for addr in range(0xff10, 0xff40):
+            mmu.io_read[addr] = functools.partial(self.read, addr)
+            mmu.io_write[addr] = functools.partial(self.write, addr)
+
+    def read(self, addr):
+        index = addr - 0xff10
+        if addr == 0xff26:
+            # which channels are on depends on their length counters
+            self.update()
+            status = sum(1 << i for i, c in enumerate(self.channels) if c.enabled)
+            return 0x70 | (0x80 if self.powered else 0) | status
+        return self.registers[index] | READ_MASK[index]
+
+    def write(self, addr, value):
+        index = addr - 0xff10
+        if addr == 0xff26:
+            self.powered = bool(value & 0x80)
+            if not self.powered:
+                self.registers[:0x16] = bytes(0x16)
+        elif not self.powered and addr < 0xff30:
+            # ignored while the APU is off
+            return
+        else:
+            self.registers[index] = value
+        self.writes.append((self.scheduler.now, addr, value))
+
+    def _apply(self, addr, value):
+        """
+        Applies a logged write to the channels.
+        """
+        index = addr - 0xff10
+        if addr >= 0xff30:
+            self.channels[2].write_ram(addr - 0xff30, value)
+        elif addr == 0xff26:
+            power = bool(value & 0x80)
+            if self.power and not power:
+                # everything but wave RAM is cleared
+                ram = self.channels[2].ram
+                self.channels = (Square(), Square(), Wave(), Noise())
+                self.channels[2].ram = ram
+                self.nr50 = self.nr51 = 0
+            elif power and not self.power:
+                self.sequencer_step = 0
+            self.power = power
+        elif not self.power:
+            return
+        elif addr == 0xff24:
+            self.nr50 = value
+        elif addr == 0xff25:
+            self.nr51 = value
+        elif index < 0x14 and index != 0x05:
+            channel, reg = divmod(index, 5)
+            self.channels[channel].write(reg, value)
+
+    def _sequencer(self):
+        """
+        One 512 Hz frame sequencer step.
+        """
+        step = self.sequencer_step
+        self.sequencer_step = (step + 1) & 7
+        if not self.power:
+            return
+        if step & 1 == 0:
+            for channel in self.channels:
+                channel.clock_length()
+        if step in (2, 6):
+            self.channels[0].clock_sweep()
+        if step == 7:
+            for channel in (self.channels[0], self.channels[1], self.channels[3]):
+                channel.clock_envelope()
+
+    def _synth(self, start, end):
+        """
+        Samples between two cycles while no channel changes.
+        """
+        first = -(-start // CYCLES_PER_SAMPLE)
+        last = -(-end // CYCLES_PER_SAMPLE)
+        if last > first:
+            offsets = np.arange(first * CYCLES_PER_SAMPLE - start,
+                                last * CYCLES_PER_SAMPLE - start,
+                                CYCLES_PER_SAMPLE, dtype=np.int64)
+            samples = np.zeros((last - first, 2), dtype=np.float32)
+            for i, channel in enumerate(self.channels):
+                if not channel.enabled or not self.nr51 & (0x11 << i):
+                    continue
+                # the DAC maps 0-15 to 1 to -1
+                analog = 1.0 - channel.synth(offsets).astype(np.float32) / 7.5
+                if self.nr51 & (0x10 << i):
+                    samples[:, 0] += analog
+                if self.nr51 & (0x01 << i):
+                    samples[:, 1] += analog
+            # four channels at master volume 1-8 each side
+            samples[:, 0] *= (((self.nr50 >> 4) & 7) + 1) / 32.0
+            samples[:, 1] *= ((self.nr50 & 7) + 1) / 32.0
+            self._chunks.append(samples)
+        for channel in self.channels:
+            channel.advance(end - start)
+
+    def update(self, until=None):
+        """
+        Synthesises the samples up to a cycle, applying the logged writes and
+        frame sequencer steps on the way.
+
+        Parameters
+        ----------
+        until : int
+            cycle to synthesise up to, the current cycle if None
+        """
+        if until is None:
+            until = self.scheduler.now
+        writes = self.writes
+        i = 0
+        while True:
+            while i < len(writes) and writes[i][0] <= self.time:
+                self._apply(writes[i][1], writes[i][2])
+                i += 1
+            if self.time >= until:
+                break
+            step = (self.time // SEQUENCER_CYCLES + 1) * SEQUENCER_CYCLES
+            end = min(step, until, writes[i][0] if i < len(writes) else until)
+            self._synth(self.time, end)
+            self.time = end
+            if end == step:
+                self._sequencer()
+        del writes[:i]
+
+    def pull(self):
+        """
+        Samples made since the last pull.
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 array of shape (n, 2), left and right at RATE
+        """
+        self.update()
+        chunks = self._chunks
+        self._chunks = []
+        if not chunks:
+            return np.zeros((0, 2), dtype=np.float32)
+        return np.concatenate(chunks)
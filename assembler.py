@@ -0,0 +1,389 @@
+"""
+Assembler and ROM builder for the GameBoy emulator.
+
+Turns instruction sequences written as Python strings into machine code and
+wraps them into valid cartridge images (logo, header, checksums, entry point
+at 0x100), so benchmarks and tests can generate the ROMs they need instead
+of shipping binaries.
+
+Syntax follows the mnemonics in opcodes.py, case insensitive:
+
+    start:  ld b, 10
+    loop:   dec b          ; comments start with a semicolon
+            jr nz, loop
+            ld a, (hl+)
+            ldh a, ($44)
+            jp start
+            db 1, 2, $ff
+            dw start
+            ds 16, 0
+
+Numbers can be decimal, 0x1f, $1f, 1fh or %1010, and wherever a number
+goes a label, optionally plus or minus a number, can be used instead.
+(HLI) and (HLD) are accepted for (HL+) and (HL-), and JP (HL) for JP HL.
+"""
+__author__ = 'Clayton Powell'
+import re
+import mmu
+import opcodes
+
+PLACEHOLDERS = ('d8', 'd16', 'a8', 'a16', 'r8')
+RESERVED = set(opcodes.REGISTERS + opcodes.PAIRS + opcodes.CONDITIONS +
+               ('AF', 'HL+', 'HL-', 'SP'))
+ALIASES = {'(HLI)': '(HL+)', '(HLD)': '(HL-)'}
+LABEL = re.compile(r'^([A-Za-z_.][A-Za-z0-9_.]*):')
+
+ENTRY = 0x150
+LOGO = mmu.bios[0xa8:0xd8]
+
+
+def _templates():
+    """
+    Mnemonic word and operand count to a list of (operands, opcode bytes,
+    length), literal-only templates first.
+    """
+    templates = {}
+    entries = [(m, [op], opcodes.LENGTHS[op])
+               for op, m in enumerate(opcodes.OPCODES)
+               if m is not None and m != 'PREFIX CB']
+    entries += [(m, [0xcb, op], 2) for op, m in enumerate(opcodes.CB_OPCODES)]
+    for mnemonic, code, length in entries:
+        word, _, rest = mnemonic.partition(' ')
+        operands = rest.split(',') if rest else []
+        templates.setdefault((word, len(operands)), []).append(
+            (operands, code, length))
+    for candidates in templates.values():
+        candidates.sort(key=lambda t: sum(1 for o in t[0]
+                                          if any(p in o for p in PLACEHOLDERS)))
+    return templates
+
+
+TEMPLATES = _templates()
+
+
+def parse_number(text):
+    """
+    Parses a number literal, returning None if text is not one.
+    """
+    text = text.strip()
+    try:
+        if text.startswith('$'):
+            return int(text[1:], 16)
+        if text.startswith('%'):
+            return int(text[1:], 2)
+        if text[-1:] in 'hH' and len(text) > 1:
+            return int(text[:-1], 16)
+        return int(text, 0)
+    except ValueError:
+        return None
+
+
+class Instruction(object):
+    """
+    Instruction class, one parsed line waiting for labels to be resolved.
+    """
+
+    def __init__(self, line_number, word, code, length, kind, expr):
+        self.line_number = line_number
+        self.word = word
+        self.code = code
+        self.length = length
+        self.kind = kind
+        self.expr = expr
+        self.addr = 0
+
+
+def _match_operand(template, operand):
+    """
+    Matches one user operand against a template operand.
+
+    Returns
+    -------
+    tuple or None
+        (placeholder kind, expression) where kind is None for a literal
+        match, or None if the operand does not fit the template.
+    """
+    if template == 'SP+r8':
+        m = re.match(r'^SP([+-].+)$', operand, re.I)
+        return ('r8', m.group(1)) if m else None
+    for kind in PLACEHOLDERS:
+        if template == kind:
+            if (operand.startswith('(') or operand.upper() in RESERVED or
+                    re.match(r'^SP[+-]', operand, re.I)):
+                return None
+            return kind, operand
+        if template == '(%s)' % kind:
+            if not (operand.startswith('(') and operand.endswith(')')):
+                return None
+            inner = operand[1:-1]
+            if inner.upper() in RESERVED:
+                return None
+            return kind, inner
+    upper = ALIASES.get(operand.upper(), operand.upper())
+    if upper == template:
+        return None, None
+    if template.endswith('H') and template[:-1].isdigit():
+        # RST vectors can be given as plain numbers
+        value = parse_number(operand)
+        if value is not None and '%02XH' % value == template:
+            return None, None
+    return False
+
+
+def _parse_instruction(line_number, word, operands):
+    if word == 'JP' and [o.upper() for o in operands] == ['(HL)']:
+        operands = ['HL']
+    if word == 'STOP' and operands in (['0'], ['$00']):
+        operands = []
+    candidates = TEMPLATES.get((word, len(operands)))
+    if not candidates:
+        raise ValueError("line %d: unknown instruction %s" % (line_number, word))
+    for template, code, length in candidates:
+        kind = expr = None
+        for t, operand in zip(template, operands):
+            match = _match_operand(t, operand)
+            if match is None or match is False:
+                break
+            if match[0] is not None:
+                kind, expr = match
+        else:
+            return Instruction(line_number, word, code, length, kind, expr)
+    raise ValueError("line %d: bad operands for %s: %s" %
+                     (line_number, word, ','.join(operands)))
+
+
+def _split_operands(text):
+    return [o.strip() for o in text.split(',')] if text.strip() else []
+
+
+class Section(object):
+    """
+    Section class, a block of source assembled at a fixed origin.
+    """
+
+    def __init__(self, lines, bank, origin):
+        self.lines = lines
+        self.bank = bank
+        self.origin = origin
+        self.items = []
+        self.size = 0
+
+    def parse(self, labels):
+        """
+        First pass: parses every line and assigns label addresses. Parsing
+        again starts over, so a builder can be built more than once.
+        """
+        addr = self.origin
+        self.items = []
+        lines = self.lines
+        if isinstance(lines, str):
+            lines = lines.splitlines()
+        for line_number, line in enumerate(lines, 1):
+            line = line.split(';', 1)[0].strip()
+            m = LABEL.match(line)
+            while m:
+                name = m.group(1)
+                if name in labels:
+                    raise ValueError("line %d: duplicate label %s" %
+                                     (line_number, name))
+                labels[name] = addr
+                line = line[m.end():].strip()
+                m = LABEL.match(line)
+            if not line:
+                continue
+            word, _, rest = line.partition(' ')
+            word = word.upper()
+            operands = _split_operands(rest)
+            if word in ('DB', 'DW'):
+                size = 1 if word == 'DB' else 2
+                item = Instruction(line_number, word, [], size * len(operands),
+                                   word, operands)
+            elif word == 'DS':
+                count = parse_number(operands[0])
+                fill = parse_number(operands[1]) if len(operands) > 1 else 0
+                item = Instruction(line_number, word, [fill & 0xff] * count,
+                                   count, None, None)
+            else:
+                item = _parse_instruction(line_number, word, operands)
+            item.addr = addr
+            addr += item.length
+            self.items.append(item)
+        self.size = addr - self.origin
+
+    def emit(self, labels):
+        """
+        Second pass: resolves expressions and returns the machine code.
+        """
+        out = bytearray()
+        for item in self.items:
+            if item.kind == 'DB':
+                for expr in item.expr:
+                    out.append(_evaluate(expr, labels, item) & 0xff)
+            elif item.kind == 'DW':
+                for expr in item.expr:
+                    value = _evaluate(expr, labels, item) & 0xffff
+                    out += bytes((value & 0xff, value >> 8))
+            else:
+                code = list(item.code)
+                if item.kind is not None:
+                    value = _evaluate(item.expr, labels, item)
+                    code += _encode(item, value)
+                out += bytes(code + [0] * (item.length - len(code)))
+        return bytes(out)
+
+
+def _evaluate(expr, labels, item):
+    expr = expr.strip()
+    m = re.match(r'^([A-Za-z_.][A-Za-z0-9_.]*)\s*([+-].+)?$', expr)
+    if m and m.group(1) in labels:
+        offset = parse_number(m.group(2).replace(' ', '')) if m.group(2) else 0
+        if offset is not None:
+            return labels[m.group(1)] + offset
+    value = parse_number(expr.replace(' ', ''))
+    if value is None:
+        raise ValueError("line %d: cannot evaluate %s" % (item.line_number, expr))
+    return value
+
+
+def _encode(item, value):
+    line = item.line_number
+    if item.kind == 'r8':
+        if item.word == 'JR':
+            value -= item.addr + item.length
+        if not -0x80 <= value <= 0x7f:
+            raise ValueError("line %d: offset %d out of range" % (line, value))
+        return [value & 0xff]
+    if item.kind == 'a8':
+        if 0xff00 <= value <= 0xffff:
+            value -= 0xff00
+        if not 0 <= value <= 0xff:
+            raise ValueError("line %d: %#x is not a high page address" % (line, value))
+        return [value]
+    if item.kind == 'd8':
+        if not -0x80 <= value <= 0xff:
+            raise ValueError("line %d: %d does not fit in a byte" % (line, value))
+        return [value & 0xff]
+    if not -0x8000 <= value <= 0xffff:
+        raise ValueError("line %d: %d does not fit in a word" % (line, value))
+    value &= 0xffff
+    return [value & 0xff, value >> 8]
+
+
+def assemble(lines, origin=ENTRY, labels=None):
+    """
+    Assembles a single block of source.
+
+    Parameters
+    ----------
+    lines : String or list of String
+        assembly source
+    origin : int
+        address the code will run at
+    labels : dict
+        labels defined elsewhere, updated with the ones defined here
+
+    Returns
+    -------
+    bytes
+        machine code
+    """
+    labels = {} if labels is None else labels
+    section = Section(lines, 0, origin)
+    section.parse(labels)
+    return section.emit(labels)
+
+
+class RomBuilder(object):
+    """
+    RomBuilder class that lays out code sections into a cartridge image.
+
+    Code in bank 0 starts at 0x150 by default and the entry point at 0x100
+    jumps to the label `main` if there is one, otherwise to 0x150. Banks
+    above 0 are mapped at 0x4000 and need an MBC1 cartridge, which is picked
+    automatically when there are more than two banks.
+
+    Parameters
+    ----------
+    title : String
+        cartridge title, at most 16 characters
+    banks : int
+        number of 16KB ROM banks, a power of two of at least 2
+    """
+
+    def __init__(self, title='GBPY', banks=2):
+        if banks < 2 or banks & (banks - 1):
+            raise ValueError("banks must be a power of two of at least 2")
+        self.title = title
+        self.banks = banks
+        self.sections = []
+        self.fills = {}
+        self.labels = {}
+
+    def code(self, lines, bank=0, origin=None):
+        """
+        Adds a block of source.
+
+        Parameters
+        ----------
+        lines : String or list of String
+            assembly source
+        bank : int
+            ROM bank to place it in
+        origin : int
+            address within the bank, 0x150 for bank 0 and 0x4000 otherwise
+        """
+        if origin is None:
+            origin = ENTRY if bank == 0 else 0x4000
+        self.sections.append(Section(lines, bank, origin))
+        return self
+
+    def fill(self, bank, value):
+        """
+        Fills the unused bytes of a bank with value instead of 0.
+        """
+        self.fills[bank] = value
+        return self
+
+    def build(self):
+        """
+        Assembles every section and writes the header.
+
+        Returns
+        -------
+        bytearray
+            the cartridge image
+        """
+        rom = bytearray(self.banks * 0x4000)
+        for bank, value in self.fills.items():
+            rom[bank * 0x4000:(bank + 1) * 0x4000] = bytes([value]) * 0x4000
+        self.labels = {}
+        for section in self.sections:
+            section.parse(self.labels)
+        for section in self.sections:
+            code = section.emit(self.labels)
+            start = section.bank * 0x4000 + (section.origin & 0x3fff)
+            if section.origin + len(code) > (0x4000 if section.bank == 0 else 0x8000):
+                raise ValueError("section at %#x overflows bank %d" %
+                                 (section.origin, section.bank))
+            rom[start:start + len(code)] = code
+        main = self.labels.get('main', ENTRY)
+        rom[0x100:0x104] = bytes((0x00, 0xc3, main & 0xff, main >> 8))
+        rom[0x104:0x134] = bytes(LOGO)
+        rom[0x134:0x144] = self.title.encode('ascii')[:16].ljust(16, b'\0')
+        rom[0x147] = 0x00 if self.banks == 2 else 0x01
+        rom[0x148] = self.banks.bit_length() - 2
+        rom[0x149] = 0x00
+        checksum = 0
+        for byte in rom[0x134:0x14d]:
+            checksum = (checksum - byte - 1) & 0xff
+        rom[0x14d] = checksum
+        total = (sum(rom) - rom[0x14e] - rom[0x14f]) & 0xffff
+        rom[0x14e:0x150] = bytes((total >> 8, total & 0xff))
+        return rom
+
+    def save(self, path):
+        """
+        Builds the image and writes it to the file at path.
+        """
+        with open(path, 'wb') as f:
+            f.write(self.build())
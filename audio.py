@@ -0,0 +1,289 @@
+"""
+Audio output stage for the GameBoy emulator.
+
+Turns the APU's 1048576 Hz output into 44.1 or 48 kHz and hands it to the
+frontend through a ring buffer.
+
+Resampler works in two vectorised stages. The input is first decimated by
+16 to 65536 Hz through a 416 tap Kaiser-windowed sinc low-pass, flat to
+20 kHz and at least 80 dB down from 32768 Hz, the Nyquist frequency of the
+intermediate rate, so the channels' harmonics above it do not fold back.
+Only every 16th output of that filter is computed, as one matrix product of
+the 16 sample blocks with the filter cut into 26 pieces. Then a polyphase
+windowed-sinc filter picks the output samples, band-limited to 0.45 of the
+output rate. Its step can be changed by a fraction of a percent at any time
+without a click, which is what dynamic rate control uses.
+
+RingBuffer is a single producer, single consumer ring: the emulator thread
+only moves the write position and the audio callback only moves the read
+position, each after copying the samples, so neither needs a lock.
+
+AudioOutput ties them to an APU. Calling update() once a frame pulls the
+APU's samples, resamples them and writes them to the ring, nudging the
+resampling rate so the ring stays half full: the emulator is paced by the
+video frame rate, which never quite matches the sound card's clock, and
+without the correction the ring would slowly run dry or overflow.
+"""
+__author__ = 'Clayton Powell'
+import numpy as np
+import apu
+
+# time constant of the DC offset removal, in 65536 Hz samples (about 60 ms)
+DC_SAMPLES = 4096
+
+# Kaiser window beta of the decimation filter, for about 80 dB of stopband
+DECIMATOR_BETA = 7.86
+
+
+class Resampler(object):
+    """
+    Resampler class that band-limits and resamples a stereo stream.
+
+    Parameters
+    ----------
+    rate_in : int
+        input sample rate
+    rate_out : int
+        output sample rate
+    decimation : int
+        decimation factor of the first stage
+    decimator_taps : int
+        length of the first stage's filter, a multiple of decimation
+    taps : int
+        length of the sinc filter at the intermediate rate
+    phases : int
+        fractional positions the filter is precomputed for
+    """
+
+    def __init__(self, rate_in=apu.RATE, rate_out=48000, decimation=16,
+                 decimator_taps=416, taps=48, phases=256):
+        self.decimation = decimation
+        self.taps = taps
+        self.phases = phases
+        self.rate_out = rate_out
+        # intermediate samples per output sample
+        self.ratio = float(rate_in) / decimation / rate_out
+        self.adjust = 0.0
+        self.decimator = self._decimator(decimator_taps, 0.4 / decimation)
+        self.kernels = self._kernels(0.45 / self.ratio)
+        self.offsets = np.arange(taps) - taps // 2 + 1
+        # input the next decimated sample's window reaches back over
+        self.remainder = np.zeros((decimator_taps - decimation, 2),
+                                  dtype=np.float32)
+        self.history = np.zeros((taps, 2), dtype=np.float32)
+        self.time = float(taps // 2)
+        self.dc = np.zeros(2, dtype=np.float32)
+
+    def _decimator(self, length, cutoff):
+        """
+        Low-pass of the first stage, summing to 1, cut into rows of
+        `decimation` taps: row i applies to the i-th block of a window.
+
+        Parameters
+        ----------
+        length : int
+            taps of the filter
+        cutoff : float
+            cutoff as a fraction of the input rate, half way through the
+            transition band
+        """
+        d = np.arange(length) - (length - 1) / 2.0
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * d) * np.kaiser(
+            length, DECIMATOR_BETA)
+        kernel /= kernel.sum()
+        return kernel.reshape(-1, self.decimation).astype(np.float32)
+
+    def _kernels(self, cutoff):
+        """
+        Filter for every phase, rows summing to 1.
+
+        Parameters
+        ----------
+        cutoff : float
+            cutoff as a fraction of the intermediate rate
+        """
+        half = self.taps // 2
+        frac = np.arange(self.phases) / float(self.phases)
+        # distance of each tap from the output position
+        d = (np.arange(self.taps) - half + 1)[None, :] - frac[:, None]
+        window = np.cos(np.pi * d / (half + 1)) * 0.5 + 0.5
+        kernels = 2 * cutoff * np.sinc(2 * cutoff * d) * window
+        kernels /= kernels.sum(axis=1, keepdims=True)
+        return kernels.astype(np.float32)
+
+    @property
+    def step(self):
+        return self.ratio * (1.0 + self.adjust)
+
+    def process(self, samples):
+        """
+        Resamples the next block of the stream.
+
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            float32 array of shape (n, 2) at the input rate
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 array of shape (m, 2) at the output rate
+        """
+        d = self.decimation
+        pieces = len(self.decimator)
+        samples = np.concatenate((self.remainder, samples.astype(np.float32)))
+        blocks = len(samples) // d
+        ready = max(blocks - pieces + 1, 0)
+        self.remainder = samples[ready * d:]
+        block = np.zeros((ready, 2), dtype=np.float32)
+        if ready:
+            # every block against every piece of the filter, then the
+            # window of output k adds piece i of block k + i
+            products = np.tensordot(samples[:blocks * d].reshape(blocks, d, 2),
+                                    self.decimator, axes=([1], [1]))
+            for i in range(pieces):
+                block += products[i:i + ready, :, i]
+            # remove the DACs' DC offset, following its mean with a time
+            # constant of DC_SAMPLES whatever the block size
+            weight = 1.0 - (1.0 - 1.0 / DC_SAMPLES) ** len(block)
+            dc = self.dc + (block.mean(axis=0) - self.dc) * weight
+            ramp = np.linspace(0.0, 1.0, len(block), dtype=np.float32)[:, None]
+            block = block - (self.dc + (dc - self.dc) * ramp)
+            self.dc = dc
+        buf = np.concatenate((self.history, block.astype(np.float32)))
+
+        step = self.step
+        # last position whose taps are all in buf
+        limit = len(buf) - self.taps // 2 - 1
+        count = int((limit - self.time) // step) + 1 if limit >= self.time else 0
+        t = self.time + np.arange(count) * step
+        index = t.astype(np.int64)
+        phase = ((t - index) * self.phases).astype(np.int64)
+        window = buf[index[:, None] + self.offsets]
+        out = np.einsum('nk,nkc->nc', self.kernels[phase], window)
+
+        following = self.time + count * step
+        drop = min(max(int(following) - self.taps // 2 + 1, 0), len(buf))
+        self.history = buf[drop:]
+        self.time = following - drop
+        return np.clip(out, -1.0, 1.0).astype(np.float32)
+
+
+class RingBuffer(object):
+    """
+    RingBuffer class, a lock free single producer single consumer ring of
+    stereo frames.
+
+    Parameters
+    ----------
+    capacity : int
+        frames the ring holds
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, 2), dtype=np.float32)
+        # frames written and read since the start, each only changed by its
+        # own side after the copy is done
+        self.write_pos = 0
+        self.read_pos = 0
+
+    @property
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    @property
+    def free(self):
+        return self.capacity - self.available
+
+    def write(self, frames):
+        """
+        Appends frames, dropping those that do not fit.
+
+        Returns
+        -------
+        int
+            frames written
+        """
+        count = min(len(frames), self.free)
+        start = self.write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start:start + first] = frames[:first]
+        self.data[:count - first] = frames[first:count]
+        self.write_pos += count
+        return count
+
+    def read_into(self, out):
+        """
+        Fills out with the oldest frames, the rest with silence on underrun.
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            array of shape (n, 2) to fill, e.g. the audio callback's buffer
+
+        Returns
+        -------
+        int
+            frames read
+        """
+        count = min(len(out), self.available)
+        start = self.read_pos % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.data[start:start + first]
+        out[first:count] = self.data[:count - first]
+        out[count:] = 0
+        self.read_pos += count
+        return count
+
+    def read(self, count):
+        """
+        Removes and returns up to count frames.
+        """
+        out = np.zeros((min(count, self.available), 2), dtype=np.float32)
+        self.read_into(out)
+        return out
+
+
+class AudioOutput(object):
+    """
+    AudioOutput class that feeds an APU's output to the frontend's ring.
+
+    Parameters
+    ----------
+    source : apu.APU
+        APU to pull samples from
+    rate : int
+        output sample rate, e.g. 44100 or 48000
+    latency : float
+        seconds of audio the ring is kept at, it holds twice that
+    max_adjust : float
+        largest change of the resampling rate, as a fraction
+    """
+
+    def __init__(self, source, rate=48000, latency=0.1, max_adjust=0.005):
+        self.source = source
+        self.rate = rate
+        self.resampler = Resampler(apu.RATE, rate)
+        self.target = int(rate * latency)
+        self.ring = RingBuffer(2 * self.target)
+        self.max_adjust = max_adjust
+        self.dropped = 0
+
+    def update(self):
+        """
+        Moves the APU's new samples into the ring. Call once a frame.
+
+        Returns
+        -------
+        int
+            frames written to the ring
+        """
+        # fuller than the target makes fewer samples, emptier makes more
+        error = (self.ring.available - self.target) / float(self.target)
+        self.resampler.adjust = max(-self.max_adjust,
+                                    min(self.max_adjust, error * self.max_adjust))
+        out = self.resampler.process(self.source.pull())
+        written = self.ring.write(out)
+        self.dropped += len(out) - written
+        return written
@@ -0,0 +1,184 @@
+"""
+Streaming audio capture for the GameBoy emulator.
+
+AudioSink writes 16 bit stereo PCM to a WAV file, or to a headerless raw
+file (s16le, interleaved) for any other extension. Samples are gathered
+into chunks of about a second and handed to a background thread that does
+the file writes, so the emulator thread only converts samples and never
+waits on the disk. The queue between the two holds a few chunks at most,
+so a recording of any length never sits in memory; if the disk falls that
+far behind, write blocks until the thread catches up.
+
+Given an APU as source, update() pulls its samples through audio.Resampler
+once a frame, and from the command line a ROM or a movie replay can be
+recorded headless:
+
+    python audiosink.py rom.gb session.wav --movie session.gbm
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import os
+import queue
+import threading
+import wave
+import numpy as np
+import apu
+import audio
+
+
+class AudioSink(object):
+    """
+    AudioSink class that streams stereo samples to a file.
+
+    Parameters
+    ----------
+    path : String
+        output file, WAV if it ends in .wav, raw PCM otherwise
+    rate : int
+        sample rate of the samples written
+    source : apu.APU
+        APU to pull samples from in update, None to call write directly
+    chunk : float
+        seconds of audio handed to the writer thread at a time
+    queued : int
+        chunks that can wait for the writer thread before write blocks
+    """
+
+    def __init__(self, path, rate=48000, source=None, chunk=1.0, queued=4):
+        self.path = path
+        self.rate = rate
+        self.source = source
+        self.resampler = None
+        if source is not None:
+            self.resampler = audio.Resampler(apu.RATE, rate)
+        self.chunk_frames = int(rate * chunk)
+        self.frames = 0
+        self._pending = []
+        self._pending_frames = 0
+        self._error = None
+        if path.lower().endswith('.wav'):
+            self._file = wave.open(path, 'wb')
+            self._file.setnchannels(2)
+            self._file.setsampwidth(2)
+            self._file.setframerate(rate)
+            self._write = self._file.writeframesraw
+        else:
+            self._file = open(path, 'wb')
+            self._write = self._file.write
+        self._queue = queue.Queue(maxsize=queued)
+        self._thread = threading.Thread(target=self._writer, name='audiosink')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _writer(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                # keep draining so the emulator thread never blocks
+                continue
+            try:
+                self._write(data)
+            except Exception as e:
+                self._error = e
+
+    def _check(self):
+        if self._error is not None:
+            raise IOError("writing %s failed: %r" % (self.path, self._error))
+
+    def write(self, samples):
+        """
+        Queues samples for writing.
+
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            float array of shape (n, 2) in -1 to 1
+        """
+        self._check()
+        if not len(samples):
+            return
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+        self._pending.append(pcm.tobytes())
+        self._pending_frames += len(pcm)
+        self.frames += len(pcm)
+        if self._pending_frames >= self.chunk_frames:
+            self.flush()
+
+    def update(self):
+        """
+        Writes the source's new samples. Call once a frame.
+
+        Raises
+        ------
+        ValueError
+            if the sink was made without a source
+        """
+        if self.source is None:
+            raise ValueError("%s has no source, call write instead" % self.path)
+        self.write(self.resampler.process(self.source.pull()))
+
+    def flush(self):
+        """
+        Hands the gathered samples to the writer thread.
+        """
+        if self._pending:
+            self._queue.put(b''.join(self._pending))
+            self._pending = []
+            self._pending_frames = 0
+
+    def close(self):
+        """
+        Writes what is left, waits for the writer thread and closes the
+        file, filling in the WAV header.
+        """
+        if self._thread is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # a failed write must not hide the exception already on its way out
+        try:
+            self.close()
+        except IOError:
+            pass
+
+
+if __name__ == '__main__':
+    import core
+    import movie
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rom", type=str, metavar='FILE',
+                        help="File path to the GameBoy Rom you wish to run.")
+    parser.add_argument("output", type=str, metavar='AUDIO',
+                        help="File to record to, .wav for WAV otherwise raw s16le stereo.")
+    parser.add_argument("--movie", type=str, default=None,
+                        help="Movie to replay while recording.")
+    parser.add_argument("--frames", type=int, default=None,
+                        help="Number of frames to record, defaults to the movie length or 3600.")
+    parser.add_argument("--rate", type=int, default=48000,
+                        help="Sample rate of the recording.")
+    args = parser.parse_args()
+    emulator = core.Core(audio=True)
+    emulator.load_rom(args.rom)
+    recording = movie.Movie.load(args.movie) if args.movie else movie.Movie()
+    frames = args.frames
+    if frames is None and not args.movie:
+        frames = 3600
+    with AudioSink(args.output, args.rate, source=emulator.apu) as sink:
+        movie.replay(emulator, recording, frames, on_frame=sink.update)
+    print("Wrote %d frames (%.1f s) to %s, %d bytes" % (
+        sink.frames, sink.frames / float(args.rate), args.output,
+        os.path.getsize(args.output)))
@@ -0,0 +1,162 @@
+"""
+Batch ROM runner for the GameBoy emulator.
+
+Runs many ROMs, or ROM x movie x frame count jobs, on headless cores spread
+over a pool of worker processes and collects one result per job into a JSON
+or CSV report. Jobs are independent, so a sweep scales with the number of
+cores on the machine.
+
+Jobs can be given as ROM paths on the command line, all sharing the same
+movie and frame count, or as a JSON file holding a list of objects with
+"rom", and optionally "movie", "frames" and "until_result", keys. Jobs with
+until_result stop as soon as a test ROM reports passed or failed, see
+conformance.py, and use frames as the time limit.
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import conformance
+import core
+import movie
+
+FIELDS = ('rom', 'movie', 'frames', 'frame_hash', 'serial', 'result',
+          'cycles', 'wall_time', 'error')
+
+
+def run_job(job):
+    """
+    Runs a single job on a fresh headless core.
+
+    Parameters
+    ----------
+    job : dict
+        job description with "rom", "movie", "frames" and "until_result"
+        keys
+
+    Returns
+    -------
+    dict
+        result row with a value for every name in FIELDS
+    """
+    result = dict.fromkeys(FIELDS)
+    result.update(rom=job['rom'], movie=job.get('movie'),
+                  frames=job.get('frames', 600))
+    start = time.perf_counter()
+    emulator = core.Core()
+    try:
+        emulator.load_rom(result['rom'])
+        if job.get('until_result'):
+            result['result'] = conformance.run(emulator, result['frames'])
+        elif result['movie']:
+            movie.replay(emulator, movie.Movie.load(result['movie']),
+                         result['frames'])
+        else:
+            emulator.run_frames(result['frames'])
+    except (Exception, SystemExit) as e:
+        # The cpu exits on unknown opcodes, report it instead of dying
+        result['error'] = repr(e)
+    result['wall_time'] = time.perf_counter() - start
+    result['frame_hash'] = hashlib.sha1(emulator.gpu.framebuffer).hexdigest()
+    result['serial'] = emulator.serial.text
+    result['cycles'] = emulator.cycles
+    return result
+
+
+def run_batch(jobs, workers=None):
+    """
+    Runs jobs across a pool of worker processes.
+
+    Parameters
+    ----------
+    jobs : list of dict
+        job descriptions, see run_job
+    workers : int
+        number of worker processes, defaults to the number of cpus
+
+    Returns
+    -------
+    list of dict
+        result rows in the same order as jobs
+    """
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run_job, jobs))
+
+
+def load_jobs(path):
+    """
+    Reads a JSON job file.
+
+    Parameters
+    ----------
+    path : String
+        Path on system of the job file
+
+    Returns
+    -------
+    list of dict
+        job descriptions
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(results, f, fmt='json'):
+    """
+    Writes result rows as JSON or CSV.
+
+    Parameters
+    ----------
+    results : list of dict
+        rows returned from run_batch
+    f : file
+        open text file to write to
+    fmt : String
+        'json' or 'csv'
+    """
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("roms", type=str, metavar='FILE', nargs='*',
+                        help="File paths to the GameBoy Roms to run.")
+    parser.add_argument("--jobs", type=str, metavar='JSON', default=None,
+                        help="JSON file with a list of rom/movie/frames jobs.")
+    parser.add_argument("--movie", type=str, default=None,
+                        help="Movie to replay on every rom given on the command line.")
+    parser.add_argument("--frames", type=int, default=600,
+                        help="Number of frames to run every rom given on the command line.")
+    parser.add_argument("--until-result", action='store_true',
+                        help="Stop every rom given on the command line once it reports a test result.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, defaults to the number of cpus.")
+    parser.add_argument("--report", type=str, default=None,
+                        help="Report file, .csv for CSV otherwise JSON. Defaults to stdout.")
+    args = parser.parse_args()
+
+    jobs = [{'rom': rom, 'movie': args.movie, 'frames': args.frames,
+             'until_result': args.until_result}
+            for rom in args.roms]
+    if args.jobs:
+        jobs.extend(load_jobs(args.jobs))
+    if not jobs:
+        parser.error("no roms or job file given")
+    results = run_batch(jobs, args.workers)
+    fmt = 'csv' if args.report and os.path.splitext(args.report)[1] == '.csv' else 'json'
+    if args.report:
+        with open(args.report, 'w', newline='') as f:
+            write_report(results, f, fmt)
+    else:
+        write_report(results, sys.stdout, fmt)
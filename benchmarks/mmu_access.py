@@ -0,0 +1,181 @@
+"""
+Micro-benchmarks for the MMU access paths.
+
+Times MMU.read_byte, read_word, write_byte and write_word on every region of
+the memory map and prints ns per call, so a change to the memory map can be
+checked against the path it actually affects. The cost of the timing loop
+itself is measured separately and subtracted.
+
+Writes only go where they have no side effects beyond the store: the io
+region uses the registers unused on the DMG, which take the same dispatch
+as the live ones, so LCDC and the rest keep their reset values. Writing IE
+schedules an interrupt check, so the scheduler's due events are run between
+rounds, outside the timing, as the core would after every instruction.
+
+Run from the project root:
+
+    python -m benchmarks.mmu_access
+    python -m benchmarks.mmu_access --output mmu.json wram hram
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import json
+import time
+import core
+
+# Region name to the addresses accessed, 64 accesses per region
+REGIONS = (
+    ('rom0', range(0x0150, 0x0190)),
+    ('romx', range(0x4000, 0x4040)),
+    ('vram', range(0x8000, 0x8040)),
+    ('eram', range(0xa000, 0xa040)),
+    ('wram', range(0xc000, 0xc040)),
+    ('echo', range(0xe000, 0xe040)),
+    ('oam', range(0xfe00, 0xfe40)),
+    ('io', list(range(0xff4c, 0xff6c)) * 2),
+    ('hram', range(0xff80, 0xffc0)),
+    ('ie', [0xffff] * 0x40),
+)
+
+OPERATIONS = ('read_byte', 'read_word', 'write_byte', 'write_word')
+
+
+# every loop times its rounds one by one and calls between() in between,
+# so the empty loop's overhead matches the others'
+def _loop_read(fn, addrs, rounds, between):
+    elapsed = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for addr in addrs:
+            fn(addr)
+        elapsed += time.perf_counter() - start
+        between()
+    return elapsed
+
+
+def _loop_write(fn, addrs, rounds, between):
+    elapsed = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for addr in addrs:
+            fn(addr, 0)
+        elapsed += time.perf_counter() - start
+        between()
+    return elapsed
+
+
+def _loop_empty(addrs, rounds, between):
+    elapsed = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for addr in addrs:
+            pass
+        elapsed += time.perf_counter() - start
+        between()
+    return elapsed
+
+
+def _nothing():
+    pass
+
+
+def time_access(fn, addrs, write, rounds=2000, repeat=5, between=_nothing):
+    """
+    Times one MMU access function over a list of addresses.
+
+    Parameters
+    ----------
+    fn : method
+        bound MMU access method
+    addrs : list of int
+        addresses to access every round
+    write : bool
+        whether fn takes a value to write
+    rounds : int
+        times to go over addrs per measurement
+    repeat : int
+        measurements taken, the fastest is kept
+    between : function
+        called after every round, not timed
+
+    Returns
+    -------
+    float
+        nanoseconds per call, loop overhead excluded
+    """
+    loop = _loop_write if write else _loop_read
+    calls = rounds * len(addrs)
+    best = min(loop(fn, addrs, rounds, between) for _ in range(repeat))
+    overhead = min(_loop_empty(addrs, rounds, between) for _ in range(repeat))
+    return max(best - overhead, 0.0) / calls * 1e9
+
+
+def run(regions=None, rounds=2000, repeat=5):
+    """
+    Times every access function on every requested region.
+
+    Parameters
+    ----------
+    regions : list of String
+        region names to time, defaults to all of them
+    rounds : int
+        passes over each region's addresses per measurement
+    repeat : int
+        measurements taken, the fastest is kept
+
+    Returns
+    -------
+    dict
+        region name to {operation: ns per call}
+    """
+    emulator = core.Core()
+    emulator.mmu.rom = [0] * 0x8000
+    results = {}
+    for name, addrs in REGIONS:
+        if regions and name not in regions:
+            continue
+        addrs = list(addrs)
+        # drops the interrupt checks IE writes schedule, the clock never
+        # moves so nothing else becomes due
+        results[name] = dict(
+            (op, time_access(getattr(emulator.mmu, op), addrs,
+                             op.startswith('write'), rounds, repeat,
+                             emulator.scheduler.run))
+            for op in OPERATIONS)
+    return results
+
+
+def format_results(results):
+    """
+    Formats results as a text table of ns per call.
+    """
+    lines = ['%-6s' % 'region' + ''.join('%12s' % op for op in OPERATIONS)]
+    for name, _ in REGIONS:
+        if name in results:
+            lines.append('%-6s' % name + ''.join(
+                '%12.1f' % results[name][op] for op in OPERATIONS))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    names = [name for name, _ in REGIONS]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("regions", type=str, nargs='*', metavar='REGION',
+                        help="Regions to time: %s. Defaults to all." %
+                             ', '.join(names))
+    parser.add_argument("--rounds", type=int, default=2000,
+                        help="Passes over each region's addresses per measurement.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Measurements per access, the fastest is kept.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    for region in args.regions:
+        if region not in names:
+            parser.error("unknown region %s" % region)
+    results = run(args.regions, args.rounds, args.repeat)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
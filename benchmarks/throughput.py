@@ -0,0 +1,294 @@
+"""
+Emulation throughput benchmarks.
+
+Runs the headless core on synthetic workloads and measures emulated cycles,
+instructions and frames per second. Results can be saved as JSON and compared
+against a stored baseline, flagging any workload whose emulated cycles per
+second dropped by more than a threshold.
+
+Run from the project root:
+
+    python -m benchmarks.throughput --output results.json
+    python -m benchmarks.throughput --baseline baseline.json
+
+--fuse runs with fusion.Fusion enabled and --jit with jit.TraceJit. A fused
+sequence or a trace call is counted as one instruction, so instructions per
+second are not comparable between those and plain runs, which is why the
+baseline comparison uses cycles per second.
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import json
+import sys
+import time
+import assembler
+import core
+import fusion
+import jit
+
+
+def alu_rom(loops=256):
+    """
+    ALU heavy inner loop of `loops` iterations.
+    """
+    return assembler.RomBuilder('ALU').code("""
+        main:   ld c, $35
+                ld d, $5a
+                ld e, $0f
+        outer:  ld b, %d
+        inner:  add a, c
+                xor d
+                and e
+                or c
+                sub d
+                inc a
+                cp e
+                dec b
+                jr nz, inner
+                jr outer
+    """ % (loops & 0xff))
+
+
+def memcopy_rom(length=0x800):
+    """
+    Byte by byte copy of `length` bytes from WRAM bank 0 to bank 1.
+    """
+    return assembler.RomBuilder('MEMCOPY').code("""
+        main:   ld hl, $c000
+                ld de, $d000
+                ld bc, %d
+        copy:   ld a, (hl+)
+                ld (de), a
+                inc de
+                dec bc
+                ld a, b
+                or c
+                jr nz, copy
+                jr main
+    """ % length)
+
+
+def callret_rom(loops=256):
+    """
+    Two calls per iteration to a subroutine that pushes and pops BC.
+    """
+    return assembler.RomBuilder('CALLRET').code("""
+        main:   ld b, %d
+        loop:   call sub
+                call sub
+                dec b
+                jr nz, loop
+                jr main
+        sub:    push bc
+                pop bc
+                ret
+    """ % (loops & 0xff))
+
+
+def cb_bitops_rom(loops=256):
+    """
+    CB prefixed bit tests, rotates and resets.
+    """
+    return assembler.RomBuilder('CBBITOPS').code("""
+        main:   ld b, %d
+        loop:   bit 7, h
+                rl c
+                res 0, a
+                bit 7, h
+                dec b
+                jr nz, loop
+                jr main
+    """ % (loops & 0xff))
+
+
+def bank_switch_rom(banks=4, loops=256):
+    """
+    Switches through every ROM bank above 0, reading from each.
+    """
+    lines = ['main: ld b, %d' % (loops & 0xff), 'loop:']
+    for bank in range(1, banks):
+        lines += ['ld a, %d' % bank, 'ld ($2000), a', 'ld a, ($4000)']
+    lines += ['dec b', 'jr nz, loop', 'jr main']
+    builder = assembler.RomBuilder('BANKSWITCH', banks).code(lines)
+    for bank in range(1, banks):
+        builder.fill(bank, bank)
+    return builder
+
+
+# Each workload loops forever from the entry point
+WORKLOADS = {
+    'alu': alu_rom,
+    'memcopy': memcopy_rom,
+    'callret': callret_rom,
+    'cb_bitops': cb_bitops_rom,
+    'bank_switch': bank_switch_rom,
+}
+
+METRICS = ('cycles_per_second', 'instructions_per_second', 'frames_per_second')
+# metric compared against a baseline, the same in every run mode
+COMPARED = 'cycles_per_second'
+
+
+def run_workload(rom, frames, fuse=False, trace=False):
+    """
+    Runs a ROM image on a fresh headless core for a number of frames.
+
+    Parameters
+    ----------
+    rom : bytes
+        ROM image
+    frames : int
+        frames to run
+    fuse : bool
+        run with superinstruction fusion enabled
+    trace : bool
+        run with the trace jit enabled
+
+    Returns
+    -------
+    dict
+        raw counts, wall time and per second rates
+    """
+    emulator = core.Core()
+    emulator.mmu.rom = list(rom)
+    if fuse:
+        fusion.Fusion(emulator.cpu, emulator.scheduler).enable()
+    if trace:
+        jit.TraceJit(emulator.cpu, emulator.scheduler).enable()
+    step = emulator.step
+    gpu = emulator.gpu
+    target = gpu.frame + frames
+    instructions = 0
+    start = time.perf_counter()
+    while gpu.frame < target:
+        step()
+        instructions += 1
+    wall_time = time.perf_counter() - start
+    return {
+        'cycles': emulator.cycles,
+        'instructions': instructions,
+        'frames': frames,
+        'wall_time': wall_time,
+        'cycles_per_second': emulator.cycles / wall_time,
+        'instructions_per_second': instructions / wall_time,
+        'frames_per_second': frames / wall_time,
+    }
+
+
+def run_suite(names=None, frames=30, repeat=3, fuse=False, trace=False):
+    """
+    Runs workloads, keeping the fastest of `repeat` runs of each.
+
+    Parameters
+    ----------
+    names : list of String
+        workloads to run, defaults to all of them
+    frames : int
+        frames per run
+    repeat : int
+        runs per workload
+    fuse : bool
+        run with superinstruction fusion enabled
+    trace : bool
+        run with the trace jit enabled
+
+    Returns
+    -------
+    dict
+        workload name to result, see run_workload
+    """
+    results = {}
+    for name in names or sorted(WORKLOADS):
+        rom = WORKLOADS[name]().build()
+        runs = [run_workload(rom, frames, fuse, trace) for _ in range(repeat)]
+        results[name] = min(runs, key=lambda run: run['wall_time'])
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares results against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        results from run_suite
+    baseline : dict
+        earlier results from run_suite
+    threshold : float
+        allowed fractional slowdown before a workload counts as regressed
+
+    Returns
+    -------
+    list of String
+        one message per regressed workload
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        old = baseline[name][COMPARED]
+        new = result[COMPARED]
+        if new < old * (1 - threshold):
+            regressions.append('%s: %.0f -> %.0f cycles/s (%.1f%% slower)'
+                               % (name, old, new, 100 * (1 - new / old)))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    """
+    Formats results as a text table, with the change against baseline.
+    """
+    lines = ['%-12s %14s %14s %10s %8s' %
+             ('workload', 'cycles/s', 'instr/s', 'frames/s', 'change')]
+    for name, result in sorted(results.items()):
+        change = ''
+        if baseline and name in baseline:
+            old = baseline[name][COMPARED]
+            change = '%+.1f%%' % (100 * (result[COMPARED] / old - 1))
+        lines.append('%-12s %14.0f %14.0f %10.2f %8s' %
+                     (name, result['cycles_per_second'],
+                      result['instructions_per_second'],
+                      result['frames_per_second'], change))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workloads", type=str, nargs='*', metavar='NAME',
+                        help="Workloads to run: %s. Defaults to all." %
+                             ', '.join(sorted(WORKLOADS)))
+    parser.add_argument("--frames", type=int, default=30,
+                        help="Frames to run per workload.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per workload, the fastest is kept.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write results to this JSON file.")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Compare against results in this JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Fractional slowdown that counts as a regression.")
+    parser.add_argument("--fuse", action='store_true',
+                        help="Enable superinstruction fusion.")
+    parser.add_argument("--jit", action='store_true',
+                        help="Enable the trace jit.")
+    args = parser.parse_args()
+
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error("unknown workload %s" % name)
+    results = run_suite(args.workloads, args.frames, args.repeat, args.fuse,
+                        args.jit)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,119 @@
+"""
+Generated handlers for the CB prefixed opcodes.
+
+The 256 CB opcodes are eleven operations (RLC, RRC, RL, RR, SLA, SRA, SWAP,
+SRL, BIT, RES, SET) applied to eight targets (B, C, D, E, H, L, (HL), A).
+Instead of writing 256 methods by hand, each operation is a short source
+template that is specialised for every target and compiled once at import,
+so a handler does its work with straight line code and no per-call lookup
+of what register or bit it is working on. The (HL) variants go through the
+MMU. Cycle counts come from opcodes.CB_CYCLES.
+
+cpu.py installs the handlers as the _op_cb_XX methods of Cpu.
+"""
+__author__ = 'Clayton Powell'
+import opcodes
+
+TARGETS = ('b', 'c', 'd', 'e', 'h', 'l', None, 'a')
+
+# value in v, new value in v and carry out in c
+SHIFTS = (
+    ('RLC', 'c = v >> 7\n'
+            'v = ((v << 1) | c) & 0xff'),
+    ('RRC', 'c = v & 1\n'
+            'v = (v >> 1) | (c << 7)'),
+    ('RL', 'c = v >> 7\n'
+           'v = ((v << 1) | r.carry_flag) & 0xff'),
+    ('RR', 'c = v & 1\n'
+           'v = (v >> 1) | (r.carry_flag << 7)'),
+    ('SLA', 'c = v >> 7\n'
+            'v = (v << 1) & 0xff'),
+    ('SRA', 'c = v & 1\n'
+            'v = (v >> 1) | (v & 0x80)'),
+    ('SWAP', 'c = 0\n'
+             'v = ((v << 4) | (v >> 4)) & 0xff'),
+    ('SRL', 'c = v & 1\n'
+            'v = v >> 1'),
+)
+
+SHIFT_FLAGS = ('r.zero_flag = 0 if v else 1\n'
+               'r.sub_flag = 0\n'
+               'r.hc_flag = 0\n'
+               'r.carry_flag = c')
+
+BIT = ('r.zero_flag = 0 if v & %#04x else 1\n'
+       'r.sub_flag = 0\n'
+       'r.hc_flag = 1')
+RES = 'v = v & %#04x'
+SET = 'v = v | %#04x'
+
+
+def _read(target):
+    if target is None:
+        return ('addr = (r.h * 0x100) | r.l\n'
+                'v = self.mmu.read_byte(addr)')
+    return 'v = r.%s' % target
+
+
+def _write(target):
+    if target is None:
+        return 'self.mmu.write_byte(addr, v)'
+    return 'r.%s = v' % target
+
+
+def _body(op):
+    target = TARGETS[op & 7]
+    bit = (op >> 3) & 7
+    lines = ['r = self.registers']
+    if op < 0x40:
+        lines += [_read(target), SHIFTS[op >> 3][1], _write(target),
+                  SHIFT_FLAGS]
+    elif op < 0x80:
+        lines += [_read(target), BIT % (1 << bit)]
+    else:
+        change = RES % (~(1 << bit) & 0xff) if op < 0xc0 else SET % (1 << bit)
+        if target is None:
+            lines += [_read(target), change, _write(target)]
+        else:
+            # registers are changed in place, e.g. r.b = r.b | 0x01
+            lines.append(change.replace('v', 'r.' + target))
+    lines.append('return %d' % opcodes.CB_CYCLES[op])
+    return '\n'.join(lines)
+
+
+def source(op):
+    """
+    Python source of the handler for one CB opcode.
+
+    Parameters
+    ----------
+    op : int
+        opcode byte following 0xCB
+
+    Returns
+    -------
+    String
+        source of a function taking the cpu as self
+    """
+    body = '\n'.join('    ' + line for line in _body(op).splitlines())
+    return 'def _op_cb_%02x(self):\n    """\n    %s\n    """\n%s\n' % (
+        op, opcodes.CB_OPCODES[op], body)
+
+
+def handlers():
+    """
+    Compiles the handlers of all 256 CB opcodes.
+
+    Returns
+    -------
+    list of function
+        handler for every opcode, named _op_cb_XX with the mnemonic as
+        docstring
+    """
+    namespace = {}
+    exec(compile('\n'.join(source(op) for op in range(256)),
+                 '<cbops>', 'exec'), namespace)
+    return [namespace['_op_cb_%02x' % op] for op in range(256)]
+
+
+HANDLERS = handlers()
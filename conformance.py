@@ -0,0 +1,146 @@
+"""
+Runs conformance test ROMs headless until they report a result.
+
+Test ROMs report in two ways. blargg's print Passed or Failed over the serial
+port, which the serial port's stop conditions catch. mooneye's also execute
+LD B,B, the "magic breakpoint", once done, with the Fibonacci numbers
+3, 5, 8, 13, 21, 34 in B, C, D, E, H and L on success and 0x42 in all of
+them on failure. MagicBreakpoint swaps the cpu's LD B,B handler for one that
+checks the registers, the same way the profiler swaps handlers, so nothing
+is added to the cpu's normal path. Instructions run inside jit traces are
+not seen by it.
+
+Both only record their result. run() checks for one after every
+instruction, so the run stops right after the instruction that reported
+it, with that instruction's cycles counted, instead of after a fixed
+number of frames:
+
+    python conformance.py cpu_instrs.gb --frames 6000
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import sys
+import serialport
+
+PASSED = (3, 5, 8, 13, 21, 34)
+FAILED = (0x42,) * 6
+
+
+def mooneye_registers(registers):
+    """
+    Register condition for mooneye's test ROMs, 'passed', 'failed' or None.
+    """
+    values = tuple(int(getattr(registers, name)) for name in 'bcdehl')
+    if values == PASSED:
+        return 'passed'
+    if values == FAILED:
+        return 'failed'
+    return None
+
+
+class MagicBreakpoint(object):
+    """
+    MagicBreakpoint class that records a result when LD B,B runs with the
+    registers matching a condition.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to watch
+    condition : function
+        takes the cpu's registers, returns a result or None to keep running
+    """
+
+    def __init__(self, cpu, condition=mooneye_registers):
+        self.cpu = cpu
+        self.condition = condition
+        self.result = None
+        self._original = None
+
+    def enable(self):
+        if self._original is not None:
+            return
+        self._original = original = self.cpu.opcodes[0x40]
+        registers = self.cpu.registers
+        condition = self.condition
+
+        def ld_b_b():
+            cycles = original()
+            if self.result is None:
+                self.result = condition(registers)
+            return cycles
+        self.cpu.opcodes = dict(self.cpu.opcodes)
+        self.cpu.opcodes[0x40] = ld_b_b
+
+    def disable(self):
+        if self._original is None:
+            return
+        self.cpu.opcodes[0x40] = self._original
+        self._original = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+
+def run(core, frames, conditions=serialport.BLARGG + serialport.MOONEYE,
+        magic=True):
+    """
+    Runs a loaded test ROM until it reports a result or the frames run out.
+
+    Parameters
+    ----------
+    core : core.Core
+        core with the ROM already loaded
+    frames : int
+        number of frames to give up after
+    conditions : sequence of function
+        serial port stop conditions
+    magic : bool
+        also stop on mooneye's LD B,B breakpoint
+
+    Returns
+    -------
+    String
+        result of the condition that stopped the run, None on timeout
+    """
+    serial = core.serial
+    serial.conditions = list(conditions)
+    serial.result = None
+    magic_breakpoint = MagicBreakpoint(core.cpu)
+    if magic:
+        magic_breakpoint.enable()
+    gpu = core.gpu
+    step = core.step
+    try:
+        # Core.run_frames, checking for a result after every instruction
+        for _ in range(frames):
+            frame = gpu.frame
+            while gpu.frame == frame:
+                step()
+                result = serial.result or magic_breakpoint.result
+                if result is not None:
+                    return result
+    finally:
+        magic_breakpoint.disable()
+        serial.conditions = []
+    return None
+
+
+if __name__ == '__main__':
+    import core
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rom", type=str, metavar='FILE',
+                        help="File path to the test Rom to run.")
+    parser.add_argument("--frames", type=int, default=6000,
+                        help="Frames to run before giving up.")
+    args = parser.parse_args()
+    emulator = core.Core()
+    emulator.load_rom(args.rom)
+    result = run(emulator, args.frames)
+    sys.stdout.write(emulator.serial.text)
+    print("\n%s after %d cycles" % (result or 'timeout', emulator.cycles))
+    sys.exit(0 if result == 'passed' else 1)
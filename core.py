@@ -0,0 +1,102 @@
+"""
+Headless GameBoy core.
+
+Wires the cpu, gpu, mmu, timer, serial port and interrupts together without
+any window so ROMs can be run as fast as the interpreter allows, e.g. for
+movie replay, benchmarks and regression runs. The pyglet frontend in gbpy.py
+drives the same core.
+"""
+__author__ = 'Clayton Powell'
+import cpu
+import mmu
+import gpu
+import interrupts
+import scheduler
+import serialport
+import timer
+
+
+class Core(object):
+    """
+    Core class that owns the emulated hardware and steps it forward.
+    """
+
+    def __init__(self, headless=True, audio=False):
+        self.scheduler = scheduler.Scheduler()
+        self.mmu = mmu.MMU()
+        self.cpu = cpu.Cpu(self.mmu)
+        self.interrupts = interrupts.Interrupts(self.cpu, self.scheduler)
+        self.gpu = gpu.GPU(self.mmu, headless=headless,
+                           scheduler=self.scheduler, irq=self.interrupts)
+        self.mmu.gpu = self.gpu
+        self.timer = timer.Timer(self.mmu, self.scheduler, self.interrupts)
+        self.serial = serialport.Serial(self.mmu, self.interrupts)
+        self.apu = None
+        if audio:
+            # NumPy is only needed with sound
+            import apu
+            self.apu = apu.APU(self.mmu, self.scheduler)
+        self.joypad = self.mmu.joypad
+
+    @property
+    def cycles(self):
+        """
+        Cycles run since the core was created.
+        """
+        return self.scheduler.now
+
+    def load_rom(self, rom_path):
+        """
+        Hand off to mmu to load the rom into memory from file at rom_path.
+
+        Parameters
+        ----------
+        rom_path : String
+            Path to ROM on system
+        """
+        self.mmu.load(rom_path)
+        self.serial.reset()
+
+    def step(self):
+        """
+        Executes a single instruction and runs the hardware events that
+        became due during it.
+
+        Returns
+        -------
+        int
+            number of clock cycles the instruction took
+        """
+        cycles = self.cpu.cycle()
+        # Scheduler.advance inlined, this runs once per instruction
+        scheduler = self.scheduler
+        scheduler.now += cycles
+        if scheduler.now >= scheduler.deadline:
+            scheduler.run()
+        return cycles
+
+    def run_frame(self):
+        """
+        Runs until the gpu enters v-blank and a new frame is complete.
+
+        Returns
+        -------
+        int
+            number of the frame that was just completed
+        """
+        frame = self.gpu.frame
+        while self.gpu.frame == frame:
+            self.step()
+        return self.gpu.frame
+
+    def run_frames(self, count):
+        """
+        Runs the given number of whole frames.
+
+        Parameters
+        ----------
+        count : int
+            number of frames to run
+        """
+        for _ in range(count):
+            self.run_frame()
@@ -1,6 +1,9 @@
 __author__ = 'Clayton Powell'
 from registers import Registers
 import sys
+import opcodes
+import cbops
+import alu
 #TODO: jump opcodes are currently breaking my register classes. Need some other way to handle them.
 """
 Based off of Pan docs available here:
@@ -18,6 +21,7 @@ class Cpu(object):
         self.mmu = mmu
         self.opcode = 0
         self.interrupts = False
+        self.halted = False
         self.clock_cycles = 0
 
         self.opcodes = {
@@ -232,7 +236,6 @@ class Cpu(object):
             0xd0: self._op_d0,
             0xd1: self._op_d1,
             0xd2: self._op_d2,
-            0xd3: self._op_d3,
             0xd4: self._op_d4,
             0xd5: self._op_d5,
             0xd6: self._op_d6,
@@ -240,32 +243,24 @@ class Cpu(object):
             0xd8: self._op_d8,
             0xd9: self._op_d9,
             0xda: self._op_da,
-            0xdb: self._op_db,
             0xdc: self._op_dc,
-            0xdd: self._op_dd,
             0xde: self._op_de,
             0xdf: self._op_df,
             0xe0: self._op_e0,
             0xe1: self._op_e1,
             0xe2: self._op_e2,
-            0xe3: self._op_e3,
-            0xe4: self._op_e4,
             0xe5: self._op_e5,
             0xe6: self._op_e6,
             0xe7: self._op_e7,
             0xe8: self._op_e8,
             0xe9: self._op_e9,
             0xea: self._op_ea,
-            0xeb: self._op_eb,
-            0xec: self._op_ec,
-            0xed: self._op_ed,
             0xee: self._op_ee,
             0xef: self._op_ef,
             0xf0: self._op_f0,
             0xf1: self._op_f1,
             0xf2: self._op_f2,
             0xf3: self._op_f3,
-            0xf4: self._op_f4,
             0xf5: self._op_f5,
             0xf6: self._op_f6,
             0xf7: self._op_f7,
@@ -273,268 +268,15 @@ class Cpu(object):
             0xf9: self._op_f9,
             0xfa: self._op_fa,
             0xfb: self._op_fb,
-            0xfc: self._op_fc,
-            0xfd: self._op_fd,
             0xfe: self._op_fe,
             0xff: self._op_ff,
         }
-        self.registers.ext_opcodes = {
-            0x00: self._op_cb_00,
-            0x01: self._op_cb_01,
-            0x02: self._op_cb_02,
-            0x03: self._op_cb_03,
-            0x04: self._op_cb_04,
-            0x05: self._op_cb_05,
-            0x06: self._op_cb_06,
-            0x07: self._op_cb_07,
-            0x08: self._op_cb_08,
-            0x09: self._op_cb_09,
-            0x0a: self._op_cb_0a,
-            0x0b: self._op_cb_0b,
-            0x0c: self._op_cb_0c,
-            0x0d: self._op_cb_0d,
-            0x0e: self._op_cb_0e,
-            0x0f: self._op_cb_0f,
-            0x10: self._op_cb_10,
-            0x11: self._op_cb_11,
-            0x12: self._op_cb_12,
-            0x13: self._op_cb_13,
-            0x14: self._op_cb_14,
-            0x15: self._op_cb_15,
-            0x16: self._op_cb_16,
-            0x17: self._op_cb_17,
-            0x18: self._op_cb_18,
-            0x19: self._op_cb_19,
-            0x1a: self._op_cb_1a,
-            0x1b: self._op_cb_1b,
-            0x1c: self._op_cb_1c,
-            0x1d: self._op_cb_1d,
-            0x1e: self._op_cb_1e,
-            0x1f: self._op_cb_1f,
-            0x20: self._op_cb_20,
-            0x21: self._op_cb_21,
-            0x22: self._op_cb_22,
-            0x23: self._op_cb_23,
-            0x24: self._op_cb_24,
-            0x25: self._op_cb_25,
-            0x26: self._op_cb_26,
-            0x27: self._op_cb_27,
-            0x28: self._op_cb_28,
-            0x29: self._op_cb_29,
-            0x2a: self._op_cb_2a,
-            0x2b: self._op_cb_2b,
-            0x2c: self._op_cb_2c,
-            0x2d: self._op_cb_2d,
-            0x2e: self._op_cb_2e,
-            0x2f: self._op_cb_2f,
-            0x30: self._op_cb_30,
-            0x31: self._op_cb_31,
-            0x32: self._op_cb_32,
-            0x33: self._op_cb_33,
-            0x34: self._op_cb_34,
-            0x35: self._op_cb_35,
-            0x36: self._op_cb_36,
-            0x37: self._op_cb_37,
-            0x38: self._op_cb_38,
-            0x39: self._op_cb_39,
-            0x3a: self._op_cb_3a,
-            0x3b: self._op_cb_3b,
-            0x3c: self._op_cb_3c,
-            0x3d: self._op_cb_3d,
-            0x3e: self._op_cb_3e,
-            0x3f: self._op_cb_3f,
-            0x40: self._op_cb_40,
-            0x41: self._op_cb_41,
-            0x42: self._op_cb_42,
-            0x43: self._op_cb_43,
-            0x44: self._op_cb_44,
-            0x45: self._op_cb_45,
-            0x46: self._op_cb_46,
-            0x47: self._op_cb_47,
-            0x48: self._op_cb_48,
-            0x49: self._op_cb_49,
-            0x4a: self._op_cb_4a,
-            0x4b: self._op_cb_4b,
-            0x4c: self._op_cb_4c,
-            0x4d: self._op_cb_4d,
-            0x4e: self._op_cb_4e,
-            0x4f: self._op_cb_4f,
-            0x50: self._op_cb_50,
-            0x51: self._op_cb_51,
-            0x52: self._op_cb_52,
-            0x53: self._op_cb_53,
-            0x54: self._op_cb_54,
-            0x55: self._op_cb_55,
-            0x56: self._op_cb_56,
-            0x57: self._op_cb_57,
-            0x58: self._op_cb_58,
-            0x59: self._op_cb_59,
-            0x5a: self._op_cb_5a,
-            0x5b: self._op_cb_5b,
-            0x5c: self._op_cb_5c,
-            0x5d: self._op_cb_5d,
-            0x5e: self._op_cb_5e,
-            0x5f: self._op_cb_5f,
-            0x60: self._op_cb_60,
-            0x61: self._op_cb_61,
-            0x62: self._op_cb_62,
-            0x63: self._op_cb_63,
-            0x64: self._op_cb_64,
-            0x65: self._op_cb_65,
-            0x66: self._op_cb_66,
-            0x67: self._op_cb_67,
-            0x68: self._op_cb_68,
-            0x69: self._op_cb_69,
-            0x6a: self._op_cb_6a,
-            0x6b: self._op_cb_6b,
-            0x6c: self._op_cb_6c,
-            0x6d: self._op_cb_6d,
-            0x6e: self._op_cb_6e,
-            0x6f: self._op_cb_6f,
-            0x70: self._op_cb_70,
-            0x71: self._op_cb_71,
-            0x72: self._op_cb_72,
-            0x73: self._op_cb_73,
-            0x74: self._op_cb_74,
-            0x75: self._op_cb_75,
-            0x76: self._op_cb_76,
-            0x77: self._op_cb_77,
-            0x78: self._op_cb_78,
-            0x79: self._op_cb_79,
-            0x7a: self._op_cb_7a,
-            0x7b: self._op_cb_7b,
-            0x7c: self._op_cb_7c,
-            0x7d: self._op_cb_7d,
-            0x7e: self._op_cb_7e,
-            0x7f: self._op_cb_7f,
-            0x80: self._op_cb_80,
-            0x81: self._op_cb_81,
-            0x82: self._op_cb_82,
-            0x83: self._op_cb_83,
-            0x84: self._op_cb_84,
-            0x85: self._op_cb_85,
-            0x86: self._op_cb_86,
-            0x87: self._op_cb_87,
-            0x88: self._op_cb_88,
-            0x89: self._op_cb_89,
-            0x8a: self._op_cb_8a,
-            0x8b: self._op_cb_8b,
-            0x8c: self._op_cb_8c,
-            0x8d: self._op_cb_8d,
-            0x8e: self._op_cb_8e,
-            0x8f: self._op_cb_8f,
-            0x90: self._op_cb_90,
-            0x91: self._op_cb_91,
-            0x92: self._op_cb_92,
-            0x93: self._op_cb_93,
-            0x94: self._op_cb_94,
-            0x95: self._op_cb_95,
-            0x96: self._op_cb_96,
-            0x97: self._op_cb_97,
-            0x98: self._op_cb_98,
-            0x99: self._op_cb_99,
-            0x9a: self._op_cb_9a,
-            0x9b: self._op_cb_9b,
-            0x9c: self._op_cb_9c,
-            0x9d: self._op_cb_9d,
-            0x9e: self._op_cb_9e,
-            0x9f: self._op_cb_9f,
-            0xa0: self._op_cb_a0,
-            0xa1: self._op_cb_a1,
-            0xa2: self._op_cb_a2,
-            0xa3: self._op_cb_a3,
-            0xa4: self._op_cb_a4,
-            0xa5: self._op_cb_a5,
-            0xa6: self._op_cb_a6,
-            0xa7: self._op_cb_a7,
-            0xa8: self._op_cb_a8,
-            0xa9: self._op_cb_a9,
-            0xaa: self._op_cb_aa,
-            0xab: self._op_cb_ab,
-            0xac: self._op_cb_ac,
-            0xad: self._op_cb_ad,
-            0xae: self._op_cb_ae,
-            0xaf: self._op_cb_af,
-            0xb0: self._op_cb_b0,
-            0xb1: self._op_cb_b1,
-            0xb2: self._op_cb_b2,
-            0xb3: self._op_cb_b3,
-            0xb4: self._op_cb_b4,
-            0xb5: self._op_cb_b5,
-            0xb6: self._op_cb_b6,
-            0xb7: self._op_cb_b7,
-            0xb8: self._op_cb_b8,
-            0xb9: self._op_cb_b9,
-            0xba: self._op_cb_ba,
-            0xbb: self._op_cb_bb,
-            0xbc: self._op_cb_bc,
-            0xbd: self._op_cb_bd,
-            0xbe: self._op_cb_be,
-            0xbf: self._op_cb_bf,
-            0xc0: self._op_cb_c0,
-            0xc1: self._op_cb_c1,
-            0xc2: self._op_cb_c2,
-            0xc3: self._op_cb_c3,
-            0xc4: self._op_cb_c4,
-            0xc5: self._op_cb_c5,
-            0xc6: self._op_cb_c6,
-            0xc7: self._op_cb_c7,
-            0xc8: self._op_cb_c8,
-            0xc9: self._op_cb_c9,
-            0xca: self._op_cb_ca,
-            0xcb: self._op_cb_cb,
-            0xcc: self._op_cb_cc,
-            0xcd: self._op_cb_cd,
-            0xce: self._op_cb_ce,
-            0xcf: self._op_cb_cf,
-            0xd0: self._op_cb_d0,
-            0xd1: self._op_cb_d1,
-            0xd2: self._op_cb_d2,
-            0xd3: self._op_cb_d3,
-            0xd4: self._op_cb_d4,
-            0xd5: self._op_cb_d5,
-            0xd6: self._op_cb_d6,
-            0xd7: self._op_cb_d7,
-            0xd8: self._op_cb_d8,
-            0xd9: self._op_cb_d9,
-            0xda: self._op_cb_da,
-            0xdb: self._op_cb_db,
-            0xdc: self._op_cb_dc,
-            0xdd: self._op_cb_dd,
-            0xde: self._op_cb_de,
-            0xdf: self._op_cb_df,
-            0xe0: self._op_cb_e0,
-            0xe1: self._op_cb_e1,
-            0xe2: self._op_cb_e2,
-            0xe3: self._op_cb_e3,
-            0xe4: self._op_cb_e4,
-            0xe5: self._op_cb_e5,
-            0xe6: self._op_cb_e6,
-            0xe7: self._op_cb_e7,
-            0xe8: self._op_cb_e8,
-            0xe9: self._op_cb_e9,
-            0xea: self._op_cb_ea,
-            0xeb: self._op_cb_eb,
-            0xec: self._op_cb_ec,
-            0xed: self._op_cb_ed,
-            0xee: self._op_cb_ee,
-            0xf0: self._op_cb_f0,
-            0xf1: self._op_cb_f1,
-            0xf2: self._op_cb_f2,
-            0xf3: self._op_cb_f3,
-            0xf4: self._op_cb_f4,
-            0xf5: self._op_cb_f5,
-            0xf6: self._op_cb_f6,
-            0xf7: self._op_cb_f7,
-            0xf8: self._op_cb_f8,
-            0xf9: self._op_cb_f9,
-            0xfa: self._op_cb_fa,
-            0xfb: self._op_cb_fb,
-            0xfc: self._op_cb_fc,
-            0xfd: self._op_cb_fd,
-            0xfe: self._op_cb_fe,
-            0xff: self._op_cb_ff,
-        }
+        # illegal opcodes share one handler, picked out by the opcode table
+        for op, opcode in enumerate(opcodes.TABLE):
+            if opcode.illegal:
+                self.opcodes[op] = self._illegal
+        self.registers.ext_opcodes = dict(
+            (op, getattr(self, '_op_cb_%02x' % op)) for op in range(256))
 
     def cycle(self):
         """
@@ -553,6 +295,20 @@ class Cpu(object):
             print("Error: {0}".format(msg))
             sys.exit(1)
 
+    def _illegal(self):
+        """
+        Illegal opcode
+        The real cpu locks up on these. Leave the program counter on the
+        opcode so the cpu keeps executing it while time goes on.
+
+        Flags affected:
+        None
+        :return int:
+            number of clock cycles that occur
+        """
+        self.registers.pc -= 1
+        return opcodes.CYCLES[self.opcode]
+
     def _rst(self, pc):
         """
         RST pc
@@ -562,10 +318,9 @@ class Cpu(object):
         :return int:
 
         """
-        self.registers.sp -= 2
-        # TODO: Something seems off here..., don't know why I'm reading instead of writing
-        call_addr = self.mmu.read_byte(self.registers.pc)
-        call_addr += self.mmu.read_byte(self.registers.pc + 1) << 8
+        self.registers.sp = (self.registers.sp - 2) & 0xffff
+        self.mmu.write_byte(self.registers.sp, self.registers.pc & 0xff)
+        self.mmu.write_byte(self.registers.sp + 1, (self.registers.pc >> 8) & 0xff)
         self.registers.jump(pc)
 
     def _cp(self, value):
@@ -582,19 +337,12 @@ class Cpu(object):
         :param value:
             integer value to compare
         """
-        self.registers.sub_flag = 1
-        if self.registers.a == value:
-            self.registers.zero_flag = 1
-        else:
-            self.registers.zero_flag = 0
-        if self.registers.a < value:
-            self.registers.carry_flag = 1
-        else:
-            self.registers.carry_flag = 0
-        if (self.registers.a & 0xf) < (value & 0xf):
-            self.registers.hc_flag = 1
-        else:
-            self.registers.hc_flag = 0
+        registers = self.registers
+        flags = alu.SUB_FLAGS[(registers.a * 0x100) | value]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 1
+        registers.hc_flag = (flags >> 5) & 1
+        registers.carry_flag = (flags >> 4) & 1
 
     def _inc(self, register):
         """
@@ -603,10 +351,12 @@ class Cpu(object):
         :param register:
             target register to increment by one
         """
-        setattr(self.registers, register, getattr(self.registers, register) + 1)
-        self.registers.zero_flag = 1 if temp == 0 else 0
+        value = getattr(self.registers, register)
+        flags = alu.INC_FLAGS[value]
+        setattr(self.registers, register, alu.INC[value])
+        self.registers.zero_flag = flags >> 7
         self.registers.sub_flag = 0
-        self.registers.hc_flag = 1 if (temp & 0xf) == 0 else 0
+        self.registers.hc_flag = (flags >> 5) & 1
 
     def _dec(self, register):
         """
@@ -615,42 +365,50 @@ class Cpu(object):
         :param register:
             target register to decrement by one
         """
-        setattr(self.registers, register, getattr(self.registers, register) - 1)
-        self.registers.zero_flag = 1 if temp == 0 else 0
+        value = getattr(self.registers, register)
+        flags = alu.DEC_FLAGS[value]
+        setattr(self.registers, register, alu.DEC[value])
+        self.registers.zero_flag = flags >> 7
         self.registers.sub_flag = 1
-        self.registers.hc_flag = 1 if (temp & 0xf) > 0xf else 0  # TODO: May have to modify, should be now borrow but is carry
+        self.registers.hc_flag = (flags >> 5) & 1
 
-    def _add(self, value):
+    def _add(self, value, carry=0):
         """
         Internal function to provide add calls to Accumulator register (A).
 
         :param value:
             integer value to add to register A
+        :param carry:
+            carry in, the carry flag for ADC and SBC
         """
-        if ((self.registers.a & 0xf) + (value & 0xf)) > 0xf:
-            self.registers.hc_flag = 1
-        else:
-            self.registers.hc_flag = 0
-        self.registers.a += value
-        self.registers.carry_flag = 1 if self.registers.a > 0xff else 0
-        self.registers.zero_flag = 1 if self.registers.a == 0 else 0
-        self.registers.sub_flag = 0
+        registers = self.registers
+        # alu.index(a, value, carry) written out
+        i = (carry << 16) | (registers.a * 0x100) | value
+        flags = alu.ADD_FLAGS[i]
+        registers.a = alu.ADD[i]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 0
+        registers.hc_flag = (flags >> 5) & 1
+        registers.carry_flag = (flags >> 4) & 1
 
-    def _sub(self, value):
+    def _sub(self, value, carry=0):
         """
         Internal function to provide sub calls to Accumulator register (A).
 
         :param value:
             integer value to substract from register A
-        """
-        if (self.registers.a & 0xf) < (value & 0xf):
-            self.registers.hc_flag = 1
-        else:
-            self.registers.hc_flag = 0
-        self.registers.carry_flag = 1 if self.registers.a < value else 0
-        self.registers.a -= value
-        self.registers.zero_flag = 1 if self.registers.a == 0 else 0
-        self.registers.sub_flag = 1
+        :param carry:
+            carry in, the carry flag for ADC and SBC
+        """
+        registers = self.registers
+        # alu.index(a, value, carry) written out
+        i = (carry << 16) | (registers.a * 0x100) | value
+        flags = alu.SUB_FLAGS[i]
+        registers.a = alu.SUB[i]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 1
+        registers.hc_flag = (flags >> 5) & 1
+        registers.carry_flag = (flags >> 4) & 1
 
     def _and(self, value):
         """
@@ -659,11 +417,14 @@ class Cpu(object):
         :param value:
             integer value to AND with register A
         """
-        self.registers.a &= value
-        self.registers.zero_flag = 1 if self.registers.a == 0 else 0
-        self.registers.hc_flag = 1
-        self.registers.sub_flag = 0
-        self.registers.carry_flag = 0
+        registers = self.registers
+        i = (registers.a * 0x100) | value
+        flags = alu.AND_FLAGS[i]
+        registers.a = alu.AND[i]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 0
+        registers.hc_flag = 1
+        registers.carry_flag = 0
 
     def _or(self, value):
         """
@@ -672,11 +433,14 @@ class Cpu(object):
         :param value:
             integer value to OR with register A
         """
-        self.registers.a |= value
-        self.registers.zero_flag = 1 if self.registers.a == 0 else 0
-        self.registers.carry_flag = 0
-        self.registers.hc_flag = 0
-        self.registers.sub_flag = 0
+        registers = self.registers
+        i = (registers.a * 0x100) | value
+        flags = alu.OR_FLAGS[i]
+        registers.a = alu.OR[i]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 0
+        registers.hc_flag = 0
+        registers.carry_flag = 0
 
     def _xor(self, value):
         """
@@ -685,11 +449,14 @@ class Cpu(object):
         :param value:
             integer value to XOR with register A
         """
-        self.registers.a ^= value
-        self.registers.zero_flag = 1 if self.registers.a == 0 else 0
-        self.registers.carry_flag = 0
-        self.registers.hc_flag = 0
-        self.registers.sub_flag = 0
+        registers = self.registers
+        i = (registers.a * 0x100) | value
+        flags = alu.XOR_FLAGS[i]
+        registers.a = alu.XOR[i]
+        registers.zero_flag = flags >> 7
+        registers.sub_flag = 0
+        registers.hc_flag = 0
+        registers.carry_flag = 0
 
     def _op_00(self):
         """
@@ -749,9 +516,9 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self.registers.c += 1
+        self.registers.c = (self.registers.c + 1) & 0xff
         if self.registers.c == 0:
-            self.registers.b += 1
+            self.registers.b = (self.registers.b + 1) & 0xff
         return 8
 
     def _op_04(self):
@@ -890,9 +657,9 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self.registers.c -= 1
+        self.registers.c = (self.registers.c - 1) & 0xff
         if self.registers.c == 0xff:
-            self.registers.b -= 1
+            self.registers.b = (self.registers.b - 1) & 0xff
         return 8
 
     def _op_0c(self):
@@ -1016,9 +783,9 @@ class Cpu(object):
         :return:
             int: number of clock cycles that occur
         """
-        self.registers.e += 1
+        self.registers.e = (self.registers.e + 1) & 0xff
         if self.registers.e == 0:
-            self.registers.d += 1
+            self.registers.d = (self.registers.d + 1) & 0xff
         return 8
 
     def _op_14(self):
@@ -1348,22 +1115,14 @@ class Cpu(object):
         :return:
             int: number of clock cycles that occur
         """
-        if not self.registers.sub_flag:
-            if self.registers.hc_flag or (self.registers.a & 0xf) > 0x9:
-                self.registers.a += 0x06
-            if self.registers.carry_flag or self.registers.a > 0x9f:
-                self.registers.a += 0x60
-        else:
-            if self.registers.hc_flag:
-                self.registers.a = (self.registers.a - 0x06) & 0xff
-            if self.registers.carry_flag:
-                self.registers.a -= 0x60
-        if self.registers.a == 0:
-            self.registers.zero_flag = 1
-        self.registers.hc_flag = 0
-        if (self.registers.a & 0x100) == 0x100:
-            self.registers.carry_flag = 1
-        self.registers.a &= 0xff
+        registers = self.registers
+        i = ((registers.sub_flag << 10) | (registers.hc_flag << 9) |
+             (registers.carry_flag << 8) | registers.a)
+        flags = alu.DAA_FLAGS[i]
+        registers.a = alu.DAA[i]
+        registers.zero_flag = flags >> 7
+        registers.hc_flag = 0
+        registers.carry_flag = (flags >> 4) & 1
         return 4
 
     def _op_28(self):
@@ -1567,17 +1326,12 @@ class Cpu(object):
             number of clock cycles that occur
         """
         addr = (self.registers.h << 8) + self.registers.l
-        value = (self.mmu.read_byte(addr) + 1) & 0xff
-        self.mmu.write_byte(addr, value)
+        value = self.mmu.read_byte(addr)
+        flags = alu.INC_FLAGS[value]
+        self.mmu.write_byte(addr, alu.INC[value])
+        self.registers.zero_flag = flags >> 7
         self.registers.sub_flag = 0
-        if value == 0:
-            self.registers.zero_flag = 1
-        else:
-            self.registers.zero_flag = 0
-        if (value & 0xf) == 0:
-            self.registers.hc_flag = 1
-        else:
-            self.registers.hc_flag = 0
+        self.registers.hc_flag = (flags >> 5) & 1
         return 12
 
     def _op_35(self):
@@ -1593,12 +1347,13 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        temp = self.mmu.read_byte((self.registers.h << 8) + self.registers.l)
-        temp = (temp - 1) & 0xff
-        self.mmu.write_byte((self.registers.h << 8) + self.registers.l, temp)
-        self.registers.zero_flag = 1 if temp == 0 else 0
+        addr = (self.registers.h << 8) + self.registers.l
+        value = self.mmu.read_byte(addr)
+        flags = alu.DEC_FLAGS[value]
+        self.mmu.write_byte(addr, alu.DEC[value])
+        self.registers.zero_flag = flags >> 7
         self.registers.sub_flag = 1
-        self.registers.hc_flag = 1 if (temp & 0xf) > 0xf else 0
+        self.registers.hc_flag = (flags >> 5) & 1
         return 12
 
     def _op_36(self):
@@ -1958,7 +1713,7 @@ class Cpu(object):
             number of clock cycles that occur
         """
         self.registers.c = self.mmu.read_byte((self.registers.h << 8) + self.registers.l)
-        return 4
+        return 8
 
     def _op_4f(self):
         """
@@ -2480,7 +2235,12 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        # TODO: Implement once we have started working on cycle routines
+        if self.mmu.irq is not None:
+            # run HALT again until an interrupt wakes the cpu up
+            self.registers.pc -= 1
+            if not self.halted:
+                self.halted = True
+                self.mmu.irq.poll()
         return 4
 
     def _op_77(self):
@@ -2741,7 +2501,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.b + self.registers.carry_flag)
+        self._add(self.registers.b, self.registers.carry_flag)
         return 4
 
     def _op_89(self):
@@ -2757,7 +2517,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.c + self.registers.carry_flag)
+        self._add(self.registers.c, self.registers.carry_flag)
         return 4
 
     def _op_8a(self):
@@ -2773,7 +2533,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.d + self.registers.carry_flag)
+        self._add(self.registers.d, self.registers.carry_flag)
         return 4
 
     def _op_8b(self):
@@ -2789,7 +2549,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.e + self.registers.carry_flag)
+        self._add(self.registers.e, self.registers.carry_flag)
         return 4
 
     def _op_8c(self):
@@ -2805,7 +2565,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.h + self.registers.carry_flag)
+        self._add(self.registers.h, self.registers.carry_flag)
         return 4
 
     def _op_8d(self):
@@ -2821,7 +2581,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.l + self.registers.carry_flag)
+        self._add(self.registers.l, self.registers.carry_flag)
         return 4
 
     def _op_8e(self):
@@ -2837,7 +2597,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.mmu.read_byte((self.registers.h << 8) + self.registers.l) + self.registers.carry_flag)
+        self._add(self.mmu.read_byte((self.registers.h << 8) + self.registers.l), self.registers.carry_flag)
         return 8
 
     def _op_8f(self):
@@ -2853,7 +2613,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.registers.a + self.registers.carry_flag)
+        self._add(self.registers.a, self.registers.carry_flag)
         return 4
 
     def _op_90(self):
@@ -3006,7 +2766,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.b + self.registers.carry_flag)
+        self._sub(self.registers.b, self.registers.carry_flag)
         return 4
 
     def _op_99(self):
@@ -3023,7 +2783,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.c + self.registers.carry_flag)
+        self._sub(self.registers.c, self.registers.carry_flag)
         return 4
 
     def _op_9a(self):
@@ -3040,7 +2800,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.d + self.registers.carry_flag)
+        self._sub(self.registers.d, self.registers.carry_flag)
         return 4
 
     def _op_9b(self):
@@ -3057,7 +2817,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.e + self.registers.carry_flag)
+        self._sub(self.registers.e, self.registers.carry_flag)
         return 4
 
     def _op_9c(self):
@@ -3074,7 +2834,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.h + self.registers.carry_flag)
+        self._sub(self.registers.h, self.registers.carry_flag)
         return 4
 
     def _op_9d(self):
@@ -3091,7 +2851,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.l + self.registers.carry_flag)
+        self._sub(self.registers.l, self.registers.carry_flag)
         return 4
 
     def _op_9e(self):
@@ -3108,8 +2868,8 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.mmu.read_byte((self.registers.h << 8) + self.registers.l)
-                                      + self.registers.carry_flag)
+        self._sub(self.mmu.read_byte((self.registers.h << 8) + self.registers.l),
+                  self.registers.carry_flag)
         return 8
 
     def _op_9f(self):
@@ -3126,7 +2886,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._sub(self.registers.a + self.registers.carry_flag)
+        self._sub(self.registers.a, self.registers.carry_flag)
         return 4
 
     def _op_a0(self):
@@ -3765,7 +3525,7 @@ class Cpu(object):
             number of clock cycles that occur
         """
         self._rst(0x0)
-        return 32
+        return 16
 
     def _op_c8(self):
         """
@@ -3777,7 +3537,6 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        #TODO: not implemented correctly
         if self.registers.zero_flag:
             return self._op_c9() + 4
         return 8
@@ -3796,7 +3555,7 @@ class Cpu(object):
         high = self.mmu.read_byte(self.registers.sp + 1)
         self.registers.sp = (self.registers.sp + 2) & 0xffff
         self.registers.pc = (high << 8) | low
-        return 8
+        return 16
 
     def _op_ca(self):
         """
@@ -3868,7 +3627,7 @@ class Cpu(object):
         :return int:
             number of clock cycles that occur
         """
-        self._add(self.mmu.read_byte(self.registers.pc) + self.registers.carry_flag)
+        self._add(self.mmu.read_byte(self.registers.pc), self.registers.carry_flag)
         self.registers.pc += 1
         return 8
 
@@ -3884,7 +3643,7 @@ class Cpu(object):
             number of clock cycles that occur
         """
         self._rst(0x8)
-        return 32
+        return 16
 
     def _op_d0(self):
         """
@@ -3930,13 +3689,6 @@ class Cpu(object):
             return self._op_c3()
         return 12
 
-    def _op_d3(self):
-        """
-        Not Implemented by CPU spec
-        """
-        #TODO: throw error in case program calls this function?
-        pass
-
     def _op_d4(self):
         """
         CALL NC, nn
@@ -3996,7 +3748,7 @@ class Cpu(object):
             number of clock cycles that occur
         """
         self._rst(0x10)
-        return 32
+        return 16
 
     def _op_d8(self):
         """
@@ -4009,7 +3761,7 @@ class Cpu(object):
             number of clock cycles that occur
         """
         if self.registers.carry_flag:
-            return self._op_c9()
+            return self._op_c9() + 4
         return 8
 
     def _op_d9(self):
@@ -4023,6 +3775,8 @@ class Cpu(object):
         """
         self._op_c9()
         self.interrupts = True
+        if self.mmu.irq is not None:
+            self.mmu.irq.poll()
         return 16
 
     def _op_da(self):
@@ -4038,13 +3792,6 @@ class Cpu(object):
             return self._op_c3()
         return 12
 
-    def _op_db(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_dc(self):
         """
         CALL C, nn
@@ -4058,13 +3805,6 @@ class Cpu(object):
             return self._op_cd()
         return 12
 
-    def _op_dd(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_de(self):
         """
         SBC A, d8
@@ -4077,7 +3817,7 @@ class Cpu(object):
         C - Set if no borrow
         :return:
         """
-        self._sub(self.mmu.read_byte(self.registers.pc) + self.registers.carry_flag)
+        self._sub(self.mmu.read_byte(self.registers.pc), self.registers.carry_flag)
         self.registers.pc += 1
         return 8
 
@@ -4092,7 +3832,7 @@ class Cpu(object):
         :return:
         """
         self._rst(0x18)
-        return 32
+        return 16
 
     def _op_e0(self):
         """
@@ -4134,20 +3874,6 @@ class Cpu(object):
         self.mmu.write_byte((0xff00 + self.registers.c), self.registers.a)
         return 8
 
-    def _op_e3(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
-    def _op_e4(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_e5(self):
         """
         PUSH HL
@@ -4190,7 +3916,7 @@ class Cpu(object):
         :return:
         """
         self._rst(0x20)
-        return 32
+        return 16
 
     def _op_e8(self):
         """
@@ -4248,27 +3974,6 @@ class Cpu(object):
         self.mmu.write_byte(addr, self.registers.a)
         return 16
 
-    def _op_eb(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
-    def _op_ec(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
-    def _op_ed(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_ee(self):
         """
         XOR d8
@@ -4296,7 +4001,7 @@ class Cpu(object):
         :return:
         """
         self._rst(0x28)
-        return 32
+        return 16
 
     def _op_f0(self):
         """
@@ -4319,8 +4024,11 @@ class Cpu(object):
         :return:
         """
         self.registers.a = self.mmu.read_byte(self.registers.sp + 1)
-        self.f = self.mmu.read_byte(self.registers.sp) & 0xf0  # flags only hold four bits here
-        # TODO: need to translate this read into our separate flags
+        flags = self.mmu.read_byte(self.registers.sp)
+        self.registers.zero_flag = (flags >> 7) & 1
+        self.registers.sub_flag = (flags >> 6) & 1
+        self.registers.hc_flag = (flags >> 5) & 1
+        self.registers.carry_flag = (flags >> 4) & 1
         self.registers.sp = (self.registers.sp + 2) & 0xffff
         return 12
 
@@ -4346,15 +4054,11 @@ class Cpu(object):
         :return:
         """
         self.interrupts = False
+        if self.mmu.irq is not None:
+            # an EI right before has not taken effect yet
+            self.mmu.irq.cancel_enable()
         return 4
 
-    def _op_f4(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_f5(self):
         """
         PUSH AF
@@ -4365,9 +4069,8 @@ class Cpu(object):
         None
         :return:
         """
-        # TODO: need to find a way to implement pushing/popping flags register
         self.registers.sp = (self.registers.sp - 2) & 0xffff
-        self.mmu.write_byte(self.registers.sp, self.f)
+        self.mmu.write_byte(self.registers.sp, self.registers.flags())
         self.mmu.write_byte(self.registers.sp + 1, self.registers.a)
         return 16
 
@@ -4398,7 +4101,7 @@ class Cpu(object):
         :return:
         """
         self._rst(0x30)
-        return 32
+        return 16
 
     def _op_f8(self):
         """
@@ -4451,7 +4154,7 @@ class Cpu(object):
         None
         :return:
         """
-        self.registers.a = self.mmu.read_word(self.registers.pc)
+        self.registers.a = self.mmu.read_byte(self.mmu.read_word(self.registers.pc))
         self.registers.pc += 2
         return 16
 
@@ -4464,24 +4167,13 @@ class Cpu(object):
         None
         :return:
         """
-        # TODO: Need to wait one instruction then enable interrupts
-        self.interrupts = True
+        if self.mmu.irq is not None:
+            # IME is set once the next instruction has run
+            self.mmu.irq.enable()
+        else:
+            self.interrupts = True
         return 4
 
-    def _op_fc(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
-    def _op_fd(self):
-        """
-        Not Implemented
-        :return:
-        """
-        pass
-
     def _op_fe(self):
         """
         CP d8
@@ -4507,813 +4199,9 @@ class Cpu(object):
         :return:
         """
         self._rst(0x38)
-        return 32
-
-    def _op_cb_00(self):
-        pass
-
-    def _op_cb_01(self):
-        pass
-
-    def _op_cb_02(self):
-        pass
-
-    def _op_cb_03(self):
-        pass
-
-    def _op_cb_04(self):
-        pass
-
-    def _op_cb_05(self):
-        pass
-
-    def _op_cb_06(self):
-        pass
-
-    def _op_cb_07(self):
-        pass
-
-    def _op_cb_08(self):
-        pass
-
-    def _op_cb_09(self):
-        pass
-
-    def _op_cb_0a(self):
-        pass
-
-    def _op_cb_0b(self):
-        pass
-
-    def _op_cb_0c(self):
-        pass
-
-    def _op_cb_0d(self):
-        pass
-
-    def _op_cb_0e(self):
-        pass
-
-    def _op_cb_0f(self):
-        pass
-
-    def _op_cb_10(self):
-        pass
-
-    def _op_cb_11(self):
-        """
-        RL C
-        Rotate C left through Carry flag.
-
-        Flags affected:
-        Z - Set if result is zero
-        N - Reset to 0
-        H - Reset to 0
-        C - Contains old bit 7 data
-        :return:
-        """
-        self.registers.sub_flag = 0
-        self.registers.hc_flag = 0
-        self.registers.carry_flag = (self.registers.c & 0x80) >> 7
-        self.registers.c = (self.registers.c << 1) & 0xff
-        if self.registers.c == 0:
-            self.registers.zero_flag = 1
-
-    def _op_cb_12(self):
-        pass
-
-    def _op_cb_13(self):
-        pass
-
-    def _op_cb_14(self):
-        pass
-
-    def _op_cb_15(self):
-        pass
-
-    def _op_cb_16(self):
-        pass
-
-    def _op_cb_17(self):
-        pass
-
-    def _op_cb_18(self):
-        pass
-
-    def _op_cb_19(self):
-        pass
-
-    def _op_cb_1a(self):
-        pass
-
-    def _op_cb_1b(self):
-        pass
-
-    def _op_cb_1c(self):
-        pass
-
-    def _op_cb_1d(self):
-        pass
-
-    def _op_cb_1e(self):
-        pass
-
-    def _op_cb_1f(self):
-        pass
-
-    def _op_cb_20(self):
-        pass
-
-    def _op_cb_21(self):
-        pass
-
-    def _op_cb_22(self):
-        pass
-
-    def _op_cb_23(self):
-        pass
-
-    def _op_cb_24(self):
-        pass
-
-    def _op_cb_25(self):
-        pass
-
-    def _op_cb_26(self):
-        pass
-
-    def _op_cb_27(self):
-        pass
-
-    def _op_cb_28(self):
-        pass
-
-    def _op_cb_29(self):
-        pass
-
-    def _op_cb_2a(self):
-        pass
-
-    def _op_cb_2b(self):
-        pass
-
-    def _op_cb_2c(self):
-        pass
-
-    def _op_cb_2d(self):
-        pass
-
-    def _op_cb_2e(self):
-        pass
-
-    def _op_cb_2f(self):
-        pass
-
-    def _op_cb_30(self):
-        pass
-
-    def _op_cb_31(self):
-        pass
-
-    def _op_cb_32(self):
-        pass
-
-    def _op_cb_33(self):
-        pass
-
-    def _op_cb_34(self):
-        pass
-
-    def _op_cb_35(self):
-        pass
-
-    def _op_cb_36(self):
-        pass
-
-    def _op_cb_37(self):
-        pass
-
-    def _op_cb_38(self):
-        pass
-
-    def _op_cb_39(self):
-        pass
-
-    def _op_cb_3a(self):
-        pass
-
-    def _op_cb_3b(self):
-        pass
-
-    def _op_cb_3c(self):
-        pass
-
-    def _op_cb_3d(self):
-        pass
-
-    def _op_cb_3e(self):
-        pass
-
-    def _op_cb_3f(self):
-        pass
-
-    def _op_cb_40(self):
-        pass
-
-    def _op_cb_41(self):
-        pass
-
-    def _op_cb_42(self):
-        pass
-
-    def _op_cb_43(self):
-        pass
-
-    def _op_cb_44(self):
-        pass
-
-    def _op_cb_45(self):
-        pass
-
-    def _op_cb_46(self):
-        pass
-
-    def _op_cb_47(self):
-        pass
-
-    def _op_cb_48(self):
-        pass
-
-    def _op_cb_49(self):
-        pass
-
-    def _op_cb_4a(self):
-        pass
-
-    def _op_cb_4b(self):
-        pass
-
-    def _op_cb_4c(self):
-        pass
-
-    def _op_cb_4d(self):
-        pass
-
-    def _op_cb_4e(self):
-        pass
-
-    def _op_cb_4f(self):
-        pass
-
-    def _op_cb_50(self):
-        pass
-
-    def _op_cb_51(self):
-        pass
-
-    def _op_cb_52(self):
-        pass
-
-    def _op_cb_53(self):
-        pass
-
-    def _op_cb_54(self):
-        pass
-
-    def _op_cb_55(self):
-        pass
-
-    def _op_cb_56(self):
-        pass
-
-    def _op_cb_57(self):
-        pass
-
-    def _op_cb_58(self):
-        pass
-
-    def _op_cb_59(self):
-        pass
-
-    def _op_cb_5a(self):
-        pass
-
-    def _op_cb_5b(self):
-        pass
-
-    def _op_cb_5c(self):
-        pass
-
-    def _op_cb_5d(self):
-        pass
-
-    def _op_cb_5e(self):
-        pass
-
-    def _op_cb_5f(self):
-        pass
-
-    def _op_cb_60(self):
-        pass
-
-    def _op_cb_61(self):
-        pass
-
-    def _op_cb_62(self):
-        pass
-
-    def _op_cb_63(self):
-        pass
-
-    def _op_cb_64(self):
-        pass
-
-    def _op_cb_65(self):
-        pass
-
-    def _op_cb_66(self):
-        pass
-
-    def _op_cb_67(self):
-        pass
-
-    def _op_cb_68(self):
-        pass
-
-    def _op_cb_69(self):
-        pass
-
-    def _op_cb_6a(self):
-        pass
-
-    def _op_cb_6b(self):
-        pass
-
-    def _op_cb_6c(self):
-        pass
-
-    def _op_cb_6d(self):
-        pass
-
-    def _op_cb_6e(self):
-        pass
-
-    def _op_cb_6f(self):
-        pass
-
-    def _op_cb_70(self):
-        pass
-
-    def _op_cb_71(self):
-        pass
-
-    def _op_cb_72(self):
-        pass
-
-    def _op_cb_73(self):
-        pass
-
-    def _op_cb_74(self):
-        pass
-
-    def _op_cb_75(self):
-        pass
-
-    def _op_cb_76(self):
-        pass
-
-    def _op_cb_77(self):
-        pass
-
-    def _op_cb_78(self):
-        pass
-
-    def _op_cb_79(self):
-        pass
-
-    def _op_cb_7a(self):
-        pass
-
-    def _op_cb_7b(self):
-        pass
-
-    def _op_cb_7c(self):
-        """
-        BIT 7, H
-        Test bit 7 in register H.
-
-        Flags affected:
-        Z - Set if bit 7 of register H is 0
-        N - Reset to 0
-        H - Set to 1
-        C - Not affected
-        :return:
-        """
-        self.registers.sub_flag = 0
-        self.registers.hc_flag = 1
-        if self.registers.h & 0x80 == 0x80:
-            self.registers.zero_flag = 0
-        else:
-            self.registers.zero_flag = 1
-
-    def _op_cb_7d(self):
-        pass
-
-    def _op_cb_7e(self):
-        pass
-
-    def _op_cb_7f(self):
-        pass
-
-    def _op_cb_80(self):
-        pass
-
-    def _op_cb_81(self):
-        pass
-
-    def _op_cb_82(self):
-        pass
-
-    def _op_cb_83(self):
-        pass
-
-    def _op_cb_84(self):
-        pass
-
-    def _op_cb_85(self):
-        pass
-
-    def _op_cb_86(self):
-        pass
-
-    def _op_cb_87(self):
-        """
-        RES 0, A
-        Reset bit 0 in register A.
-
-        Flags affected:
-        None
-        :return:
-        """
-        self.registers.a &= 0xfe
-        return 8
-
-    def _op_cb_88(self):
-        pass
-
-    def _op_cb_89(self):
-        pass
-
-    def _op_cb_8a(self):
-        pass
-
-    def _op_cb_8b(self):
-        pass
-
-    def _op_cb_8c(self):
-        pass
-
-    def _op_cb_8d(self):
-        pass
-
-    def _op_cb_8e(self):
-        pass
-
-    def _op_cb_8f(self):
-        pass
-
-    def _op_cb_90(self):
-        pass
-
-    def _op_cb_91(self):
-        pass
-
-    def _op_cb_92(self):
-        pass
-
-    def _op_cb_93(self):
-        pass
-
-    def _op_cb_94(self):
-        pass
-
-    def _op_cb_95(self):
-        pass
-
-    def _op_cb_96(self):
-        pass
-
-    def _op_cb_97(self):
-        pass
-
-    def _op_cb_98(self):
-        pass
-
-    def _op_cb_99(self):
-        pass
-
-    def _op_cb_9a(self):
-        pass
-
-    def _op_cb_9b(self):
-        pass
-
-    def _op_cb_9c(self):
-        pass
-
-    def _op_cb_9d(self):
-        pass
-
-    def _op_cb_9e(self):
-        pass
-
-    def _op_cb_9f(self):
-        pass
-
-    def _op_cb_a0(self):
-        pass
-
-    def _op_cb_a1(self):
-        pass
-
-    def _op_cb_a2(self):
-        pass
-
-    def _op_cb_a3(self):
-        pass
-
-    def _op_cb_a4(self):
-        pass
-
-    def _op_cb_a5(self):
-        pass
-
-    def _op_cb_a6(self):
-        pass
-
-    def _op_cb_a7(self):
-        pass
-
-    def _op_cb_a8(self):
-        pass
-
-    def _op_cb_a9(self):
-        pass
-
-    def _op_cb_aa(self):
-        pass
-
-    def _op_cb_ab(self):
-        pass
-
-    def _op_cb_ac(self):
-        pass
-
-    def _op_cb_ad(self):
-        pass
-
-    def _op_cb_ae(self):
-        pass
-
-    def _op_cb_af(self):
-        pass
-
-    def _op_cb_b0(self):
-        pass
-
-    def _op_cb_b1(self):
-        pass
-
-    def _op_cb_b2(self):
-        pass
-
-    def _op_cb_b3(self):
-        pass
-
-    def _op_cb_b4(self):
-        pass
-
-    def _op_cb_b5(self):
-        pass
-
-    def _op_cb_b6(self):
-        pass
-
-    def _op_cb_b7(self):
-        pass
-
-    def _op_cb_b8(self):
-        pass
-
-    def _op_cb_b9(self):
-        pass
-
-    def _op_cb_ba(self):
-        pass
-
-    def _op_cb_bb(self):
-        pass
-
-    def _op_cb_bc(self):
-        pass
-
-    def _op_cb_bd(self):
-        pass
-
-    def _op_cb_be(self):
-        pass
-
-    def _op_cb_bf(self):
-        pass
-
-    def _op_cb_c0(self):
-        pass
-
-    def _op_cb_c1(self):
-        pass
-
-    def _op_cb_c2(self):
-        pass
-
-    def _op_cb_c3(self):
-        pass
-
-    def _op_cb_c4(self):
-        pass
-
-    def _op_cb_c5(self):
-        pass
-
-    def _op_cb_c6(self):
-        pass
-
-    def _op_cb_c7(self):
-        pass
-
-    def _op_cb_c8(self):
-        pass
-
-    def _op_cb_c9(self):
-        pass
-
-    def _op_cb_ca(self):
-        pass
-
-    def _op_cb_cb(self):
-        pass
-
-    def _op_cb_cc(self):
-        pass
-
-    def _op_cb_cd(self):
-        pass
-
-    def _op_cb_ce(self):
-        pass
-
-    def _op_cb_cf(self):
-        pass
-
-    def _op_cb_d0(self):
-        pass
-
-    def _op_cb_d1(self):
-        pass
-
-    def _op_cb_d2(self):
-        pass
-
-    def _op_cb_d3(self):
-        pass
-
-    def _op_cb_d4(self):
-        pass
-
-    def _op_cb_d5(self):
-        pass
-
-    def _op_cb_d6(self):
-        pass
-
-    def _op_cb_d7(self):
-        pass
-
-    def _op_cb_d8(self):
-        pass
-
-    def _op_cb_d9(self):
-        pass
-
-    def _op_cb_da(self):
-        pass
-
-    def _op_cb_db(self):
-        pass
-
-    def _op_cb_dc(self):
-        pass
-
-    def _op_cb_dd(self):
-        pass
-
-    def _op_cb_de(self):
-        pass
-
-    def _op_cb_df(self):
-        pass
-
-    def _op_cb_e0(self):
-        pass
-
-    def _op_cb_e1(self):
-        pass
-
-    def _op_cb_e2(self):
-        pass
-
-    def _op_cb_e3(self):
-        pass
-
-    def _op_cb_e4(self):
-        pass
-
-    def _op_cb_e5(self):
-        pass
-
-    def _op_cb_e6(self):
-        pass
-
-    def _op_cb_e7(self):
-        pass
-
-    def _op_cb_e8(self):
-        pass
-
-    def _op_cb_e9(self):
-        pass
-
-    def _op_cb_ea(self):
-        pass
-
-    def _op_cb_eb(self):
-        pass
-
-    def _op_cb_ec(self):
-        pass
-
-    def _op_cb_ed(self):
-        pass
-
-    def _op_cb_ee(self):
-        pass
-
-    def _op_cb_ef(self):
-        pass
-
-    def _op_cb_f0(self):
-        pass
-
-    def _op_cb_f1(self):
-        pass
-
-    def _op_cb_f2(self):
-        pass
-
-    def _op_cb_f3(self):
-        pass
-
-    def _op_cb_f4(self):
-        pass
-
-    def _op_cb_f5(self):
-        pass
-
-    def _op_cb_f6(self):
-        pass
-
-    def _op_cb_f7(self):
-        pass
-
-    def _op_cb_f8(self):
-        pass
-
-    def _op_cb_f9(self):
-        pass
-
-    def _op_cb_fa(self):
-        pass
-
-    def _op_cb_fb(self):
-        pass
-
-    def _op_cb_fc(self):
-        pass
-
-    def _op_cb_fd(self):
-        pass
+        return 16
 
-    def _op_cb_fe(self):
-        pass
 
-    def _op_cb_ff(self):
-        pass
+# CB prefixed opcode handlers are generated from templates, see cbops.py
+for _handler in cbops.HANDLERS:
+    setattr(Cpu, _handler.__name__, _handler)
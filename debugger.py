@@ -0,0 +1,228 @@
+"""
+Breakpoints and watchpoints for the GameBoy emulator.
+
+Nothing here touches the normal execution path. While breakpoints or
+watchpoints are set, the cpu's cycle method and the mmu's read_byte and
+write_byte are shadowed by checking wrappers; once the last one is removed
+the wrappers are removed too and the cpu and mmu run their plain methods
+again.
+
+Execution breakpoints are looked up in a 64KB bitmap indexed by PC before
+the (bank, PC) pair is checked. Watchpoints keep a 256 entry page map, so an
+access to an unwatched page costs one lookup and only accesses inside a
+watched page check the address.
+
+A hit raises DebugBreak out of Cpu.cycle before the next instruction runs,
+so the instruction that triggered a watchpoint has completed and the one at
+a breakpoint has not started. Stepping again continues past it.
+"""
+__author__ = 'Clayton Powell'
+
+
+class DebugBreak(Exception):
+    """
+    DebugBreak exception raised when a breakpoint or watchpoint is hit.
+
+    Parameters
+    ----------
+    kind : String
+        'breakpoint', 'read' or 'write'
+    pc : int
+        address of the instruction at the breakpoint, or of the instruction
+        that made the access
+    bank : int
+        ROM bank mapped at the time
+    addr : int
+        watched address accessed, None for breakpoints
+    value : int
+        value read or written, None for breakpoints
+    """
+
+    def __init__(self, kind, pc, bank, addr=None, value=None):
+        self.kind = kind
+        self.pc = pc
+        self.bank = bank
+        self.addr = addr
+        self.value = value
+        if addr is None:
+            message = '%s at %02x:%04x' % (kind, bank, pc)
+        else:
+            message = '%s of %02x at %04x by %02x:%04x' % (kind, value or 0,
+                                                            addr, bank, pc)
+        super(DebugBreak, self).__init__(message)
+
+
+class Debugger(object):
+    """
+    Debugger class holding the breakpoints and watchpoints of a cpu.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to debug, its mmu is watched as well
+    """
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.mmu = cpu.mmu
+        self.breakpoints = set()
+        self.read_watches = set()
+        self.write_watches = set()
+        self.exec_map = bytearray(0x10000)
+        self.read_pages = bytearray(0x100)
+        self.write_pages = bytearray(0x100)
+        self.hit = None
+        self.current_pc = 0
+        self._resume_pc = None
+        self._shadowed = {}
+
+    def bank(self, pc):
+        """
+        ROM bank an address belongs to right now, 0 outside 0x4000-0x7fff.
+        """
+        return self.mmu.rom_bank if 0x4000 <= pc < 0x8000 else 0
+
+    def add_breakpoint(self, pc, bank=None):
+        """
+        Breaks before the instruction at pc executes.
+
+        Parameters
+        ----------
+        pc : int
+            instruction address
+        bank : int
+            only break while this ROM bank is mapped, any bank if None
+        """
+        if (bank, pc) not in self.breakpoints:
+            self.breakpoints.add((bank, pc))
+            self.exec_map[pc] += 1
+        self._update()
+
+    def remove_breakpoint(self, pc, bank=None):
+        if (bank, pc) in self.breakpoints:
+            self.breakpoints.remove((bank, pc))
+            self.exec_map[pc] -= 1
+        self._update()
+
+    def add_watchpoint(self, addr, length=1, read=False, write=True):
+        """
+        Breaks after an instruction reads or writes the given addresses.
+
+        Parameters
+        ----------
+        addr : int
+            first address watched
+        length : int
+            number of addresses watched
+        read : bool
+            break on reads
+        write : bool
+            break on writes
+        """
+        for a in range(addr, addr + length):
+            if read and a not in self.read_watches:
+                self.read_watches.add(a)
+                self.read_pages[a >> 8] += 1
+            if write and a not in self.write_watches:
+                self.write_watches.add(a)
+                self.write_pages[a >> 8] += 1
+        self._update()
+
+    def remove_watchpoint(self, addr, length=1, read=True, write=True):
+        for a in range(addr, addr + length):
+            if read and a in self.read_watches:
+                self.read_watches.remove(a)
+                self.read_pages[a >> 8] -= 1
+            if write and a in self.write_watches:
+                self.write_watches.remove(a)
+                self.write_pages[a >> 8] -= 1
+        self._update()
+
+    def clear(self):
+        """
+        Removes every breakpoint and watchpoint.
+        """
+        for bank, pc in list(self.breakpoints):
+            self.remove_breakpoint(pc, bank)
+        self.remove_watchpoint(0, 0x10000)
+
+    @property
+    def active(self):
+        return bool(self.breakpoints or self.read_watches or self.write_watches)
+
+    def _install(self, target, name, wrapper):
+        if name not in self._shadowed:
+            self._shadowed[name] = (target, target.__dict__.get(name))
+            setattr(target, name, wrapper)
+
+    def _uninstall(self, name):
+        if name in self._shadowed:
+            target, shadowed = self._shadowed.pop(name)
+            if shadowed is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, shadowed)
+
+    def _update(self):
+        """
+        Installs exactly the wrappers the current points need.
+        """
+        if self.active:
+            self._install(self.cpu, 'cycle', self._debug_cycle())
+        else:
+            self._uninstall('cycle')
+            self.hit = None
+        if self.read_watches:
+            self._install(self.mmu, 'read_byte', self._watched_read())
+        else:
+            self._uninstall('read_byte')
+        if self.write_watches:
+            self._install(self.mmu, 'write_byte', self._watched_write())
+        else:
+            self._uninstall('write_byte')
+
+    def _debug_cycle(self):
+        cycle = self.cpu.cycle
+        registers = self.cpu.registers
+        exec_map = self.exec_map
+        breakpoints = self.breakpoints
+
+        def debug_cycle():
+            if self.hit is not None:
+                hit, self.hit = self.hit, None
+                raise hit
+            pc = int(registers.pc) & 0xffff
+            if exec_map[pc] and pc != self._resume_pc:
+                bank = self.bank(pc)
+                if (None, pc) in breakpoints or (bank, pc) in breakpoints:
+                    self._resume_pc = pc
+                    raise DebugBreak('breakpoint', pc, bank)
+            self._resume_pc = None
+            self.current_pc = pc
+            return cycle()
+        return debug_cycle
+
+    def _watched_read(self):
+        read_byte = self.mmu.read_byte
+        pages = self.read_pages
+        watches = self.read_watches
+
+        def watched_read(addr):
+            value = read_byte(addr)
+            if pages[(addr >> 8) & 0xff] and addr in watches and self.hit is None:
+                self.hit = DebugBreak('read', self.current_pc,
+                                      self.bank(self.current_pc), addr, value)
+            return value
+        return watched_read
+
+    def _watched_write(self):
+        write_byte = self.mmu.write_byte
+        pages = self.write_pages
+        watches = self.write_watches
+
+        def watched_write(addr, value):
+            write_byte(addr, value)
+            if pages[(addr >> 8) & 0xff] and addr in watches and self.hit is None:
+                self.hit = DebugBreak('write', self.current_pc,
+                                      self.bank(self.current_pc), addr, value)
+        return watched_write
@@ -0,0 +1,343 @@
+"""
+Disassembler for the GameBoy emulator.
+
+Decodes instructions using the mnemonic, length and cycle tables in
+opcodes.py and caches them per (bank, address), so the debugger, the
+profilers and anything compiling blocks of code share one decoded view of
+the ROM instead of decoding bytes again.
+
+Disassembler.analyse walks the ROM from its entry points (the cartridge
+entry, the RST vectors and the interrupt vectors), following jumps, calls
+and fall-throughs to find the basic blocks and the call targets. Targets in
+0x4000-0x7fff reached from bank 0 are assumed to be in bank 1, since which
+bank is mapped is only known at run time; code outside the ROM is not
+followed.
+
+Instruction text uses the assembler's syntax, so a listing can be fed back
+to assembler.assemble:
+
+    python disasm.py rom.gb --entry 0x150 --entry 2:0x4000
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import opcodes
+
+ENTRY_POINTS = (0x100,) + tuple(range(0x00, 0x40, 0x08)) + \
+    tuple(range(0x40, 0x68, 0x08))
+
+# opcodes that never fall through to the next instruction
+_ENDS = ('JP a16', 'JR r8', 'JP HL', 'RET', 'RETI')
+
+
+class Instruction(object):
+    """
+    Instruction class, one decoded instruction.
+
+    Parameters
+    ----------
+    bank : int
+        ROM bank the instruction was decoded from, 0 outside 0x4000-0x7fff
+    addr : int
+        address of the first byte
+    code : tuple of int
+        instruction bytes
+    mnemonic : String
+        mnemonic from opcodes.py with placeholders, None if illegal
+    """
+
+    def __init__(self, bank, addr, code, mnemonic):
+        self.bank = bank
+        self.addr = addr
+        self.code = code
+        self.mnemonic = mnemonic
+        self.length = len(code)
+        if code[0] == 0xcb:
+            self.cycles = self.branch_cycles = opcodes.CB_CYCLES[code[1]]
+        else:
+            self.cycles = opcodes.CYCLES[code[0]]
+            self.branch_cycles = opcodes.BRANCH_CYCLES[code[0]]
+        self.conditional = self.branch_cycles != self.cycles
+        self.target = None
+        self.call = False
+        self.ends = mnemonic is None or mnemonic in _ENDS
+        self.text = self._format()
+
+    def _format(self):
+        m = self.mnemonic
+        if m is None:
+            return 'DB $%02X' % self.code[0]
+        word = m.partition(' ')[0]
+        if m.startswith('RST'):
+            self.target = int(m[4:6], 16)
+            self.call = True
+        if 'd16' in m or 'a16' in m:
+            value = self.code[1] | (self.code[2] << 8)
+            if word in ('JP', 'CALL'):
+                self.target = value
+                self.call = word == 'CALL'
+            return m.replace('d16', '$%04X' % value).replace('a16', '$%04X' % value)
+        if 'd8' in m:
+            return m.replace('d8', '$%02X' % self.code[1])
+        if 'a8' in m:
+            return m.replace('a8', '$FF%02X' % self.code[1])
+        if 'r8' in m:
+            offset = self.code[1] - 0x100 if self.code[1] & 0x80 else self.code[1]
+            if word == 'JR':
+                self.target = (self.addr + 2 + offset) & 0xffff
+                return m.replace('r8', '$%04X' % self.target)
+            if m.endswith('SP+r8'):
+                return m.replace('+r8', '%+d' % offset)
+            return m.replace('r8', '%d' % offset)
+        return m
+
+    @property
+    def hex(self):
+        return ' '.join('%02x' % b for b in self.code)
+
+    def __str__(self):
+        return '%02x:%04x  %-8s  %s' % (self.bank, self.addr, self.hex, self.text)
+
+
+def decode(read, addr, bank=0):
+    """
+    Decodes the instruction at an address.
+
+    Parameters
+    ----------
+    read : function
+        returns the byte at an address, e.g. mmu.read_byte
+    addr : int
+        address of the instruction
+    bank : int
+        ROM bank recorded in the instruction
+
+    Returns
+    -------
+    Instruction
+        decoded instruction
+    """
+    op = read(addr)
+    if op == 0xcb:
+        cb = read((addr + 1) & 0xffff)
+        return Instruction(bank, addr, (op, cb), opcodes.CB_OPCODES[cb])
+    code = (op,) + tuple(read((addr + i) & 0xffff)
+                         for i in range(1, opcodes.LENGTHS[op]))
+    return Instruction(bank, addr, code, opcodes.OPCODES[op])
+
+
+class Block(object):
+    """
+    Block class, a basic block found by Disassembler.analyse.
+
+    Parameters
+    ----------
+    bank : int
+        ROM bank of the block
+    instructions : list of Instruction
+        instructions of the block, only the last one can branch
+    """
+
+    def __init__(self, bank, instructions):
+        self.bank = bank
+        self.start = instructions[0].addr
+        self.instructions = instructions
+        self.successors = []
+
+    @property
+    def end(self):
+        last = self.instructions[-1]
+        return last.addr + last.length
+
+    @property
+    def cycles(self):
+        return sum(i.cycles for i in self.instructions)
+
+
+class Disassembler(object):
+    """
+    Disassembler class holding the decoded view of one ROM.
+
+    Parameters
+    ----------
+    rom : sequence of int
+        cartridge image, e.g. mmu.rom
+    """
+
+    def __init__(self, rom):
+        self.rom = rom
+        self.cache = {}
+        self.blocks = {}
+        self.calls = set()
+
+    def key(self, addr, bank=None):
+        """
+        Normalised (bank, address) of a ROM address, None outside the ROM.
+        """
+        if addr < 0x4000:
+            return 0, addr
+        if addr < 0x8000:
+            bank = bank or 1
+            if (bank << 14) | (addr & 0x3fff) < len(self.rom):
+                return bank, addr
+        return None
+
+    def _reader(self, bank):
+        rom = self.rom
+        size = len(rom)
+
+        def read(addr):
+            offset = addr if addr < 0x4000 else (bank << 14) | (addr & 0x3fff)
+            return rom[offset] if offset < size else 0xff
+        return read
+
+    def instruction(self, addr, bank=0):
+        """
+        Decoded instruction at a ROM address, cached.
+
+        Parameters
+        ----------
+        addr : int
+            address in 0x0000-0x7fff
+        bank : int
+            ROM bank for addresses in 0x4000-0x7fff, 0 meaning 1
+
+        Returns
+        -------
+        Instruction
+            decoded instruction
+        """
+        # selecting bank 0 maps bank 1, normalised the same way as key()
+        key = ((bank or 1) if addr >= 0x4000 else 0, addr)
+        instruction = self.cache.get(key)
+        if instruction is None:
+            instruction = self.cache[key] = decode(self._reader(key[0]),
+                                                   addr, key[0])
+        return instruction
+
+    def at(self, mmu, pc):
+        """
+        Instruction the cpu would execute at pc, with the current mapping.
+
+        ROM instructions come from the cache, code in RAM is decoded again
+        on every call because it can change.
+        """
+        if pc < 0x4000:
+            return self.instruction(pc)
+        if pc < 0x8000:
+            return self.instruction(pc, mmu.rom_bank)
+        return decode(mmu.read_byte, pc, None)
+
+    def invalidate(self):
+        """
+        Drops everything decoded, e.g. after loading another ROM.
+        """
+        self.cache.clear()
+        self.blocks.clear()
+        self.calls.clear()
+
+    def analyse(self, entries=ENTRY_POINTS):
+        """
+        Finds the basic blocks reachable from the entry points.
+
+        Parameters
+        ----------
+        entries : sequence
+            addresses, or (bank, address) tuples for banked code
+
+        Returns
+        -------
+        dict
+            (bank, start address) to Block, also kept in self.blocks
+        """
+        work = []
+        for entry in entries:
+            key = self.key(entry[1], entry[0]) if isinstance(entry, tuple) \
+                else self.key(entry)
+            if key is not None:
+                work.append(key)
+        leaders = set(work)
+        seen = set()
+        while work:
+            key = work.pop()
+            while key is not None and key not in seen:
+                seen.add(key)
+                bank, addr = key
+                instruction = self.instruction(addr, bank)
+                if instruction.target is not None:
+                    target = self.key(instruction.target, bank)
+                    if target is not None:
+                        leaders.add(target)
+                        work.append(target)
+                        if instruction.call:
+                            self.calls.add(target)
+                if instruction.ends:
+                    break
+                key = self.key(addr + instruction.length, bank)
+                if key is not None and (instruction.target is not None or
+                                        instruction.conditional):
+                    leaders.add(key)
+
+        for key in sorted(leaders & seen):
+            if key in self.blocks:
+                continue
+            bank, addr = key
+            instructions = []
+            while True:
+                instruction = self.instruction(addr, bank)
+                instructions.append(instruction)
+                next_key = self.key(addr + instruction.length, bank)
+                if (instruction.ends or instruction.target is not None or
+                        instruction.conditional or next_key is None or
+                        next_key in leaders or next_key not in seen):
+                    break
+                bank, addr = next_key
+            block = self.blocks[key] = Block(key[0], instructions)
+            last = instructions[-1]
+            if last.target is not None:
+                target = self.key(last.target, key[0])
+                if target is not None:
+                    block.successors.append(target)
+            if not last.ends and next_key is not None:
+                block.successors.append(next_key)
+        return self.blocks
+
+    def block_at(self, addr, bank=0):
+        """
+        Block starting at an address, None if analyse did not find one.
+        """
+        return self.blocks.get(self.key(addr, bank))
+
+    def listing(self):
+        """
+        Text listing of every block found by analyse, in address order.
+        """
+        lines = []
+        for key in sorted(self.blocks):
+            block = self.blocks[key]
+            kind = 'call target' if key in self.calls else 'block'
+            lines.append('; %02x:%04x %s, %d cycles' %
+                         (key[0], key[1], kind, block.cycles))
+            for instruction in block.instructions:
+                lines.append(str(instruction))
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def _entry(text):
+    if ':' in text:
+        bank, addr = text.split(':')
+        return int(bank, 0), int(addr, 0)
+    return int(text, 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Disassemble a GameBoy ROM")
+    parser.add_argument('rom', help="Path to the ROM")
+    parser.add_argument('--entry', type=_entry, action='append',
+                        help="Extra entry point, ADDR or BANK:ADDR")
+    args = parser.parse_args()
+
+    with open(args.rom, 'rb') as f:
+        disassembler = Disassembler(bytearray(f.read()))
+    disassembler.analyse(ENTRY_POINTS + tuple(args.entry or ()))
+    print(disassembler.listing())
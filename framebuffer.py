@@ -0,0 +1,166 @@
+"""
+Shared memory framebuffer export.
+
+Lets other processes (recorders, streamers, dashboards) read the frames the
+gpu draws without any serialization or sockets. The block holds a small
+header and two frame slots:
+
+    offset 0   magic     4s  b'GBFB'
+    offset 4   width     H
+    offset 6   height    H
+    offset 8   sequence  I   odd while the header is being updated
+    offset 12  front     I   slot holding the last complete frame
+    offset 16  frame     Q   gpu frame counter of that frame
+    offset 24  slot 0, then slot 1, width * height shade indices each
+
+The gpu draws straight into the back slot. At v-blank the slots are swapped
+under the sequence lock, so a reader that sees the same even sequence number
+before and after copying the front slot got a whole frame.
+"""
+__author__ = 'Clayton Powell'
+import struct
+import time
+from multiprocessing import shared_memory
+import gpu
+
+HEADER = struct.Struct('<4sHHIIQ')
+MAGIC = b'GBFB'
+FRAME_SIZE = gpu.WIDTH * gpu.HEIGHT
+
+
+class SharedFramebuffer(object):
+    """
+    SharedFramebuffer class, the writing side attached to a gpu.
+
+    Parameters
+    ----------
+    name : String
+        name of the shared memory block, random if not given
+    """
+
+    def __init__(self, name=None):
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER.size + 2 * FRAME_SIZE)
+        self.name = self.shm.name
+        self.sequence = 0
+        self.front = 1
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, gpu.WIDTH, gpu.HEIGHT,
+                         self.sequence, self.front, 0)
+        self.gpu = None
+
+    def _slot(self, index):
+        offset = HEADER.size + index * FRAME_SIZE
+        return self.shm.buf[offset:offset + FRAME_SIZE]
+
+    def attach(self, target):
+        """
+        Makes the gpu draw into the back slot and publish on every v-blank.
+
+        Parameters
+        ----------
+        target : gpu.GPU
+            gpu to export frames from
+        """
+        back = self._slot(self.front ^ 1)
+        back[:] = target.framebuffer
+        target.framebuffer = back
+        target.export = self
+        self.gpu = target
+
+    def publish(self, frame):
+        """
+        Makes the back slot the front one and returns the new back slot.
+        Called by the gpu when a frame is complete.
+
+        Parameters
+        ----------
+        frame : int
+            gpu frame counter of the completed frame
+
+        Returns
+        -------
+        memoryview
+            slot the gpu should draw the next frame into
+        """
+        buf = self.shm.buf
+        self.sequence += 1
+        struct.pack_into('<I', buf, 8, self.sequence)
+        self.front ^= 1
+        struct.pack_into('<IQ', buf, 12, self.front, frame)
+        self.sequence += 1
+        struct.pack_into('<I', buf, 8, self.sequence)
+        self.gpu.framebuffer.release()
+        return self._slot(self.front ^ 1)
+
+    def close(self):
+        """
+        Detaches from the gpu and removes the shared memory block.
+        """
+        if self.gpu is not None:
+            self.gpu.framebuffer.release()
+            self.gpu.framebuffer = bytearray(FRAME_SIZE)
+            self.gpu.export = None
+            self.gpu = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FramebufferReader(object):
+    """
+    FramebufferReader class, the reading side in another process.
+
+    Parameters
+    ----------
+    name : String
+        name of the shared memory block given by the writer
+    """
+
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        magic, self.width, self.height = HEADER.unpack_from(self.shm.buf)[:3]
+        if magic != MAGIC:
+            raise ValueError("%s is not a gbpy framebuffer" % name)
+
+    def read(self):
+        """
+        Copies out the last complete frame.
+
+        Returns
+        -------
+        tuple
+            gpu frame counter and bytes of width * height shade indices
+        """
+        buf = self.shm.buf
+        size = self.width * self.height
+        while True:
+            sequence = struct.unpack_from('<I', buf, 8)[0]
+            if sequence & 1:
+                continue
+            front, frame = struct.unpack_from('<IQ', buf, 12)
+            offset = HEADER.size + front * size
+            pixels = bytes(buf[offset:offset + size])
+            if struct.unpack_from('<I', buf, 8)[0] == sequence:
+                return frame, pixels
+
+    def wait(self, last_frame, poll=0.001):
+        """
+        Waits for a frame newer than last_frame and returns it.
+
+        Parameters
+        ----------
+        last_frame : int
+            frame counter of the last frame seen
+        poll : float
+            seconds to sleep between checks
+
+        Returns
+        -------
+        tuple
+            gpu frame counter and bytes of shade indices
+        """
+        while struct.unpack_from('<Q', self.shm.buf, 16)[0] <= last_frame:
+            time.sleep(poll)
+        return self.read()
+
+    def close(self):
+        self.shm.close()
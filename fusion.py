@@ -0,0 +1,230 @@
+"""
+Superinstruction fusion for the GameBoy emulator cpu.
+
+Games spend much of their time in a few short idioms, e.g. the copy loop
+
+    LD A,(HL+) / LD (DE),A / INC DE / DEC B / JR NZ
+
+While enabled, Fusion swaps the cpu's dispatch entry for the first opcode
+of every pattern with a small dispatcher. The first time an instruction
+with that opcode runs at a ROM address, the bytes that follow are matched
+against the patterns, longest first, and the result is cached for that
+bank and address. From then on a match runs a fused handler: one Python
+call that runs the handlers of the whole sequence back to back and returns
+their summed cycles, so the cpu and the core's per instruction work (fetch,
+dispatch, event check) is paid once per sequence instead of once per
+instruction. Only the last instruction of a pattern may branch.
+
+Between the instructions of a sequence the fused handler moves the
+scheduler's cycle counter on by the cycles run so far, so a read of LY,
+STAT or DIV in the middle of a sequence sees the same time it would
+unfused. It puts the counter back before returning, since the core adds the
+returned cycles as for any instruction. If an event becomes due inside a
+sequence, e.g. an interrupt, the handler returns after that instruction and
+the rest of the sequence runs unfused, so events are never late.
+
+Code running from RAM is never fused, it can change under the cache.
+Anything shadowing Cpu.cycle (the tracer, debugger and hotspot sampler)
+sees a fused sequence as one instruction.
+
+With profile=True every fused handler counts how often it fires, see
+report().
+"""
+__author__ = 'Clayton Powell'
+import disasm
+import opcodes
+from register import Register
+
+PATTERNS = (
+    # LD A,(HL+) / LD (DE),A / INC DE / DEC B / JR NZ copy loop
+    (0x2a, 0x12, 0x13, 0x05, 0x20),
+    # LD A,(DE) / LD (HL+),A / INC DE / DEC B / JR NZ copy loop
+    (0x1a, 0x22, 0x13, 0x05, 0x20),
+    # DEC BC / LD A,B / OR C / JR NZ delay
+    (0x0b, 0x78, 0xb1, 0x20),
+    # LDH A,(n) / CP n / JR NZ and JR Z polls
+    (0xf0, 0xfe, 0x20),
+    (0xf0, 0xfe, 0x28),
+    # LDH A,(n) / AND n / JR Z poll
+    (0xf0, 0xe6, 0x28),
+    # DEC r / JR NZ counters
+    (0x05, 0x20),
+    (0x0d, 0x20),
+    (0x3d, 0x20),
+    # LD (HL+),A / DEC B fill loop body
+    (0x22, 0x05, 0x20),
+)
+
+
+def _check(pattern):
+    """
+    Raises ValueError unless only the last opcode of pattern can branch.
+    """
+    for op in pattern:
+        if opcodes.OPCODES[op] is None or op == 0xcb:
+            raise ValueError("cannot fuse opcode %02x" % op)
+    for op in pattern[:-1]:
+        instruction = disasm.decode(lambda addr: op if addr == 0 else 0, 0)
+        if instruction.target is not None or instruction.ends or \
+                instruction.conditional or op in (0x10, 0x76, 0xf3, 0xfb):
+            raise ValueError("%s can only end a pattern" % opcodes.OPCODES[op])
+
+
+class Fusion(object):
+    """
+    Fusion class that runs common opcode sequences as single handlers.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to fuse instructions for
+    scheduler : scheduler.Scheduler
+        scheduler of the core, moved on between fused instructions
+    patterns : sequence of tuple of int
+        opcode sequences to fuse, only the last opcode may branch
+    profile : bool
+        count how often every fused handler fires
+    """
+
+    def __init__(self, cpu, scheduler, patterns=PATTERNS, profile=False):
+        for pattern in patterns:
+            _check(pattern)
+        # longest first so the copy loop wins over its DEC B / JR NZ tail
+        self.patterns = sorted(set(tuple(p) for p in patterns),
+                               key=len, reverse=True)
+        self.cpu = cpu
+        self.scheduler = scheduler
+        self.profile = profile
+        self.counts = dict((pattern, 0) for pattern in self.patterns)
+        self.sites = {}
+        self._compiled = {}
+        self._opcodes = None
+
+    @property
+    def enabled(self):
+        return self._opcodes is not None
+
+    def enable(self):
+        """
+        Installs the dispatchers for the first opcode of every pattern.
+        """
+        if self.enabled:
+            return
+        self._opcodes = self.cpu.opcodes
+        self.cpu.opcodes = dict(self._opcodes)
+        for head in set(pattern[0] for pattern in self.patterns):
+            self.cpu.opcodes[head] = self._dispatcher(head)
+
+    def disable(self):
+        """
+        Puts the cpu's dispatch table back. Matched sites are forgotten.
+        """
+        if not self.enabled:
+            return
+        self.cpu.opcodes = self._opcodes
+        self._opcodes = None
+        self.sites.clear()
+        self._compiled.clear()
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def _dispatcher(self, head):
+        original = self._opcodes[head]
+        registers = self.cpu.registers
+        mmu = self.cpu.mmu
+        sites = self.sites
+        match = self._match
+
+        def dispatch():
+            # cycle has already stepped past the opcode
+            pc = int(registers.pc) - 1
+            if pc >= 0x8000:
+                return original()
+            key = (mmu.rom_bank << 16) | pc if pc >= 0x4000 else pc
+            try:
+                fused = sites[key]
+            except KeyError:
+                fused = sites[key] = match(pc)
+            if fused is None:
+                return original()
+            return fused(pc)
+        return dispatch
+
+    def _match(self, pc):
+        """
+        Fused handler for the longest pattern found at pc, None if none
+        matches.
+        """
+        read = self.cpu.mmu.read_byte
+        head = read(pc)
+        for pattern in self.patterns:
+            if pattern[0] != head:
+                continue
+            addr = pc
+            for op in pattern:
+                if addr >= 0x8000 or read(addr) != op:
+                    break
+                addr += opcodes.LENGTHS[op]
+            else:
+                return self._compile(pattern)
+        return None
+
+    def _compile(self, pattern):
+        """
+        Builds the fused handler of a pattern, shared by all its sites.
+        """
+        if pattern in self._compiled:
+            return self._compiled[pattern]
+        namespace = {'registers': self.cpu.registers, 'counts': self.counts,
+                     'pattern': pattern, 'scheduler': self.scheduler,
+                     'Register': Register}
+        lines = ['def fused(pc):']
+        if self.profile:
+            lines.append('    counts[pattern] += 1')
+        lines.append('    start = scheduler.now')
+        offset = 0
+        for i, op in enumerate(pattern):
+            namespace['h%d' % i] = self._opcodes[op]
+            if i == 0:
+                lines.append('    cycles = h0()')
+            else:
+                # an event due now runs before the next instruction
+                lines.append('    if start + cycles >= scheduler.deadline:')
+                lines.append('        scheduler.now = start')
+                lines.append('        return cycles')
+                lines.append('    scheduler.now = start + cycles')
+                # step past the opcode, the handler steps past its operands
+                lines.append('    registers.pc = Register(pc + %d, limit=0xffff)'
+                             % (offset + 1))
+                lines.append('    cycles += h%d()' % i)
+            offset += opcodes.LENGTHS[op]
+        lines.append('    scheduler.now = start')
+        lines.append('    return cycles')
+        exec('\n'.join(lines), namespace)
+        fused = self._compiled[pattern] = namespace['fused']
+        fused.__doc__ = ' / '.join(opcodes.OPCODES[op] for op in pattern)
+        return fused
+
+    def report(self):
+        """
+        How often every pattern fired, most frequent first. Needs
+        profile=True.
+
+        Returns
+        -------
+        String
+            text report
+        """
+        total = sum(self.counts.values()) or 1
+        lines = ['%10s %6s  %s' % ('count', '%', 'sequence')]
+        for pattern, count in sorted(self.counts.items(),
+                                     key=lambda item: item[1], reverse=True):
+            lines.append('%10d %6.2f  %s' % (
+                count, 100.0 * count / total,
+                ' / '.join(opcodes.OPCODES[op] for op in pattern)))
+        return '\n'.join(lines)
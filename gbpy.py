@@ -1,8 +1,20 @@
 __author__ = 'Clayton Powell'
-import cpu
-import mmu
-import gpu
+import core
+import joypad
+import movie
 import pyglet
+from pyglet.window import key
+
+KEY_MAP = {
+    key.RIGHT: joypad.RIGHT,
+    key.LEFT: joypad.LEFT,
+    key.UP: joypad.UP,
+    key.DOWN: joypad.DOWN,
+    key.Z: joypad.A,
+    key.X: joypad.B,
+    key.BACKSPACE: joypad.SELECT,
+    key.ENTER: joypad.START,
+}
 
 
 class Gbpy(pyglet.window.Window):
@@ -13,9 +25,13 @@ class Gbpy(pyglet.window.Window):
 
     def __init__(self, *args, **kwargs):
         super(Gbpy, self).__init__(*args, **kwargs)
-        self.mmu = mmu.MMU()
-        self.gpu = gpu.GPU(self.mmu)
-        self.cpu = cpu.Cpu(self.mmu)
+        self.core = core.Core(headless=False)
+        self.mmu = self.core.mmu
+        self.gpu = self.core.gpu
+        self.cpu = self.core.cpu
+        self.joypad = self.core.joypad
+        # key presses take effect at the next frame, where replays apply them
+        self.recorder = movie.Recorder(self.core)
         self.clear()
         self.set_vsync(False)
 
@@ -25,7 +41,7 @@ class Gbpy(pyglet.window.Window):
         :param rom_path:
             Path to ROM on system
         """
-        self.mmu.load(rom_path)
+        self.core.load_rom(rom_path)
 
     def main(self):
         """
@@ -35,24 +51,28 @@ class Gbpy(pyglet.window.Window):
         """
         if not self.has_exit:
             self.dispatch_events()
-            cycles = self.cpu.cycle()
-            self.gpu.step(cycles)
-
+            self.recorder.step()
 
     def on_key_press(self, symbol, modifiers):
         """
-
+        Presses the joypad button mapped to symbol from the next frame,
+        recording it if a movie is being recorded.
         :param symbol:
+            pyglet key symbol
         :param modifiers:
-        :return:
+            pyglet key modifiers, unused
         """
-        pass
+        if symbol in KEY_MAP:
+            self.recorder.press(KEY_MAP[symbol])
 
     def on_key_release(self, symbol, modifiers):
         """
-
+        Releases the joypad button mapped to symbol from the next frame,
+        recording it if a movie is being recorded.
         :param symbol:
+            pyglet key symbol
         :param modifiers:
-        :return:
+            pyglet key modifiers, unused
         """
-        pass
+        if symbol in KEY_MAP:
+            self.recorder.release(KEY_MAP[symbol])
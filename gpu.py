@@ -1,4 +1,11 @@
-from pyglet import image
+import bisect
+import interrupts
+from scheduler import Scheduler
+try:
+    from pyglet import image
+except ImportError:
+    # pyglet is only needed to draw into a window, headless cores run without it
+    image = None
 
 BGON = 0x01    # Background on
 SPON = 0x02    # Sprites on
@@ -9,21 +16,135 @@ WINON = 0x20   # Window on
 WINMAP = 0x40  # Window tilemap
 DISPON = 0x80  # Display on
 
+WIDTH = 160
+HEIGHT = 144
+
+# LCD timing in cycles, each line runs mode 2 (OAM search), mode 3 (pixel
+# transfer) and mode 0 (h-blank), lines 144-153 are v-blank (mode 1)
+LINE_CYCLES = 456
+LINES = 154
+FRAME_CYCLES = LINE_CYCLES * LINES
+MODE3_START = 80
+MODE0_START = 80 + 172
+
+# STAT interrupt selects
+STAT_HBLANK = 0x08
+STAT_VBLANK = 0x10
+STAT_OAM = 0x20
+STAT_LYC = 0x40
+
+# Grey level of each of the four shades, lightest first
+SHADES = (0xff, 0xaa, 0x55, 0x00)
+
+
+def _mode(line, dot):
+    """
+    STAT mode of a cycle within a line.
+    """
+    if line >= HEIGHT:
+        return 1
+    if dot < MODE3_START:
+        return 2
+    if dot < MODE0_START:
+        return 3
+    return 0
+
+
+def _frame_segments():
+    """
+    (offset in the frame, line, mode) of every stretch of a frame in which
+    neither LY nor the mode change.
+    """
+    segments = []
+    for line in range(LINES):
+        start = line * LINE_CYCLES
+        if line < HEIGHT:
+            segments += [(start, line, 2), (start + MODE3_START, line, 3),
+                         (start + MODE0_START, line, 0)]
+        else:
+            segments.append((start, line, 1))
+    return segments
+
+
+SEGMENTS = _frame_segments()
+_EDGES = {}
+
+
+def _stat_high(select, lyc, line, mode):
+    """
+    Whether any STAT interrupt source selected in select holds.
+    """
+    return bool((select & STAT_HBLANK and mode == 0) or
+                (select & STAT_VBLANK and mode == 1) or
+                (select & STAT_OAM and mode == 2) or
+                (select & STAT_LYC and line == lyc))
+
+
+def stat_edges(select, lyc):
+    """
+    Offsets in the frame at which the STAT interrupt line goes high.
+
+    The interrupt is only requested when the line, the OR of all selected
+    sources, goes from low to high, so a source that becomes true while
+    another one holds does not request it again. Computed once for every
+    combination of selects and LYC.
+
+    Parameters
+    ----------
+    select : int
+        STAT bits 3-6
+    lyc : int
+        LYC (0xFF45)
+
+    Returns
+    -------
+    tuple of int
+        sorted offsets, empty if the line never changes
+    """
+    key = (select << 8) | lyc
+    edges = _EDGES.get(key)
+    if edges is None:
+        high = [_stat_high(select, lyc, line, mode)
+                for _, line, mode in SEGMENTS]
+        # high[-1] wraps around to the end of the previous frame
+        edges = _EDGES[key] = tuple(SEGMENTS[i][0] for i in range(len(SEGMENTS))
+                                    if high[i] and not high[i - 1])
+    return edges
+
 
 class GPU(object):
     """
     GPU class that handles outputting tile set to the window.
+
+    The gpu is not stepped. LY and the STAT mode are worked out from the
+    scheduler's cycle counter when the game reads them, and the gpu only
+    runs when a scheduled event draws a line or starts v-blank.
+
+    With an interrupt controller the v-blank interrupt is requested at the
+    start of v-blank and the next STAT interrupt is scheduled ahead of time
+    from stat_edges, again whenever STAT, LYC or LCDC are written.
     """
 
-    def __init__(self, mmu):
+    def __init__(self, mmu, headless=False, scheduler=None, irq=None):
         self.mmu = mmu
-        self.line = 0
-        self.mode = 0
-        self.mode_clock = 0
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.irq = irq
+        self.origin = 0
+        self.event = None
+        self.stat_event = None
+        self.frame = 0
         self.reg = []
         self.scan_row = []
-        pattern = image.SolidColorImagePattern(color=(255, 255, 255, 255))
-        self.display = pattern.create_image(144, 160).get_image_data()
+        self.vram = [0] * 0x2000
+        self.oam = [0] * 0xa0
+        # One shade index (0-3) per pixel, rows top to bottom
+        self.framebuffer = bytearray(WIDTH * HEIGHT)
+        # Optional framebuffer.SharedFramebuffer frames are published to
+        self.export = None
+        self.display = None
+        if not headless:
+            self.display = image.ImageData(WIDTH, HEIGHT, 'L',
+                                           bytes([SHADES[0]]) * WIDTH * HEIGHT)
 
         self.color_map = {
             0: '#FFFFFF',
@@ -31,59 +152,162 @@ class GPU(object):
             2: '#555555',
             3: '#000000',
         }
+        mmu.io_read[0xff41] = self.read_stat
+        mmu.io_read[0xff44] = self.read_ly
+        mmu.io_write[0xff40] = self.write_lcdc
+        mmu.io_write[0xff41] = self.write_stat
+        mmu.io_write[0xff45] = self.write_lyc
+        self.start()
+
+    def start(self):
+        """
+        Starts the LCD timing at the current cycle, on line 0 in mode 2, and
+        schedules the end of the first line's pixel transfer.
+        """
+        self.cancel()
+        self.origin = self.scheduler.now
+        self.event = self.scheduler.schedule(self.origin + MODE0_START,
+                                             self._hblank)
+        self._schedule_stat(self.origin - 1)
 
-    def step(self, clock_ticks):
+    def cancel(self):
+        """
+        Cancels the pending gpu events.
         """
-        Single GPU drawing step.
+        self.scheduler.cancel(self.event)
+        self.scheduler.cancel(self.stat_event)
+        self.event = self.stat_event = None
 
-        Essentially this should be called after every opcode to update where the
-        GPU is in drawing the screen.
-        Each instruction carries a gpu cycle count with it, and that change gets
-        reconputed here. Depending on what stage you are in, this may call the
-        screen to be redrawn (basically when we hit v-blank)
+    @property
+    def enabled(self):
+        return bool(self.mmu.mmio[0x40] & DISPON)
 
-        Parameters
-        ----------
-        clock_ticks : int
-            cpu ticks required for given step, provided by operation
-        """
-
-        self.mode_clock += clock_ticks
-        if self.mode == 2:
-            # OAM read mode, scanline is active
-            if(self.mode_clock >= 80):
-                # Enter mode 3 (VRAM read)
-                self.mode_clock = 0
-                self.mode = 3
-        elif self.mode == 3:
-            # VRAM read mode
-            if self.mode_clock >= 172:
-                # Enter mode 0 (h-blank)
-                self.mode_clock = 0
-                self.mode = 0
-                # At this point write one horizontal line to the frame buffer
-        elif self.mode == 0:
-            # H-blank
-            if self.mode_clock >= 204:
-                self.mode_clock = 0
-                self.line += 1
-                self.mmu.mmio[0x44] += 1
-
-                if self.line == 143:
-                    # last horizontal line run, move to v-blank
-                    self.mode = 1
-                    self.render_screen()
-                else:
-                    self.mode = 2
-        elif self.mode == 1:
-            if self.mode_clock >= 456:
-                self.mode_clock = 0
-                self.line += 1
-
-                if self.line > 153:
-                    # restart scanning modes
-                    self.mode = 2
-                    self.line = 0
+    def _hblank(self, when):
+        # mode 3 of a visible line has just ended, the line can be drawn
+        line = ((when - self.origin) % FRAME_CYCLES) // LINE_CYCLES
+        self.render_scanline(line)
+        if line == HEIGHT - 1:
+            self.event = self.scheduler.schedule(
+                when - MODE0_START + LINE_CYCLES, self._vblank)
+        else:
+            self.event = self.scheduler.schedule(when + LINE_CYCLES,
+                                                 self._hblank)
+
+    def _vblank(self, when):
+        # first cycle of line 144
+        if self.irq is not None and self.enabled:
+            self.irq.request(interrupts.VBLANK)
+        self.frame += 1
+        self.render_screen()
+        if self.export is not None:
+            self.framebuffer = self.export.publish(self.frame)
+        self.event = self.scheduler.schedule(
+            when + (LINES - HEIGHT) * LINE_CYCLES + MODE0_START, self._hblank)
+
+    def position(self):
+        """
+        Where the LCD is at the current cycle.
+
+        Returns
+        -------
+        tuple of int
+            line (0-153) and cycle within the line (0-455)
+        """
+        if not self.mmu.mmio[0x40] & DISPON:
+            # LY reads 0 and STAT mode 0 while the LCD is off
+            return 0, MODE0_START
+        return divmod((self.scheduler.now - self.origin) % FRAME_CYCLES,
+                      LINE_CYCLES)
+
+    @property
+    def line(self):
+        return self.position()[0]
+
+    @property
+    def mode(self):
+        return _mode(*self.position())
+
+    def read_ly(self):
+        """
+        LY (0xFF44), the line being drawn.
+        """
+        return self.line
+
+    def read_stat(self):
+        """
+        STAT (0xFF41), the interrupt selects written by the game with the
+        mode and the LY == LYC coincidence flag of the current cycle.
+        """
+        line, dot = self.position()
+        mmio = self.mmu.mmio
+        coincidence = 0x04 if line == mmio[0x45] else 0
+        return 0x80 | (mmio[0x41] & 0x78) | coincidence | _mode(line, dot)
+
+    def write_lcdc(self, value):
+        """
+        LCDC (0xFF40). Turning the LCD on starts it again from line 0.
+        While it is off the frame timing keeps running so frontends waiting
+        for frames keep going, but nothing is interrupted.
+        """
+        was_on = self.enabled
+        self.mmu.mmio[0x40] = value
+        if value & DISPON and not was_on:
+            self.start()
+        elif was_on and not value & DISPON:
+            self.scheduler.cancel(self.stat_event)
+            self.stat_event = None
+
+    def write_stat(self, value):
+        # the mode and coincidence bits are read only
+        self._write_stat_source(0x41, value & 0x78)
+
+    def write_lyc(self, value):
+        self._write_stat_source(0x45, value)
+
+    def _stat_line(self):
+        line, dot = self.position()
+        mmio = self.mmu.mmio
+        return _stat_high(mmio[0x41] & 0x78, mmio[0x45], line, _mode(line, dot))
+
+    def _write_stat_source(self, index, value):
+        """
+        Writes STAT or LYC and moves the next STAT interrupt. A write that
+        raises the interrupt line right away requests the interrupt now.
+        """
+        was_high = self._stat_line()
+        self.mmu.mmio[index] = value
+        if not self.enabled:
+            return
+        if not was_high and self._stat_line() and self.irq is not None:
+            self.irq.request(interrupts.STAT)
+        self._schedule_stat(self.scheduler.now)
+
+    def _schedule_stat(self, after):
+        """
+        Schedules the STAT interrupt for the first rising edge of its line
+        after a cycle.
+        """
+        self.scheduler.cancel(self.stat_event)
+        self.stat_event = None
+        if self.irq is None or not self.enabled:
+            return
+        mmio = self.mmu.mmio
+        edges = stat_edges(mmio[0x41] & 0x78, mmio[0x45])
+        if not edges:
+            return
+        offset = (after - self.origin) % FRAME_CYCLES
+        frame_start = after - offset
+        i = bisect.bisect_right(edges, offset)
+        if i < len(edges):
+            when = frame_start + edges[i]
+        else:
+            when = frame_start + FRAME_CYCLES + edges[0]
+        self.stat_event = self.scheduler.schedule(when, self._stat)
+
+    def _stat(self, when):
+        self.stat_event = None
+        self.irq.request(interrupts.STAT)
+        self._schedule_stat(when)
 
     def update(self, data, addr):
         """
@@ -94,12 +318,53 @@ class GPU(object):
         # print(self.display.get_region(x, y, 1, 1).get_image_data())
         return None
 
+    def render_scanline(self, line=None):
+        """
+        Draws the background for a line into the frame buffer.
+        Window and sprites are not drawn yet.
+
+        Parameters
+        ----------
+        line : int
+            line to draw, the current line if None
+        """
+        if line is None:
+            line = self.line
+        lcdc = self.mmu.mmio[0x40]
+        row = line * WIDTH
+        framebuffer = self.framebuffer
+        if not lcdc & BGON:
+            framebuffer[row:row + WIDTH] = bytes(WIDTH)
+            return
+        vram = self.vram
+        palette = self.mmu.mmio[0x47]
+        y = (line + self.mmu.mmio[0x42]) & 0xff
+        x = self.mmu.mmio[0x43]
+        map_row = (0x1c00 if lcdc & BGMAP else 0x1800) + (y >> 3) * 32
+        tile_line = (y & 7) * 2
+        for i in range(row, row + WIDTH):
+            tile = vram[map_row + (x >> 3)]
+            if lcdc & BGSET:
+                addr = tile * 16 + tile_line
+            else:
+                # tiles numbered -128 to 127 around 0x9000
+                addr = 0x1000 + ((tile ^ 0x80) - 0x80) * 16 + tile_line
+            bit = 7 - (x & 7)
+            color = ((vram[addr] >> bit) & 1) | (((vram[addr + 1] >> bit) & 1) << 1)
+            framebuffer[i] = (palette >> (color * 2)) & 3
+            x = (x + 1) & 0xff
+
     def render_screen(self):
-        self.display.blit(0, 0)
+        if self.display is not None:
+            # pyglet images are stored bottom row first, hence negative pitch
+            self.display.set_data('L', -WIDTH,
+                                  bytes(SHADES[s] for s in self.framebuffer))
+            self.display.blit(0, 0)
 
     def __str__(self):
-        return """GPU Mode: %d  Mode Clock: %d  Line: %3d (%02x)""" %
-                (self.mode, self.mode_clock, self.line, self.line)
+        line, dot = self.position()
+        return """GPU Mode: %d  Line Cycle: %3d  Line: %3d (%02x)""" % \
+            (self.mode, dot, line, line)
 
     def reset(self):
         """
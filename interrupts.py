@@ -0,0 +1,122 @@
+"""
+Interrupt controller for the GameBoy emulator.
+
+Hardware requests an interrupt by setting its bit in IF (0xFF0F). The cpu
+takes the lowest pending interrupt that is also enabled in IE (0xFFFF)
+while IME (Cpu.interrupts) is set: IME and the IF bit are cleared, pc is
+pushed and the cpu jumps to the interrupt's vector.
+
+Nothing is checked after every instruction. Whatever can make an interrupt
+pending (a request, a write to IF or IE, EI and RETI) schedules a check on
+the core's scheduler, which runs between instructions. EI sets IME only
+once the instruction after it has run, through an event of its own.
+"""
+__author__ = 'Clayton Powell'
+
+VBLANK = 0x01
+STAT = 0x02
+TIMER = 0x04
+SERIAL = 0x08
+JOYPAD = 0x10
+
+VECTORS = {VBLANK: 0x40, STAT: 0x48, TIMER: 0x50, SERIAL: 0x58, JOYPAD: 0x60}
+
+# cycles the cpu spends pushing pc and jumping to the vector
+DISPATCH_CYCLES = 20
+
+# from the start of EI to a cycle after it and before the end of the next
+# instruction: EI takes 4 cycles and no instruction takes less
+EI_DELAY = 5
+
+
+class Interrupts(object):
+    """
+    Interrupts class that holds IF and services interrupts for the cpu.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to interrupt
+    scheduler : scheduler.Scheduler
+        scheduler the checks run on
+    """
+
+    def __init__(self, cpu, scheduler):
+        self.cpu = cpu
+        self.mmu = cpu.mmu
+        self.scheduler = scheduler
+        self.flags = 0
+        self._event = None
+        self._enable_event = None
+        self.mmu.irq = self
+        self.mmu.io_read[0xff0f] = self.read_flags
+        self.mmu.io_write[0xff0f] = self.write_flags
+
+    def read_flags(self):
+        """
+        IF (0xFF0F), the upper three bits read as 1.
+        """
+        return 0xe0 | self.flags
+
+    def write_flags(self, value):
+        self.flags = value & 0x1f
+        self.poll()
+
+    def request(self, interrupt):
+        """
+        Requests an interrupt.
+
+        Parameters
+        ----------
+        interrupt : int
+            bit of the interrupt, e.g. TIMER
+        """
+        self.flags |= interrupt
+        self.poll()
+
+    def poll(self):
+        """
+        Schedules a check for pending interrupts.
+        """
+        if self._event is not None:
+            self.scheduler.cancel(self._event)
+        self._event = self.scheduler.schedule(self.scheduler.now, self._check)
+
+    def enable(self):
+        """
+        Sets IME once the instruction after the current one has run, as EI
+        does. Called while EI runs, before the core adds its cycles.
+        """
+        self.cancel_enable()
+        self._enable_event = self.scheduler.schedule(
+            self.scheduler.now + EI_DELAY, self._enable)
+
+    def cancel_enable(self):
+        """
+        Drops an enable that has not taken effect yet, as DI right after EI.
+        """
+        self.scheduler.cancel(self._enable_event)
+        self._enable_event = None
+
+    def _enable(self, when):
+        self._enable_event = None
+        self.cpu.interrupts = True
+        self.poll()
+
+    def _check(self, when):
+        self._event = None
+        pending = self.mmu.interrupt_enable & self.flags & 0x1f
+        if not pending:
+            return
+        cpu = self.cpu
+        if cpu.halted:
+            # a pending interrupt ends HALT even while IME is clear
+            cpu.halted = False
+            cpu.registers.pc += 1
+        if not cpu.interrupts:
+            return
+        interrupt = pending & -pending
+        self.flags &= ~interrupt
+        cpu.interrupts = False
+        cpu._rst(VECTORS[interrupt])
+        self.scheduler.now += DISPATCH_CYCLES
@@ -0,0 +1,488 @@
+"""
+Trace compiler for hot loops.
+
+While enabled, TraceJit shadows the cpu's cycle method and counts backward
+jumps. Once a loop head has been jumped back to `threshold` times, the next
+pass through the loop is recorded: every instruction the cpu executes, and
+whether each conditional branch was taken, until execution gets back to the
+head. The recorded path is then turned into the Python source of a single
+function and compiled. The trace function
+
+    - loads A, B, C, D, E, H, L, SP and the four flags into locals once,
+    - runs the loop body as straight line code on those locals, with memory
+      going through the mmu and 8 bit arithmetic through the alu tables,
+    - guards every conditional branch: if it goes the other way than when
+      recorded, the trace leaves through a side exit to the other target,
+    - loops back to the head until `budget` cycles have run,
+    - and writes the locals back to the registers only when it exits.
+
+From then on, whenever the cpu reaches the head of a compiled loop the
+trace runs instead of the interpreter and returns the cycles it took, so
+the core's per instruction work is paid once per trace call. Writes to
+addresses below 0x8000 (bank switches) leave the trace right after the
+write, since the code the rest of the trace was recorded from may no longer
+be mapped.
+
+Before every instruction that touches memory the trace moves the
+scheduler's cycle counter on by the cycles run so far, so LY, STAT and DIV
+read what they would interpreted, and after every instruction it leaves
+once the next event is due, so interrupts and gpu modes are never late.
+The counter is put back before returning, since the core adds the returned
+cycles.
+
+Only instructions with a template below can be compiled; a loop containing
+anything else (calls, returns, stack, interrupts enable/disable, HALT...)
+is never compiled and keeps running in the interpreter. Code in RAM is not
+traced. Anything shadowing Cpu.cycle after the jit sees a trace call as one
+instruction.
+
+An interrupt taken while a loop is being recorded throws the recording
+away, and the loop is recorded again once it is hot again. Traces, counts
+and rejections are dropped when the mmu's rom is replaced, e.g. by
+Core.load_rom.
+"""
+__author__ = 'Clayton Powell'
+import alu
+import disasm
+
+REG8 = ('b', 'c', 'd', 'e', 'h', 'l', None, 'a')
+PAIRS = (('b', 'c'), ('d', 'e'), ('h', 'l'))
+FLAGS = ('zf', 'nf', 'hf', 'cf')
+LOCALS = ('a', 'b', 'c', 'd', 'e', 'h', 'l', 'sp') + FLAGS
+FIELDS = {'zf': 'zero_flag', 'nf': 'sub_flag', 'hf': 'hc_flag',
+          'cf': 'carry_flag'}
+CONDITIONS = ('zf == 0', 'zf', 'cf == 0', 'cf')
+
+# CB shifts on the value in v: new value in v and carry out in co
+SHIFTS = ('co = v >> 7\nv = ((v << 1) | co) & 0xff',
+          'co = v & 1\nv = (v >> 1) | (co << 7)',
+          'co = v >> 7\nv = ((v << 1) | cf) & 0xff',
+          'co = v & 1\nv = (v >> 1) | (cf << 7)',
+          'co = v >> 7\nv = (v << 1) & 0xff',
+          'co = v & 1\nv = (v >> 1) | (v & 0x80)',
+          'co = 0\nv = ((v << 4) | (v >> 4)) & 0xff',
+          'co = v & 1\nv = v >> 1')
+
+
+class Unsupported(Exception):
+    """
+    Unsupported exception raised for an instruction with no template.
+    """
+
+
+def _read8(index):
+    if index == 6:
+        return 'read((h << 8) | l)'
+    return REG8[index]
+
+
+def _alu(kind, value):
+    """
+    Source of the 8 bit ALU operation `kind` (0-7 as in opcode bits 3-5)
+    with an operand expression.
+    """
+    if kind in (0, 1, 2, 3, 7):
+        table = 'ADD' if kind < 2 else 'SUB'
+        carry = 'cf << 16 | ' if kind in (1, 3) else ''
+        lines = ['i = %s(a << 8) | %s' % (carry, value),
+                 'f = %s_FLAGS[i]' % table]
+        if kind != 7:
+            lines.append('a = %s[i]' % table)
+        lines.append('zf = f >> 7; nf = %d; hf = (f >> 5) & 1; cf = (f >> 4) & 1'
+                     % (0 if kind < 2 else 1))
+        return lines
+    table = {4: 'AND', 5: 'XOR', 6: 'OR'}[kind]
+    return ['i = (a << 8) | %s' % value,
+            'f = %s_FLAGS[i]' % table,
+            'a = %s[i]' % table,
+            'zf = f >> 7; nf = 0; hf = %d; cf = 0' % (1 if kind == 4 else 0)]
+
+
+def _pair(index, value):
+    if index == 3:
+        return ['sp = %s' % value]
+    high, low = PAIRS[index]
+    return ['v = %s' % value, '%s = v >> 8; %s = v & 0xff' % (high, low)]
+
+
+def _pair_value(index):
+    if index == 3:
+        return 'sp'
+    return '((%s << 8) | %s)' % PAIRS[index]
+
+
+def _write(addr, value):
+    """
+    A write through the mmu, flagged so the trace can leave after it.
+    """
+    return ['addr = %s' % addr, 'write(addr, %s)' % value, '#guard-write']
+
+
+def _body(instruction):
+    """
+    Source lines for one instruction, not counting control flow.
+    """
+    code = instruction.code
+    op = code[0]
+    d8 = code[1] if len(code) > 1 else 0
+    d16 = (code[2] << 8 | code[1]) if len(code) > 2 else 0
+    if op == 0xcb:
+        cb = code[1]
+        target = cb & 7
+        lines = ['v = %s' % _read8(target)]
+        if cb < 0x40:
+            lines += SHIFTS[cb >> 3].split('\n')
+            lines.append('zf = 0 if v else 1; nf = 0; hf = 0; cf = co')
+        elif cb < 0x80:
+            return lines + ['zf = 0 if v & %#04x else 1; nf = 0; hf = 1'
+                            % (1 << ((cb >> 3) & 7))]
+        elif cb < 0xc0:
+            lines.append('v = v & %#04x' % (~(1 << ((cb >> 3) & 7)) & 0xff))
+        else:
+            lines.append('v = v | %#04x' % (1 << ((cb >> 3) & 7)))
+        if target == 6:
+            return lines + _write('(h << 8) | l', 'v')
+        return lines + ['%s = v' % REG8[target]]
+    if op == 0x00:
+        return []
+    if 0x40 <= op < 0x80 and op != 0x76:
+        dst, src = (op >> 3) & 7, op & 7
+        if dst == 6:
+            return _write('(h << 8) | l', REG8[src])
+        return ['%s = %s' % (REG8[dst], _read8(src))]
+    if 0x80 <= op < 0xc0:
+        return _alu((op >> 3) & 7, _read8(op & 7))
+    if op & 0xc7 == 0xc6:
+        return _alu((op >> 3) & 7, '%#04x' % d8)
+    if op < 0x40:
+        index = (op >> 3) & 7
+        column = op & 0x0f
+        if op & 7 == 6:
+            if index == 6:
+                return _write('(h << 8) | l', '%#04x' % d8)
+            return ['%s = %#04x' % (REG8[index], d8)]
+        if op & 7 in (4, 5):
+            table = 'INC' if op & 7 == 4 else 'DEC'
+            lines = ['v = %s' % _read8(index),
+                     'f = %s_FLAGS[v]' % table,
+                     'zf = f >> 7; nf = %d; hf = (f >> 5) & 1'
+                     % (0 if table == 'INC' else 1)]
+            if index == 6:
+                return lines + _write('(h << 8) | l', '%s[v]' % table)
+            return lines + ['%s = %s[v]' % (REG8[index], table)]
+        if column == 0x01:
+            return _pair(op >> 4, '%#06x' % d16)
+        if column in (0x03, 0x0b):
+            step = '+ 1' if column == 0x03 else '- 1'
+            return _pair(op >> 4, '(%s %s) & 0xffff' % (_pair_value(op >> 4), step))
+        if column == 0x09:
+            return ['hl = (h << 8) | l', 'v = %s' % _pair_value(op >> 4),
+                    'hf = 1 if (hl & 0xfff) + (v & 0xfff) > 0xfff else 0',
+                    'cf = 1 if hl + v > 0xffff else 0', 'nf = 0',
+                    'hl = (hl + v) & 0xffff', 'h = hl >> 8; l = hl & 0xff']
+        if column in (0x02, 0x0a):
+            pair = op >> 4
+            if pair < 2:
+                addr = _pair_value(pair)
+                if column == 0x02:
+                    return _write(addr, 'a')
+                return ['a = read(%s)' % addr]
+            step = '+ 1' if pair == 2 else '- 1'
+            lines = ['hl = (h << 8) | l']
+            if column == 0x02:
+                lines += ['write(hl, a)']
+            else:
+                lines += ['a = read(hl)']
+            lines += ['addr = hl', 'hl = (hl %s) & 0xffff' % step,
+                      'h = hl >> 8; l = hl & 0xff']
+            if column == 0x02:
+                lines.append('#guard-write')
+            return lines
+        if op == 0x07:
+            return ['cf = a >> 7', 'a = ((a << 1) | cf) & 0xff',
+                    'zf = 0; nf = 0; hf = 0']
+        if op == 0x0f:
+            return ['cf = a & 1', 'a = (a >> 1) | (cf << 7)',
+                    'zf = 0; nf = 0; hf = 0']
+        if op == 0x17:
+            return ['co = a >> 7', 'a = ((a << 1) | cf) & 0xff',
+                    'cf = co; zf = 0; nf = 0; hf = 0']
+        if op == 0x1f:
+            return ['co = a & 1', 'a = (a >> 1) | (cf << 7)',
+                    'cf = co; zf = 0; nf = 0; hf = 0']
+        if op == 0x27:
+            return ['i = (nf << 10) | (hf << 9) | (cf << 8) | a',
+                    'f = DAA_FLAGS[i]', 'a = DAA[i]',
+                    'zf = f >> 7; hf = 0; cf = (f >> 4) & 1']
+        if op == 0x2f:
+            return ['a = a ^ 0xff', 'nf = 1; hf = 1']
+        if op == 0x37:
+            return ['nf = 0; hf = 0; cf = 1']
+        if op == 0x3f:
+            return ['nf = 0; hf = 0; cf = cf ^ 1']
+    if op == 0xe0:
+        return ['write(%#06x, a)' % (0xff00 | d8)]
+    if op == 0xf0:
+        return ['a = read(%#06x)' % (0xff00 | d8)]
+    if op == 0xe2:
+        return ['write(0xff00 | c, a)']
+    if op == 0xf2:
+        return ['a = read(0xff00 | c)']
+    if op == 0xea:
+        return _write('%#06x' % d16, 'a')
+    if op == 0xfa:
+        return ['a = read(%#06x)' % d16]
+    if op in (0x18, 0xc3) or (op & 0xe7) in (0x20, 0xc2):
+        # jumps only move pc, handled by the caller
+        return []
+    raise Unsupported(instruction.text)
+
+
+def _condition(op):
+    """
+    Branch condition of a conditional JR/JP as an expression on the flags.
+    """
+    return CONDITIONS[(op >> 3) & 3]
+
+
+def compile_trace(path, head, budget):
+    """
+    Compiles a recorded loop into a trace function.
+
+    Parameters
+    ----------
+    path : list of tuple
+        (instruction, taken) for every instruction of one pass through the
+        loop, starting at the head; taken tells whether a conditional branch
+        was taken when recorded
+    head : int
+        address of the loop head
+    budget : int
+        cycles after which the trace returns to the interpreter at the head
+
+    Returns
+    -------
+    String
+        source of a function trace(registers, read, write, scheduler)
+        returning the cycles run
+
+    Raises
+    ------
+    Unsupported
+        if an instruction of the path has no template
+    """
+    lines = ['def trace(registers, read, write, scheduler):']
+    for name in LOCALS:
+        lines.append('    %s = int(registers.%s)' % (name, FIELDS.get(name, name)))
+    lines += ['    start = scheduler.now', '    cycles = 0', '    while True:']
+    for i, (instruction, taken) in enumerate(path):
+        op = instruction.code[0]
+        fall_through = (instruction.addr + instruction.length) & 0xffff
+        body = ['# %04x %s' % (instruction.addr, instruction.text)]
+        source = _body(instruction)
+        if any('read(' in line or 'write(' in line for line in source):
+            # memory mapped registers read the time the access happens at
+            body.append('scheduler.now = start + cycles')
+        guard_write = False
+        for line in source:
+            if line == '#guard-write':
+                guard_write = True
+            else:
+                body.append(line)
+        if instruction.conditional:
+            cycles = instruction.branch_cycles if taken else instruction.cycles
+            other = instruction.cycles if taken else instruction.branch_cycles
+            body.append('cycles += %d' % cycles)
+            condition = _condition(op)
+            body.append('if %s(%s):' % ('not ' if taken else '', condition))
+            body.append('    cycles += %d' % (other - cycles))
+            body.append('    pc = %#06x' % (fall_through if taken else instruction.target))
+            body.append('    break')
+        else:
+            body.append('cycles += %d' % instruction.cycles)
+        if guard_write:
+            # a bank switch may have swapped out the rest of the trace
+            body.append('if addr < 0x8000:')
+            body.append('    pc = %#06x' % fall_through)
+            body.append('    break')
+        if i < len(path) - 1:
+            # an event due now runs before the next instruction
+            body.append('if start + cycles >= scheduler.deadline:')
+            body.append('    pc = %#06x' % path[i + 1][0].addr)
+            body.append('    break')
+        lines += ['        ' + line for line in body]
+    lines += ['        if cycles >= %d or start + cycles >= scheduler.deadline:'
+              % budget,
+              '            pc = %#06x' % head,
+              '            break']
+    for name in LOCALS:
+        lines.append('    registers.%s = %s' % (FIELDS.get(name, name), name))
+    lines += ['    registers.jump(pc)', '    scheduler.now = start',
+              '    return cycles']
+    return '\n'.join(lines) + '\n'
+
+
+class TraceJit(object):
+    """
+    TraceJit class that records and compiles hot loops of a cpu.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to run traces for
+    scheduler : scheduler.Scheduler
+        scheduler of the core, traces keep its time and stop at its events
+    threshold : int
+        backward jumps to a loop head before it is recorded
+    budget : int
+        most cycles a trace runs before returning to the core, it returns
+        earlier when a scheduler event is due
+    max_length : int
+        longest path, in instructions, that is recorded
+    """
+
+    def __init__(self, cpu, scheduler, threshold=50, budget=64, max_length=64):
+        self.cpu = cpu
+        self.scheduler = scheduler
+        self.threshold = threshold
+        self.budget = budget
+        self.max_length = max_length
+        self.rom = None
+        self.disassembler = None
+        self.counts = {}
+        self.traces = {}
+        self.sources = {}
+        self.failed = set()
+        self.recording = None
+        self.enabled = False
+
+    def _key(self, pc):
+        if pc < 0x4000:
+            return pc
+        return (self.cpu.mmu.rom_bank << 16) | pc
+
+    def enable(self):
+        """
+        Shadows the cpu cycle method with the tracing dispatcher.
+        """
+        if self.enabled:
+            return
+        self._shadowed = self.cpu.__dict__.get('cycle')
+        cycle = self.cpu.cycle
+        registers = self.cpu.registers
+        mmu = self.cpu.mmu
+        scheduler = self.scheduler
+        traces = self.traces
+        counts = self.counts
+        threshold = self.threshold
+
+        def jit_cycle():
+            pc = int(registers.pc)
+            if self.recording is not None:
+                return self._record(cycle, pc)
+            if mmu.rom is not self.rom:
+                self._forget()
+            if pc < 0x8000:
+                key = pc if pc < 0x4000 else (mmu.rom_bank << 16) | pc
+                trace = traces.get(key)
+                if trace is not None:
+                    return trace(registers, mmu.read_byte, mmu.write_byte,
+                                 scheduler)
+            cycles = cycle()
+            target = int(registers.pc)
+            if target < pc and target < 0x8000:
+                key = self._key(target)
+                count = counts.get(key, 0) + 1
+                counts[key] = count
+                if count == threshold and key not in self.failed:
+                    self.recording = (key, target, [], target)
+            return cycles
+        self.cpu.cycle = jit_cycle
+        self.enabled = True
+
+    def disable(self):
+        """
+        Removes the dispatcher. Compiled traces are kept for the next enable.
+        """
+        if not self.enabled:
+            return
+        if self._shadowed is None:
+            del self.cpu.cycle
+        else:
+            self.cpu.cycle = self._shadowed
+        self.recording = None
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def _forget(self):
+        """
+        Drops everything learnt about the previous rom.
+        """
+        self.rom = self.cpu.mmu.rom
+        self.disassembler = disasm.Disassembler(self.rom)
+        self.counts.clear()
+        self.traces.clear()
+        self.sources.clear()
+        self.failed.clear()
+
+    def _record(self, cycle, pc):
+        key, head, path, expected = self.recording
+        mmu = self.cpu.mmu
+        if pc != expected:
+            # an interrupt was taken, the path says nothing about the loop:
+            # record again once the head is hot again
+            self.recording = None
+            self.counts[key] = 0
+            return cycle()
+        if pc >= 0x8000 or len(path) >= self.max_length:
+            return self._abandon(cycle)
+        instruction = self.disassembler.at(mmu, pc)
+        cycles = cycle()
+        target = int(self.cpu.registers.pc)
+        path.append((instruction, target == instruction.target))
+        if target == head and self._key(target) == key:
+            self._compile(key, head, path)
+        else:
+            self.recording = (key, head, path, target)
+        return cycles
+
+    def _abandon(self, cycle):
+        self.failed.add(self.recording[0])
+        self.recording = None
+        return cycle()
+
+    def _compile(self, key, head, path):
+        self.recording = None
+        try:
+            source = compile_trace(path, head, self.budget)
+        except Unsupported:
+            self.failed.add(key)
+            return
+        namespace = {'ADD': alu.ADD, 'ADD_FLAGS': alu.ADD_FLAGS,
+                     'SUB': alu.SUB, 'SUB_FLAGS': alu.SUB_FLAGS,
+                     'AND': alu.AND, 'AND_FLAGS': alu.AND_FLAGS,
+                     'OR': alu.OR, 'OR_FLAGS': alu.OR_FLAGS,
+                     'XOR': alu.XOR, 'XOR_FLAGS': alu.XOR_FLAGS,
+                     'INC': alu.INC, 'INC_FLAGS': alu.INC_FLAGS,
+                     'DEC': alu.DEC, 'DEC_FLAGS': alu.DEC_FLAGS,
+                     'DAA': alu.DAA, 'DAA_FLAGS': alu.DAA_FLAGS}
+        exec(compile(source, '<trace %04x>' % head, 'exec'), namespace)
+        self.sources[key] = source
+        self.traces[key] = namespace['trace']
+
+    def report(self):
+        """
+        Lists the compiled and the rejected loop heads.
+        """
+        lines = []
+        for key in sorted(self.traces):
+            lines.append('compiled %02x:%04x' % (key >> 16, key & 0xffff))
+        for key in sorted(self.failed):
+            lines.append('rejected %02x:%04x' % (key >> 16, key & 0xffff))
+        return '\n'.join(lines)
@@ -0,0 +1,107 @@
+"""
+Joypad for the GameBoy emulator.
+
+The eight buttons are read through the P1/JOYP register at 0xFF00. Bits 4 and
+5 of the register select which half of the pad is visible in the low nibble,
+and a pressed button reads as 0.
+"""
+__author__ = 'Clayton Powell'
+
+RIGHT = 0x01
+LEFT = 0x02
+UP = 0x04
+DOWN = 0x08
+A = 0x10
+B = 0x20
+SELECT = 0x40
+START = 0x80
+
+BUTTONS = {
+    'right': RIGHT,
+    'left': LEFT,
+    'up': UP,
+    'down': DOWN,
+    'a': A,
+    'b': B,
+    'select': SELECT,
+    'start': START,
+}
+
+
+class Joypad(object):
+    """
+    Joypad class that holds the button state and emulates the JOYP register.
+    """
+
+    def __init__(self):
+        self.buttons = 0
+        self.select = 0x30
+
+    def reset(self):
+        """
+        Releases every button and deselects both button groups.
+        """
+        self.buttons = 0
+        self.select = 0x30
+
+    def press(self, button):
+        """
+        Presses the given button(s).
+
+        Parameters
+        ----------
+        button : int
+            Button mask, one or more of the module level button constants
+        """
+        self.buttons |= button
+
+    def release(self, button):
+        """
+        Releases the given button(s).
+
+        Parameters
+        ----------
+        button : int
+            Button mask, one or more of the module level button constants
+        """
+        self.buttons &= ~button & 0xff
+
+    def set_state(self, mask):
+        """
+        Replaces the whole button state, used when replaying movies.
+
+        Parameters
+        ----------
+        mask : int
+            8 bit mask of the buttons held down
+        """
+        self.buttons = mask & 0xff
+
+    def write(self, value):
+        """
+        Handles a write to JOYP. Only the two select bits are writable.
+
+        Parameters
+        ----------
+        value : int
+            8 bit value written to 0xFF00
+        """
+        self.select = value & 0x30
+
+    def read(self):
+        """
+        Reads the JOYP register for the currently selected button group.
+
+        Returns
+        -------
+        int
+            8 bit JOYP value, pressed buttons read as 0
+        """
+        pressed = 0
+        if not self.select & 0x10:
+            # Direction keys selected
+            pressed |= self.buttons & 0x0f
+        if not self.select & 0x20:
+            # Action keys selected
+            pressed |= self.buttons >> 4
+        return 0xc0 | self.select | (~pressed & 0x0f)
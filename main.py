@@ -2,18 +2,32 @@ __author__ = 'Clayton Powell'
 import gbpy
 import pyglet
 import argparse
-import register
+import movie
+import framebuffer
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("rom", type=str, metavar='FILE',
                         help="File path to the GameBoy Rom you wish to run.")
+    parser.add_argument("--record", type=str, metavar='MOVIE', default=None,
+                        help="Record joypad input to a movie file on exit.")
+    parser.add_argument("--share", type=str, metavar='NAME', default=None,
+                        help="Export frames to the named shared memory block.")
     args = parser.parse_args()
     template = pyglet.gl.Config(double_buffer=False)
     emulator = gbpy.Gbpy(160, 144, config=template, caption="GameBoy Emulator")
     emulator.load_rom(args.rom)
+    if args.record:
+        emulator.recorder.movie = movie.Movie()
+    if args.share:
+        exporter = framebuffer.SharedFramebuffer(args.share)
+        exporter.attach(emulator.gpu)
     #pyglet.clock.schedule_interval(emulator.main, 1/1000)
     #pyglet.app.run()
-    while True:
+    while not emulator.has_exit:
         emulator.main()
+    if args.record:
+        emulator.recorder.movie.save(args.record)
+    if args.share:
+        exporter.close()
@@ -9,6 +9,7 @@ about are readWord, readByte, writeWord, and writeByte. With these four
 functions the CPU can run it's full opcode list.
 """
 __author__ = 'Clayton Powell'
+import joypad
 
 bios = [0x31, 0xFE, 0xFF, 0xAF, 0x21, 0xFF, 0x9F, 0x32, 0xCB, 0x7C, 0x20, 0xFB,
         0x21, 0x26, 0xFF, 0x0E, 0x11, 0x3E, 0x80, 0x32, 0xE2, 0x0C, 0x3E, 0xF3,
@@ -46,6 +47,14 @@ class MMU(object):
         self.zram = []
         self.mmio = []
         self.interrupt_enable = 0
+        self.rom_bank = 1
+        self.joypad = joypad.Joypad()
+        self.gpu = None
+        self.irq = None
+        # MMIO registers handled by the hardware they belong to, address to
+        # function returning the value for reads and taking it for writes
+        self.io_read = {}
+        self.io_write = {}
         self.reset()
 
     def reset(self):
@@ -57,11 +66,16 @@ class MMU(object):
         self.eram = [0] * 0x8000
         self.zram = [0] * 0x80
         self.mmio = [0] * 0x80
+        # LCD on as the boot ROM leaves it
+        self.mmio[0x40] = 0x91
         self.interrupt_enable = 0
+        self.rom_bank = 1
+        self.joypad.reset()
 
     def load(self, rom_path):
         """
-        Loads the rom at the given rom_path into local memory.
+        Loads the rom at the given rom_path into local memory, replacing
+        any rom loaded before.
 
         Parameters
         ----------
@@ -69,9 +83,8 @@ class MMU(object):
             Path on system to inteded ROM to load
         """
         self.reset()
-        rom = open(rom_path, "rb").read()
-        for c in rom:
-            self.rom.append(c)
+        with open(rom_path, "rb") as f:
+            self.rom = list(f.read())
 
     def write_byte(self, addr, value):
         """
@@ -88,18 +101,27 @@ class MMU(object):
             # Zero page RAM
             if addr == 0xffff:
                 self.interrupt_enable = value
+                if self.irq is not None:
+                    self.irq.poll()
             else:
                 self.zram[addr & 0x7f] = value
         elif addr >= 0xff00:
             # MMIO is a funny thing, needs looking into.
-            pass
+            if addr == 0xff00:
+                self.joypad.write(value)
+            else:
+                write = self.io_write.get(addr)
+                if write is not None:
+                    write(value)
+                else:
+                    self.mmio[addr & 0x7f] = value
         elif addr >= 0xfea0:
             # unused space
             pass
         elif addr >= 0xfe00:
             # Object Attribute Memory (OAM) in gpu
-            # TODO implement this in gpu: return self.gpu.oam[addr & 0xff]
-            pass
+            if self.gpu is not None:
+                self.gpu.oam[addr & 0xff] = value
         elif addr >= 0xe000:
             # Working RAM shadow (read wram anyway)
             self.wram[addr & 0x1fff] = value
@@ -109,19 +131,25 @@ class MMU(object):
         elif addr >= 0xa000:
             # External RAM
             #TODO need to implement memory bank controllers for this,
-            pass
+            # only the first RAM bank is mapped for now
+            self.eram[addr & 0x1fff] = value
         elif addr >= 0x8000:
             # Graphics RAM
-            # TODO implement this in gpu: return
-            # return self.gpu.vram[addr & 0x1fff]
-            pass
+            if self.gpu is not None:
+                self.gpu.vram[addr & 0x1fff] = value
         elif addr >= 0x4000:
-            # ROM Bank 1
-            # TODO implement memory bank controllers to enable this
+            # MBC1 RAM bank and banking mode select, only the first RAM bank
+            # and simple banking are mapped for now
             pass
+        elif addr >= 0x2000:
+            # MBC1 style ROM bank select, bank 0 maps to bank 1
+            banks = max(len(self.rom) >> 14, 2)
+            self.rom_bank = ((value & 0x1f) or 1) % banks or 1
         else:
-            # ROM Bank 0
-            self.rom[addr] = value
+            # MBC1 RAM enable, external RAM is always enabled for now. ROM
+            # itself is never written, the disassembler, fusion and jit
+            # caches rely on it
+            pass
 
     def write_word(self, addr, value):
         """
@@ -159,14 +187,19 @@ class MMU(object):
                 return self.zram[addr & 0x7f]
         elif addr >= 0xff00:
             # MMIO
+            if addr == 0xff00:
+                return self.joypad.read()
+            read = self.io_read.get(addr)
+            if read is not None:
+                return read()
             return self.mmio[addr & 0xff]
         elif addr >= 0xfea0:
             # unused space
             return 0
         elif addr >= 0xfe00:
             # Object Attribute Memory (OAM) in gpu
-            # TODO implement this in gpu: return self.gpu.oam[addr & 0xff]
-            pass
+            if self.gpu is not None:
+                return self.gpu.oam[addr & 0xff]
         elif addr >= 0xe000:
             # Working RAM shadow (read wram anyway)
             return self.wram[addr & 0x1fff]
@@ -176,16 +209,15 @@ class MMU(object):
         elif addr >= 0xa000:
             # External RAM
             #TODO need to implement memory bank controllers for this,
-            pass
+            # only the first RAM bank is mapped for now
+            return self.eram[addr & 0x1fff]
         elif addr >= 0x8000:
             # Graphics RAM
-            # TODO implement this in gpu: return
-            # return self.gpu.vram[addr & 0x1fff]
-            pass
+            if self.gpu is not None:
+                return self.gpu.vram[addr & 0x1fff]
         elif addr >= 0x4000:
             # ROM Bank 1
-            # TODO implement memory bank controllers to enable this
-            pass
+            return self.rom[(self.rom_bank << 14) | (addr & 0x3fff)]
         else:
             # ROM Bank 0
             return self.rom[int(addr)]
@@ -0,0 +1,265 @@
+"""
+Input movies for the GameBoy emulator.
+
+A movie is the list of joypad transitions made while playing, stored as
+(frame number, button mask) pairs. Only changes are recorded, so the mask at
+any frame is the mask of the last transition at or before it. Replaying a
+movie into a headless core reproduces the run exactly, at whatever speed the
+core manages.
+
+For that the input has to change at the same instruction on both sides.
+Replay sets the mask of frame n just before running frame n, so Recorder
+holds key presses back until the next frame starts and records them there,
+instead of applying them in the middle of the frame they were pressed in.
+
+File format is plain text, one transition per line:
+
+    gbpy-movie 1
+    <frame> <mask as two hex digits>
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import bisect
+
+MAGIC = 'gbpy-movie 1'
+
+
+class Movie(object):
+    """
+    Movie class holding recorded joypad transitions.
+    """
+
+    def __init__(self, events=None):
+        self.frames = []
+        self.masks = []
+        for frame, mask in events or []:
+            self.record(frame, mask)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(zip(self.frames, self.masks))
+
+    @property
+    def length(self):
+        """
+        Frame number of the last transition in the movie.
+        """
+        return self.frames[-1] if self.frames else 0
+
+    def record(self, frame, mask):
+        """
+        Records the button mask held from the given frame onwards.
+
+        Redundant transitions are dropped and a second transition on the same
+        frame replaces the first.
+
+        Parameters
+        ----------
+        frame : int
+            frame number the mask takes effect on
+        mask : int
+            8 bit joypad button mask
+        """
+        if self.frames and frame < self.frames[-1]:
+            raise ValueError("Movie frames must be recorded in order")
+        if self.frames and frame == self.frames[-1]:
+            self.frames.pop()
+            self.masks.pop()
+        if self.mask_at(frame) != mask:
+            self.frames.append(frame)
+            self.masks.append(mask)
+
+    def mask_at(self, frame):
+        """
+        Returns the button mask held during the given frame.
+
+        Parameters
+        ----------
+        frame : int
+            frame number to look up
+
+        Returns
+        -------
+        int
+            8 bit joypad button mask
+        """
+        i = bisect.bisect_right(self.frames, frame)
+        return self.masks[i - 1] if i else 0
+
+    def save(self, path):
+        """
+        Writes the movie to the file at path.
+
+        Parameters
+        ----------
+        path : String
+            Path on system to write the movie to
+        """
+        with open(path, 'w') as f:
+            f.write(MAGIC + '\n')
+            for frame, mask in self:
+                f.write('%d %02x\n' % (frame, mask))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a movie previously written with save.
+
+        Parameters
+        ----------
+        path : String
+            Path on system of the movie file
+
+        Returns
+        -------
+        Movie
+            the loaded movie
+        """
+        movie = cls()
+        with open(path) as f:
+            if f.readline().strip() != MAGIC:
+                raise ValueError("%s is not a gbpy movie" % path)
+            for line in f:
+                line = line.strip()
+                if line:
+                    frame, mask = line.split()
+                    movie.record(int(frame), int(mask, 16))
+        return movie
+
+
+class Recorder(object):
+    """
+    Recorder class that applies joypad input at frame boundaries, where
+    replay applies it, and records the transitions into a movie.
+
+    Parameters
+    ----------
+    core : core.Core
+        core to step and feed the input to
+    movie : Movie
+        movie to record into, None to only play
+    """
+
+    def __init__(self, core, movie=None):
+        self.core = core
+        self.movie = movie
+        self.buttons = core.joypad.buttons
+        # frames are recorded counting from here, as replay counts them
+        self.start = core.gpu.frame
+        self._frame = core.gpu.frame
+        if movie is not None:
+            movie.record(0, self.buttons)
+
+    def press(self, button):
+        """
+        Presses the given button(s) from the start of the next frame.
+        """
+        self.buttons |= button
+
+    def release(self, button):
+        """
+        Releases the given button(s) from the start of the next frame.
+        """
+        self.buttons &= ~button & 0xff
+
+    def step(self):
+        """
+        Executes a single instruction, applying the held buttons if it
+        started a new frame.
+
+        Returns
+        -------
+        int
+            number of clock cycles the instruction took
+        """
+        cycles = self.core.step()
+        if self.core.gpu.frame != self._frame:
+            self._frame = self.core.gpu.frame
+            self.core.joypad.set_state(self.buttons)
+            if self.movie is not None:
+                self.movie.record(self._frame - self.start, self.buttons)
+        return cycles
+
+
+def replay(core, movie, frames=None, on_frame=None):
+    """
+    Feeds a movie into a core, running it one frame at a time.
+
+    Parameters
+    ----------
+    core : core.Core
+        core with the ROM already loaded
+    movie : Movie
+        movie to replay
+    frames : int
+        number of frames to run, defaults to the length of the movie
+    on_frame : function
+        called with no arguments after every frame, e.g. to pull audio
+
+    Returns
+    -------
+    int
+        number of frames run
+    """
+    if frames is None:
+        frames = movie.length + 1
+    start = core.gpu.frame
+    events = iter(movie)
+    pending = next(events, None)
+    for frame in range(frames):
+        while pending is not None and pending[0] <= frame:
+            core.joypad.set_state(pending[1])
+            pending = next(events, None)
+        core.run_frame()
+        if on_frame is not None:
+            on_frame()
+    return core.gpu.frame - start
+
+
+if __name__ == '__main__':
+    import core
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rom", type=str, metavar='FILE',
+                        help="File path to the GameBoy Rom you wish to run.")
+    parser.add_argument("movie", type=str, metavar='MOVIE',
+                        help="File path to the movie to replay.")
+    parser.add_argument("--frames", type=int, default=None,
+                        help="Number of frames to run, defaults to the movie length.")
+    parser.add_argument("--profile", action='store_true',
+                        help="Print a per opcode profile after the replay.")
+    parser.add_argument("--hotspots", type=int, metavar='CYCLES', default=None,
+                        help="Sample the pc every CYCLES cycles and print the hottest code.")
+    parser.add_argument("--trace", type=str, metavar='PATH', default=None,
+                        help="Dump the last instructions here at the end or on a crash, .bin for binary.")
+    parser.add_argument("--trace-size", type=int, default=100000,
+                        help="Number of instructions kept for --trace.")
+    args = parser.parse_args()
+    emulator = core.Core()
+    emulator.load_rom(args.rom)
+    opcode_profiler = None
+    sampler = None
+    instruction_tracer = None
+    if args.profile or args.hotspots:
+        import profiler
+    if args.profile:
+        opcode_profiler = profiler.OpcodeProfiler(emulator.cpu)
+        opcode_profiler.enable()
+    if args.hotspots:
+        sampler = profiler.HotspotSampler(emulator.cpu, args.hotspots)
+        sampler.enable()
+    if args.trace:
+        import tracer
+        instruction_tracer = tracer.Tracer(emulator.cpu, emulator.scheduler,
+                                           args.trace_size, args.trace)
+        instruction_tracer.enable()
+    print("Ran %d frames" % replay(emulator, Movie.load(args.movie), args.frames))
+    if opcode_profiler is not None:
+        opcode_profiler.disable()
+        print(opcode_profiler.report())
+    if sampler is not None:
+        sampler.disable()
+        print(sampler.report())
+    if instruction_tracer is not None:
+        instruction_tracer.dump(args.trace)
@@ -0,0 +1,215 @@
+"""
+Opcode table for the GameBoy cpu.
+
+Mnemonics for all 256 base opcodes and all 256 CB prefixed opcodes, in the
+usual Pan docs / pastraiser syntax. Operand placeholders give the bytes that
+follow the opcode:
+
+    d8  - 8 bit immediate          d16 - 16 bit immediate
+    a8  - 8 bit offset from 0xFF00 a16 - 16 bit address
+    r8  - 8 bit signed offset
+
+Illegal opcodes have a mnemonic of None.
+
+CYCLES gives the clock cycles an opcode takes, for conditional jumps, calls
+and returns when the branch is not taken. BRANCH_CYCLES gives the cycles
+when it is taken, and equals CYCLES for every other opcode. CB_CYCLES holds
+the cycles of the CB prefixed opcodes, including the prefix, which
+counts as 4 cycles on its own in CYCLES.
+
+FLAGS and CB_FLAGS give the effect on the Z, N, H and C flags as four
+characters: '-' unchanged, '0' reset, '1' set, or the flag letter when it
+depends on the result.
+
+TABLE and CB_TABLE combine all of the above into one Opcode per opcode,
+for code that wants everything about an opcode without running its handler.
+"""
+__author__ = 'Clayton Powell'
+
+REGISTERS = ('B', 'C', 'D', 'E', 'H', 'L', '(HL)', 'A')
+ALU = ('ADD A,', 'ADC A,', 'SUB ', 'SBC A,', 'AND ', 'XOR ', 'OR ', 'CP ')
+SHIFTS = ('RLC', 'RRC', 'RL', 'RR', 'SLA', 'SRA', 'SWAP', 'SRL')
+PAIRS = ('BC', 'DE', 'HL', 'SP')
+CONDITIONS = ('NZ', 'Z', 'NC', 'C')
+
+
+def _base_opcodes():
+    table = [None] * 256
+    rows = ('NOP', 'LD (a16),SP', 'STOP', 'JR r8',
+            'JR NZ,r8', 'JR Z,r8', 'JR NC,r8', 'JR C,r8')
+    loads = ('LD (BC),A', 'LD A,(BC)', 'LD (DE),A', 'LD A,(DE)',
+             'LD (HL+),A', 'LD A,(HL+)', 'LD (HL-),A', 'LD A,(HL-)')
+    rotates = ('RLCA', 'RRCA', 'RLA', 'RRA', 'DAA', 'CPL', 'SCF', 'CCF')
+    for i in range(8):
+        table[i << 3] = rows[i]
+        table[(i << 3) | 0x02] = loads[i]
+        table[(i << 3) | 0x04] = 'INC ' + REGISTERS[i]
+        table[(i << 3) | 0x05] = 'DEC ' + REGISTERS[i]
+        table[(i << 3) | 0x06] = 'LD %s,d8' % REGISTERS[i]
+        table[(i << 3) | 0x07] = rotates[i]
+    for i, pair in enumerate(PAIRS):
+        table[(i << 4) | 0x01] = 'LD %s,d16' % pair
+        table[(i << 4) | 0x03] = 'INC ' + pair
+        table[(i << 4) | 0x09] = 'ADD HL,' + pair
+        table[(i << 4) | 0x0b] = 'DEC ' + pair
+    for op in range(0x40, 0x80):
+        table[op] = 'LD %s,%s' % (REGISTERS[(op >> 3) & 7], REGISTERS[op & 7])
+    table[0x76] = 'HALT'
+    for op in range(0x80, 0xc0):
+        table[op] = ALU[(op >> 3) & 7] + REGISTERS[op & 7]
+    for i, cond in enumerate(CONDITIONS):
+        table[0xc0 | (i << 3)] = 'RET ' + cond
+        table[0xc2 | (i << 3)] = 'JP %s,a16' % cond
+        table[0xc4 | (i << 3)] = 'CALL %s,a16' % cond
+    for i, pair in enumerate(('BC', 'DE', 'HL', 'AF')):
+        table[0xc1 | (i << 4)] = 'POP ' + pair
+        table[0xc5 | (i << 4)] = 'PUSH ' + pair
+    for i in range(8):
+        table[0xc6 | (i << 3)] = ALU[i] + 'd8'
+        table[0xc7 | (i << 3)] = 'RST %02XH' % (i << 3)
+    table[0xc3] = 'JP a16'
+    table[0xc9] = 'RET'
+    table[0xcb] = 'PREFIX CB'
+    table[0xcd] = 'CALL a16'
+    table[0xd9] = 'RETI'
+    table[0xe0] = 'LDH (a8),A'
+    table[0xe2] = 'LD (C),A'
+    table[0xe8] = 'ADD SP,r8'
+    table[0xe9] = 'JP HL'
+    table[0xea] = 'LD (a16),A'
+    table[0xf0] = 'LDH A,(a8)'
+    table[0xf2] = 'LD A,(C)'
+    table[0xf3] = 'DI'
+    table[0xf8] = 'LD HL,SP+r8'
+    table[0xf9] = 'LD SP,HL'
+    table[0xfa] = 'LD A,(a16)'
+    table[0xfb] = 'EI'
+    return table
+
+
+def _cb_opcodes():
+    table = []
+    for op in range(256):
+        reg = REGISTERS[op & 7]
+        if op < 0x40:
+            table.append('%s %s' % (SHIFTS[op >> 3], reg))
+        else:
+            name = ('BIT', 'RES', 'SET')[(op >> 6) - 1]
+            table.append('%s %d,%s' % (name, (op >> 3) & 7, reg))
+    return table
+
+
+def _length(mnemonic):
+    if mnemonic is None:
+        return 1
+    if mnemonic == 'STOP' or mnemonic == 'PREFIX CB':
+        return 2
+    if 'd16' in mnemonic or 'a16' in mnemonic:
+        return 3
+    if 'd8' in mnemonic or 'a8' in mnemonic or 'r8' in mnemonic:
+        return 2
+    return 1
+
+
+OPCODES = _base_opcodes()
+CB_OPCODES = _cb_opcodes()
+LENGTHS = [_length(mnemonic) for mnemonic in OPCODES]
+
+CYCLES = [
+    4, 12, 8, 8, 4, 4, 8, 4, 20, 8, 8, 8, 4, 4, 8, 4,
+    4, 12, 8, 8, 4, 4, 8, 4, 12, 8, 8, 8, 4, 4, 8, 4,
+    8, 12, 8, 8, 4, 4, 8, 4, 8, 8, 8, 8, 4, 4, 8, 4,
+    8, 12, 8, 8, 12, 12, 12, 4, 8, 8, 8, 8, 4, 4, 8, 4,
+] + [
+    8 if op != 0x76 and ((op & 7) == 6 or 0x70 <= op < 0x78) else 4
+    for op in range(0x40, 0xc0)
+] + [
+    8, 12, 12, 16, 12, 16, 8, 16, 8, 16, 12, 4, 12, 24, 8, 16,
+    8, 12, 12, 4, 12, 16, 8, 16, 8, 16, 12, 4, 12, 4, 8, 16,
+    12, 12, 8, 4, 4, 16, 8, 16, 16, 4, 16, 4, 4, 4, 8, 16,
+    12, 12, 8, 4, 4, 16, 8, 16, 12, 8, 16, 4, 4, 4, 8, 16,
+]
+BRANCH_CYCLES = list(CYCLES)
+for _op in range(4):
+    BRANCH_CYCLES[0x20 | (_op << 3)] = 12
+    BRANCH_CYCLES[0xc0 | (_op << 3)] = 20
+    BRANCH_CYCLES[0xc2 | (_op << 3)] = 16
+    BRANCH_CYCLES[0xc4 | (_op << 3)] = 24
+CB_CYCLES = [(12 if 0x40 <= op < 0x80 else 16) if (op & 7) == 6 else 8
+             for op in range(256)]
+
+
+def _flags(mnemonic):
+    if mnemonic is None:
+        return '----'
+    word, _, rest = mnemonic.partition(' ')
+    if word in ('INC', 'DEC') and rest in PAIRS:
+        return '----'
+    if mnemonic == 'POP AF':
+        return 'ZNHC'
+    if mnemonic.startswith('ADD HL,'):
+        return '-0HC'
+    if mnemonic in ('ADD SP,r8', 'LD HL,SP+r8'):
+        return '00HC'
+    return {
+        'INC': 'Z0H-', 'DEC': 'Z1H-', 'ADD': 'Z0HC', 'ADC': 'Z0HC',
+        'SUB': 'Z1HC', 'SBC': 'Z1HC', 'CP': 'Z1HC', 'AND': 'Z010',
+        'XOR': 'Z000', 'OR': 'Z000', 'RLCA': '000C', 'RRCA': '000C',
+        'RLA': '000C', 'RRA': '000C', 'DAA': 'Z-0C', 'CPL': '-11-',
+        'SCF': '-001', 'CCF': '-00C', 'RLC': 'Z00C', 'RRC': 'Z00C',
+        'RL': 'Z00C', 'RR': 'Z00C', 'SLA': 'Z00C', 'SRA': 'Z00C',
+        'SRL': 'Z00C', 'SWAP': 'Z000', 'BIT': 'Z01-',
+    }.get(word, '----')
+
+
+FLAGS = [_flags(mnemonic) for mnemonic in OPCODES]
+CB_FLAGS = [_flags(mnemonic) for mnemonic in CB_OPCODES]
+
+
+class Opcode(object):
+    """
+    Opcode class, everything known about one opcode.
+
+    Parameters
+    ----------
+    code : int
+        opcode byte, the byte after 0xCB for CB prefixed opcodes
+    cb : bool
+        True for CB prefixed opcodes
+    """
+
+    def __init__(self, code, cb=False):
+        self.code = code
+        self.cb = cb
+        if cb:
+            self.mnemonic = CB_OPCODES[code]
+            self.length = 2
+            self.cycles = self.branch_cycles = CB_CYCLES[code]
+            self.flags = CB_FLAGS[code]
+        else:
+            self.mnemonic = OPCODES[code]
+            self.length = LENGTHS[code]
+            self.cycles = CYCLES[code]
+            self.branch_cycles = BRANCH_CYCLES[code]
+            self.flags = FLAGS[code]
+
+    @property
+    def illegal(self):
+        return self.mnemonic is None
+
+    @property
+    def operands(self):
+        """
+        Operands of the mnemonic, e.g. ('A', '(a16)') for LD A,(a16).
+        """
+        if self.mnemonic is None or ' ' not in self.mnemonic:
+            return ()
+        return tuple(self.mnemonic.split(' ', 1)[1].split(','))
+
+    def __repr__(self):
+        return 'Opcode(%s%02x %s)' % ('cb ' if self.cb else '', self.code,
+                                      self.mnemonic)
+
+
+TABLE = [Opcode(op) for op in range(256)]
+CB_TABLE = [Opcode(op, cb=True) for op in range(256)]
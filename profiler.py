@@ -0,0 +1,354 @@
+"""
+Profilers for the GameBoy emulator cpu.
+
+OpcodeProfiler counts executions, cycles and wall time per opcode and per CB
+opcode.
+It works by swapping the cpu's dispatch tables for tables of counting
+wrappers while enabled, so the normal dispatch path pays nothing when it is
+not in use.
+
+HotspotSampler samples the program counter, with the active ROM bank, every
+N cycles to find the hottest loops.
+"""
+__author__ = 'Clayton Powell'
+import array
+import time
+import disasm
+import opcodes
+
+
+def mnemonic(op, cb=False):
+    """
+    Mnemonic of an opcode, from the shared opcode table.
+
+    Parameters
+    ----------
+    op : int
+        opcode, or the byte after 0xCB for CB prefixed opcodes
+    cb : bool
+        True for CB prefixed opcodes
+
+    Returns
+    -------
+    String
+        mnemonic with operand placeholders, 'ILLEGAL' for illegal opcodes
+    """
+    entry = (opcodes.CB_TABLE if cb else opcodes.TABLE)[op]
+    return entry.mnemonic or 'ILLEGAL'
+
+
+class OpcodeProfiler(object):
+    """
+    OpcodeProfiler class that counts and times every executed opcode.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to profile
+    """
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.counts = [0] * 256
+        self.cycles = [0] * 256
+        self.times = [0.0] * 256
+        self.cb_counts = [0] * 256
+        self.cb_cycles = [0] * 256
+        self.cb_times = [0.0] * 256
+        self._opcodes = None
+        self._ext_opcodes = None
+
+    @property
+    def enabled(self):
+        return self._opcodes is not None
+
+    def _wrap(self, handler, op, counts, cycle_counts, times):
+        clock = time.perf_counter
+
+        def counting():
+            start = clock()
+            cycles = handler()
+            times[op] += clock() - start
+            counts[op] += 1
+            cycle_counts[op] += cycles
+            return cycles
+        return counting
+
+    def enable(self):
+        """
+        Swaps the counting dispatch tables into the cpu.
+        """
+        if self.enabled:
+            return
+        self._opcodes = self.cpu.opcodes
+        self._ext_opcodes = self.cpu.registers.ext_opcodes
+        self.cpu.opcodes = dict(
+            (op, self._wrap(fn, op, self.counts, self.cycles, self.times))
+            for op, fn in self._opcodes.items())
+        self.cpu.registers.ext_opcodes = dict(
+            (op, self._wrap(fn, op, self.cb_counts, self.cb_cycles,
+                            self.cb_times))
+            for op, fn in self._ext_opcodes.items())
+
+    def disable(self):
+        """
+        Puts the original dispatch tables back. Counts are kept.
+        """
+        if not self.enabled:
+            return
+        self.cpu.opcodes = self._opcodes
+        self.cpu.registers.ext_opcodes = self._ext_opcodes
+        self._opcodes = None
+        self._ext_opcodes = None
+
+    def reset(self):
+        """
+        Clears all counts, cycles and times.
+        """
+        for table in (self.counts, self.cycles, self.times,
+                      self.cb_counts, self.cb_cycles, self.cb_times):
+            table[:] = [0] * 256
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def rows(self):
+        """
+        Per opcode results, most total time first.
+
+        Returns
+        -------
+        list of tuple
+            (name, mnemonic, count, cycles, total seconds, mean seconds) for
+            every opcode executed at least once. Cycles and time for 0xCB
+            include those of the CB opcode it ran.
+        """
+        rows = []
+        for prefix, counts, cycles, times, cb in (
+                ('', self.counts, self.cycles, self.times, False),
+                ('cb ', self.cb_counts, self.cb_cycles, self.cb_times, True)):
+            for op in range(256):
+                if counts[op]:
+                    rows.append(('%s%02x' % (prefix, op), mnemonic(op, cb),
+                                 counts[op], cycles[op], times[op],
+                                 times[op] / counts[op]))
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows
+
+    def report(self, limit=None):
+        """
+        Formats the results as a text table.
+
+        Parameters
+        ----------
+        limit : int
+            only include this many of the most expensive opcodes
+
+        Returns
+        -------
+        String
+            report with one line per opcode
+        """
+        rows = self.rows()
+        total = sum(row[4] for row in rows if not row[0].startswith('cb')) or 1
+        lines = ['%-6s %-20s %12s %12s %10s %6s %9s' %
+                 ('op', 'mnemonic', 'count', 'cycles', 'total ms', '%',
+                  'mean ns')]
+        for name, text, count, cycles, seconds, mean in rows[:limit]:
+            lines.append('%-6s %-20s %12d %12d %10.2f %6.2f %9.0f' %
+                         (name, text[:20], count, cycles, seconds * 1e3,
+                          100 * seconds / total, mean * 1e9))
+        return '\n'.join(lines)
+
+
+class HotspotSampler(object):
+    """
+    HotspotSampler class that samples the program counter every `interval`
+    cycles into a histogram indexed by ROM bank and address.
+
+    While enabled the cpu's cycle method is shadowed by a sampling wrapper,
+    which only does a subtraction per instruction until a sample is due.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to sample
+    interval : int
+        cycles between samples
+    """
+
+    def __init__(self, cpu, interval=1024):
+        self.cpu = cpu
+        self.interval = interval
+        self.rom_size = 0
+        self.samples = array.array('L')
+        self._resize()
+        self._wrapper = None
+        self._stop = None
+        self.enabled = False
+
+    def _resize(self):
+        """
+        Sizes the histogram for the ROM currently loaded, keeping the samples
+        taken so far. Every ROM bank, then 0x8000-0xffff for code running out
+        of RAM.
+        """
+        rom_size = max(len(self.cpu.mmu.rom), 0x8000)
+        if rom_size == self.rom_size:
+            return
+        samples = array.array('L', bytes(
+            array.array('L').itemsize * (rom_size + 0x8000)))
+        if self.samples:
+            kept = min(rom_size, self.rom_size)
+            samples[:kept] = self.samples[:kept]
+            samples[rom_size:] = self.samples[self.rom_size:]
+        self.rom_size = rom_size
+        self.samples = samples
+
+    def _index(self, pc, bank):
+        if pc < 0x4000:
+            return pc
+        if pc < 0x8000:
+            return (bank << 14) | (pc & 0x3fff)
+        return self.rom_size + (pc & 0x7fff)
+
+    def _location(self, index):
+        """
+        (bank, address) of a histogram index, bank is None outside ROM.
+        """
+        if index >= self.rom_size:
+            return None, 0x8000 + index - self.rom_size
+        if index < 0x4000:
+            return 0, index
+        return index >> 14, 0x4000 | (index & 0x3fff)
+
+    def enable(self):
+        """
+        Shadows the cpu cycle method with the sampling wrapper.
+        """
+        if self.enabled:
+            return
+        # another wrapper may already shadow cycle, put it back on disable
+        self._shadowed = self.cpu.__dict__.get('cycle')
+        self._resize()
+        cycle = self.cpu.cycle
+        registers = self.cpu.registers
+        mmu = self.cpu.mmu
+        index = self._index
+        interval = self.interval
+        countdown = interval
+
+        def sampled_cycle():
+            nonlocal countdown
+            pc = registers.pc
+            cycles = cycle()
+            countdown -= cycles
+            if countdown <= 0:
+                countdown += interval
+                if max(len(mmu.rom), 0x8000) != self.rom_size:
+                    # another ROM was loaded since enable
+                    self._resize()
+                self.samples[index(pc, mmu.rom_bank)] += 1
+            return cycles
+
+        def stop():
+            nonlocal countdown
+            countdown = float('inf')
+        self._stop = stop
+        self.cpu.cycle = self._wrapper = sampled_cycle
+        self.enabled = True
+
+    def disable(self):
+        """
+        Removes the sampling wrapper. Samples are kept.
+
+        If another wrapper has shadowed it since, that one is left in place
+        and the sampling wrapper it calls stops taking samples.
+        """
+        if not self.enabled:
+            return
+        if self.cpu.__dict__.get('cycle') is not self._wrapper:
+            self._stop()
+        elif self._shadowed is None:
+            del self.cpu.cycle
+        else:
+            self.cpu.cycle = self._shadowed
+        self._wrapper = None
+        self._stop = None
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def hotspots(self, granularity=16, limit=10):
+        """
+        Hottest address ranges.
+
+        Parameters
+        ----------
+        granularity : int
+            size in bytes of the ranges samples are grouped into
+        limit : int
+            number of ranges to return
+
+        Returns
+        -------
+        list of tuple
+            (bank, start address, samples, [(address, samples), ...]) for the
+            hottest ranges, with the sampled addresses inside each range
+        """
+        ranges = {}
+        for i, count in enumerate(self.samples):
+            if count:
+                ranges.setdefault(i // granularity, []).append((i, count))
+        hottest = sorted(ranges.values(),
+                         key=lambda hits: sum(c for _, c in hits),
+                         reverse=True)[:limit]
+        result = []
+        for hits in hottest:
+            bank, start = self._location(hits[0][0] - hits[0][0] % granularity)
+            result.append((bank, start, sum(c for _, c in hits),
+                           [(self._location(i)[1], c) for i, c in hits]))
+        return result
+
+    def report(self, granularity=16, limit=10):
+        """
+        Formats the hottest ranges with the instruction at every sampled
+        address.
+
+        Parameters
+        ----------
+        granularity : int
+            size in bytes of the ranges samples are grouped into
+        limit : int
+            number of ranges to include
+
+        Returns
+        -------
+        String
+            text report
+        """
+        total = sum(self.samples) or 1
+        lines = []
+        disassembler = disasm.Disassembler(self.cpu.mmu.rom)
+        for bank, start, count, hits in self.hotspots(granularity, limit):
+            where = '%02x' % bank if bank is not None else 'ram'
+            lines.append('%s:%04x-%04x %8d samples %6.2f%%' %
+                         (where, start, start + granularity - 1, count,
+                          100.0 * count / total))
+            for addr, hit in hits:
+                if bank is None:
+                    instruction = disasm.decode(self.cpu.mmu.read_byte, addr)
+                else:
+                    instruction = disassembler.instruction(addr, bank)
+                lines.append('    %04x %8d  %-8s  %s' %
+                             (addr, hit, instruction.hex, instruction.text))
+        return '\n'.join(lines)
@@ -20,8 +20,11 @@ class Registers(object):
         self.carry_flag = 1
 
     def jump(self, value):
-        self.pc = Register(value)
+        self.pc = Register(value, limit=0xffff)
 
     def flags(self):
-        # TODO: Need to return flags 'register'
-        pass
\ No newline at end of file
+        """
+        Packs the separate flags into the F register layout (ZNHC0000).
+        """
+        return ((self.zero_flag << 7) | (self.sub_flag << 6) |
+                (self.hc_flag << 5) | (self.carry_flag << 4))
@@ -0,0 +1,88 @@
+"""
+Event scheduler driven by the global cycle counter.
+
+The core adds the cycles of every instruction to Scheduler.now and nothing
+else counts cycles. Hardware state that only moves with time, such as the
+gpu's LY register and mode, is derived from now when it is read, and work
+that has to happen at a given cycle (drawing a line, the start of v-blank)
+is scheduled as an event. Stepping the hardware is then one add and one
+compare per instruction, events run once now has reached them.
+"""
+__author__ = 'Clayton Powell'
+import heapq
+
+# deadline while nothing is scheduled
+NEVER = 1 << 62
+
+
+class Scheduler(object):
+    """
+    Scheduler class that keeps the cycle counter and the pending events.
+    """
+
+    def __init__(self):
+        self.now = 0
+        self.deadline = NEVER
+        self.events = []
+        self._sequence = 0
+
+    def schedule(self, when, callback):
+        """
+        Schedules a callback for a cycle.
+
+        Parameters
+        ----------
+        when : int
+            cycle the event is due at, can be in the past to run it as soon
+            as possible
+        callback : function
+            called with the cycle the event was due at, which can be before
+            now when an instruction overshot it
+
+        Returns
+        -------
+        list
+            the event, to be passed to cancel
+        """
+        # events due on the same cycle run in the order they were scheduled
+        self._sequence += 1
+        event = [when, self._sequence, callback]
+        heapq.heappush(self.events, event)
+        if when < self.deadline:
+            self.deadline = when
+        return event
+
+    def cancel(self, event):
+        """
+        Cancels an event returned by schedule. Cancelling an event that
+        already ran does nothing.
+        """
+        if event is not None:
+            event[2] = None
+
+    def run(self):
+        """
+        Runs every event that is due, including events scheduled by the
+        callbacks for cycles already passed.
+        """
+        events = self.events
+        while events and events[0][0] <= self.now:
+            when, _, callback = heapq.heappop(events)
+            if callback is not None:
+                callback(when)
+        while events and events[0][2] is None:
+            heapq.heappop(events)
+        self.deadline = events[0][0] if events else NEVER
+
+    def advance(self, cycles):
+        """
+        Moves the counter forward and runs the events that became due.
+
+        Parameters
+        ----------
+        cycles : int
+            cycles passed
+        """
+        self.now += cycles
+        if self.now >= self.deadline:
+            self.run()
@@ -0,0 +1,118 @@
+"""
+Serial port for the GameBoy emulator, SB and SC (0xFF01/0xFF02).
+
+There is never a link cable partner. A transfer on the internal clock
+completes as soon as it is started: the byte in SB is appended to the
+capture buffer, 0xFF is shifted in, the start bit is cleared and the serial
+interrupt is requested. Transfers waiting for an external clock never
+complete.
+
+Test ROMs report their results over the serial port, so the capture buffer
+can be watched by stop conditions. A stop condition is a function taking
+the captured bytes and returning a result, or None to keep running; it is
+checked after every byte, and the first result is kept in Serial.result.
+Nothing is raised from inside the write, the instruction that sent the byte
+completes and its cycles are counted; the runner checks result between
+instructions, as conformance.run does.
+"""
+__author__ = 'Clayton Powell'
+import interrupts
+
+
+def contains(text, result):
+    """
+    Stop condition matching once the output contains text.
+
+    Parameters
+    ----------
+    text : bytes or String
+        text to look for
+    result : String
+        result to stop with
+
+    Returns
+    -------
+    function
+        stop condition
+    """
+    if isinstance(text, str):
+        text = text.encode('latin-1')
+
+    def condition(output):
+        # checked after every byte, so only a match ending here is new
+        return result if output.endswith(text) else None
+    condition.__doc__ = 'output contains %r' % text
+    return condition
+
+
+# blargg's test ROMs print the test name followed by Passed or Failed
+BLARGG = (contains('Passed', 'passed'), contains('Failed', 'failed'))
+# mooneye's test ROMs send the Fibonacci numbers on success, 0x42s on failure
+MOONEYE = (contains(bytes((3, 5, 8, 13, 21, 34)), 'passed'),
+           contains(bytes((0x42,) * 6), 'failed'))
+
+
+class Serial(object):
+    """
+    Serial class that provides SB and SC to the mmu and captures output.
+
+    Parameters
+    ----------
+    mmu : mmu.MMU
+        mmu the registers are mapped into
+    irq : interrupts.Interrupts
+        interrupt controller the serial interrupt is requested from, None
+        for no interrupt
+    """
+
+    def __init__(self, mmu, irq=None):
+        self.irq = irq
+        self.output = bytearray()
+        self.conditions = []
+        self.result = None
+        self.sb = 0
+        self.sc = 0
+        mmu.io_read[0xff01] = self.read_sb
+        mmu.io_write[0xff01] = self.write_sb
+        mmu.io_read[0xff02] = self.read_sc
+        mmu.io_write[0xff02] = self.write_sc
+
+    def reset(self):
+        """
+        Clears the registers, the captured output and the result.
+        """
+        self.output = bytearray()
+        self.result = None
+        self.sb = 0
+        self.sc = 0
+
+    @property
+    def text(self):
+        return self.output.decode('latin-1')
+
+    def read_sb(self):
+        return self.sb
+
+    def write_sb(self, value):
+        self.sb = value
+
+    def read_sc(self):
+        return 0x7e | self.sc
+
+    def write_sc(self, value):
+        self.sc = value & 0x81
+        if self.sc != 0x81:
+            return
+        # internal clock, the transfer completes at once
+        self.output.append(self.sb)
+        self.sb = 0xff
+        self.sc = 0x01
+        if self.irq is not None:
+            self.irq.request(interrupts.SERIAL)
+        if self.result is not None:
+            return
+        for condition in self.conditions:
+            result = condition(self.output)
+            if result is not None:
+                self.result = result
+                return
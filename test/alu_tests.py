@@ -0,0 +1,90 @@
+import unittest
+import alu
+from core import Core
+
+
+class TestTables(unittest.TestCase):
+    def test_add(self):
+        i = alu.index(0x3a, 0xc6)
+        self.assertEqual((0x00, alu.Z | alu.H | alu.C), (alu.ADD[i], alu.ADD_FLAGS[i]))
+        i = alu.index(0x0f, 0x00, 1)
+        self.assertEqual((0x10, alu.H), (alu.ADD[i], alu.ADD_FLAGS[i]))
+
+    def test_sub(self):
+        i = alu.index(0x3e, 0x3e)
+        self.assertEqual((0x00, alu.Z | alu.N), (alu.SUB[i], alu.SUB_FLAGS[i]))
+        i = alu.index(0x10, 0x00, 1)
+        self.assertEqual((0x0f, alu.N | alu.H), (alu.SUB[i], alu.SUB_FLAGS[i]))
+        i = alu.index(0x00, 0xff, 1)
+        self.assertEqual((0x00, alu.Z | alu.N | alu.H | alu.C),
+                         (alu.SUB[i], alu.SUB_FLAGS[i]))
+
+    def test_logic(self):
+        i = alu.index(0xf0, 0x0f)
+        self.assertEqual((0x00, alu.Z | alu.H), (alu.AND[i], alu.AND_FLAGS[i]))
+        self.assertEqual((0xff, 0), (alu.OR[i], alu.OR_FLAGS[i]))
+        self.assertEqual((0xff, 0), (alu.XOR[i], alu.XOR_FLAGS[i]))
+        i = alu.index(0x5a, 0x5a)
+        self.assertEqual((0x5a, alu.H), (alu.AND[i], alu.AND_FLAGS[i]))
+        self.assertEqual((0x00, alu.Z), (alu.XOR[i], alu.XOR_FLAGS[i]))
+
+    def test_inc_dec(self):
+        self.assertEqual((0x00, alu.Z | alu.H), (alu.INC[0xff], alu.INC_FLAGS[0xff]))
+        self.assertEqual((0x0f, alu.N | alu.H), (alu.DEC[0x10], alu.DEC_FLAGS[0x10]))
+
+    def test_daa(self):
+        for x in range(100):
+            for y in range(100):
+                a = int(str(x), 16)
+                b = int(str(y), 16)
+                for table, flags, sub, expected in (
+                        (alu.ADD, alu.ADD_FLAGS, 0, (x + y) % 100),
+                        (alu.SUB, alu.SUB_FLAGS, 1, (x - y) % 100)):
+                    i = alu.index(a, b)
+                    f = flags[i]
+                    nhc = (sub << 2) | ((f >> 5) & 1) << 1 | ((f >> 4) & 1)
+                    result = alu.DAA[(nhc << 8) | table[i]]
+                    self.assertEqual(int(str(expected), 16), result)
+                    carry = alu.DAA_FLAGS[(nhc << 8) | table[i]] & alu.C
+                    self.assertEqual(x + y > 99 if not sub else x < y, bool(carry))
+
+
+class TestCpuAlu(unittest.TestCase):
+    def test_adc_half_carry(self):
+        cpu = Core().cpu
+        cpu.registers.a = 0x01
+        cpu.registers.carry_flag = 1
+        cpu._add(0x0f, cpu.registers.carry_flag)
+        self.assertEqual(0x11, cpu.registers.a)
+        self.assertEqual((0, 0, 1, 0), (cpu.registers.zero_flag, cpu.registers.sub_flag,
+                                        cpu.registers.hc_flag, cpu.registers.carry_flag))
+
+    def test_logic(self):
+        cpu = Core().cpu
+        registers = cpu.registers
+        registers.carry_flag = 1
+        registers.a = 0x3c
+        cpu._and(0xc3)
+        self.assertEqual(0x00, registers.a)
+        self.assertEqual((1, 0, 1, 0), (registers.zero_flag, registers.sub_flag,
+                                        registers.hc_flag, registers.carry_flag))
+        cpu._or(0x81)
+        self.assertEqual(0x81, registers.a)
+        self.assertEqual((0, 0, 0, 0), (registers.zero_flag, registers.sub_flag,
+                                        registers.hc_flag, registers.carry_flag))
+        cpu._xor(0x81)
+        self.assertEqual(0x00, registers.a)
+        self.assertEqual((1, 0, 0, 0), (registers.zero_flag, registers.sub_flag,
+                                        registers.hc_flag, registers.carry_flag))
+
+    def test_cp(self):
+        cpu = Core().cpu
+        cpu.registers.a = 0x10
+        cpu._cp(0x20)
+        self.assertEqual(0x10, cpu.registers.a)
+        self.assertEqual((0, 1, 0, 1), (cpu.registers.zero_flag, cpu.registers.sub_flag,
+                                        cpu.registers.hc_flag, cpu.registers.carry_flag))
+
+
+if __name__ == '__main__':
+    unittest.main()
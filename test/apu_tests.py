@@ -0,0 +1,128 @@
+import unittest
+import numpy as np
+import apu
+from core import Core
+
+
+class TestAPU(unittest.TestCase):
+    def setUp(self):
+        self.core = Core(audio=True)
+        self.mmu = self.core.mmu
+        self.apu = self.core.apu
+
+    def at(self, cycles):
+        self.core.scheduler.advance(cycles - self.core.cycles)
+
+    def square(self, frequency, nr51=0x11):
+        self.mmu.write_byte(0xff25, nr51)
+        self.mmu.write_byte(0xff11, 0x80)  # 50% duty
+        self.mmu.write_byte(0xff12, 0xf0)  # volume 15, no envelope
+        self.mmu.write_byte(0xff13, frequency & 0xff)
+        self.mmu.write_byte(0xff14, 0x80 | (frequency >> 8))
+
+    def test_without_audio(self):
+        core = Core()
+        self.assertIsNone(core.apu)
+        core.mmu.write_byte(0xff12, 0xf0)
+        self.assertEqual(0xf0, core.mmu.read_byte(0xff12))
+
+    def test_read_masks(self):
+        self.mmu.write_byte(0xff11, 0x80)
+        self.assertEqual(0xbf, self.mmu.read_byte(0xff11))
+        self.mmu.write_byte(0xff30, 0x12)
+        self.assertEqual(0x12, self.mmu.read_byte(0xff30))
+        self.assertEqual(0xf0, self.mmu.read_byte(0xff26))
+
+    def test_square_frequency(self):
+        # (2048 - 1024) * 4 cycles per step, 8 steps: 128 Hz
+        self.square(1024)
+        self.assertEqual(0xf1, self.mmu.read_byte(0xff26))
+        self.at(apu.CLOCK // 4)
+        samples = self.apu.pull()
+        self.assertEqual((apu.RATE // 4, 2), samples.shape)
+        self.assertEqual(np.float32, samples.dtype)
+        left = samples[:, 0]
+        rises = np.count_nonzero((left[1:] < 0) & (left[:-1] > 0))
+        self.assertEqual(128 // 4, rises)
+        self.assertTrue(np.all(samples[:, 1] == left))
+        self.assertAlmostEqual(1.0 / 4, float(left.max()), places=5)
+        self.assertEqual(0, len(self.apu.pull()))
+
+    def test_panning(self):
+        self.square(1024, nr51=0x10)
+        self.at(40000)
+        samples = self.apu.pull()
+        self.assertTrue(np.any(samples[:, 0]))
+        self.assertFalse(np.any(samples[:, 1]))
+
+    def test_write_timestamps(self):
+        self.at(1000)
+        self.square(1024)
+        self.at(5000)
+        self.mmu.write_byte(0xff12, 0x00)  # DAC off
+        self.at(9000)
+        samples = self.apu.pull()[:, 0]
+        self.assertEqual(9000 // 4, len(samples))
+        self.assertFalse(np.any(samples[:1000 // 4]))
+        self.assertTrue(np.all(samples[1000 // 4:5000 // 4]))
+        self.assertFalse(np.any(samples[5000 // 4:]))
+
+    def test_length_counter(self):
+        self.mmu.write_byte(0xff11, 0x3e)  # 2 steps of length left
+        self.mmu.write_byte(0xff12, 0xf0)
+        self.mmu.write_byte(0xff14, 0xc0)
+        self.at(apu.SEQUENCER_CYCLES * 2)
+        self.assertEqual(0xf1, self.mmu.read_byte(0xff26))
+        self.at(apu.SEQUENCER_CYCLES * 4)
+        self.assertEqual(0xf0, self.mmu.read_byte(0xff26))
+
+    def test_envelope(self):
+        self.mmu.write_byte(0xff12, 0xf1)  # fade out a step every 1/64 s
+        self.mmu.write_byte(0xff14, 0x80)
+        self.at(apu.SEQUENCER_CYCLES * 8 * 3)
+        self.apu.pull()
+        self.assertEqual(12, self.apu.channels[0].volume)
+
+    def test_wave(self):
+        for i in range(16):
+            self.mmu.write_byte(0xff30 + i, 0xf0)
+        self.mmu.write_byte(0xff1a, 0x80)
+        self.mmu.write_byte(0xff1c, 0x20)
+        self.mmu.write_byte(0xff1d, 0x00)
+        self.mmu.write_byte(0xff1e, 0x84)
+        self.at(64 * 1024)
+        left = self.apu.pull()[:, 0]
+        # each wave sample is held for (2048 - 1024) * 2 cycles, 512 samples
+        self.assertTrue(np.all(left[:512] < 0))
+        self.assertTrue(np.all(left[512:1024] > 0))
+
+    def test_noise(self):
+        self.mmu.write_byte(0xff21, 0xf0)
+        self.mmu.write_byte(0xff22, 0x00)
+        self.mmu.write_byte(0xff23, 0x80)
+        self.at(70224)
+        left = self.apu.pull()[:, 0]
+        self.assertGreater(np.count_nonzero(left > 0), 1000)
+        self.assertGreater(np.count_nonzero(left < 0), 1000)
+
+    def test_power_off(self):
+        self.square(1024)
+        self.mmu.write_byte(0xff30, 0x77)
+        self.mmu.write_byte(0xff26, 0x00)
+        self.assertEqual(0x70, self.mmu.read_byte(0xff26))
+        self.assertEqual(0x3f, self.mmu.read_byte(0xff11))
+        self.assertEqual(0x00, self.mmu.read_byte(0xff12))
+        self.mmu.write_byte(0xff12, 0xf0)
+        self.assertEqual(0x00, self.mmu.read_byte(0xff12))
+        self.assertEqual(0x77, self.mmu.read_byte(0xff30))
+        self.at(1000)
+        self.assertFalse(np.any(self.apu.pull()))
+
+    def test_channel_is_abstract(self):
+        self.assertRaises(TypeError, apu.Channel)
+        self.assertRaises(TypeError, apu.Envelope)
+        self.assertEqual(2048 * 4, apu.Square().period)
+
+
+if __name__ == '__main__':
+    unittest.main()
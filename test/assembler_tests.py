@@ -0,0 +1,78 @@
+import unittest
+import opcodes
+from assembler import assemble, RomBuilder
+
+
+class TestAssembler(unittest.TestCase):
+    def test_every_opcode(self):
+        immediates = (('(a16)', '($1234)'), ('(a8)', '($12)'), ('d16', '$1234'),
+                      ('a16', '$1234'), ('d8', '$12'), ('SP+r8', 'SP+5'),
+                      ('r8', '5'))
+        for op, mnemonic in enumerate(opcodes.OPCODES):
+            if mnemonic is None or mnemonic == 'PREFIX CB':
+                continue
+            for placeholder, value in immediates:
+                mnemonic = mnemonic.replace(placeholder, value)
+            code = assemble([mnemonic.lower()], origin=0)
+            self.assertEqual(op, code[0], mnemonic)
+            self.assertEqual(opcodes.LENGTHS[op], len(code), mnemonic)
+        for op, mnemonic in enumerate(opcodes.CB_OPCODES):
+            self.assertEqual(bytes([0xcb, op]), assemble([mnemonic]))
+
+    def test_labels_and_relative_jumps(self):
+        code = assemble(['start: ld b, 10',
+                         'loop:  dec b',
+                         '       jr nz, loop  ; back one instruction',
+                         '       jp start',
+                         '       dw loop + 1'], origin=0x150)
+        self.assertEqual(bytes([0x06, 0x0a, 0x05, 0x20, 0xfd,
+                                0xc3, 0x50, 0x01, 0x53, 0x01]), code)
+
+    def test_aliases_and_number_formats(self):
+        code = assemble(['ld a, (hli)', 'ldh a, ($ff44)', 'jp (hl)',
+                         'rst 38h', 'ld c, %101', 'ld d, 0x10'])
+        self.assertEqual(bytes([0x2a, 0xf0, 0x44, 0xe9, 0xff,
+                                0x0e, 0x05, 0x16, 0x10]), code)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, assemble, ['ld b, nowhere'])
+        self.assertRaises(ValueError, assemble, ['frob a'])
+        self.assertRaises(ValueError, assemble, ['ld b, 300'])
+        self.assertRaises(ValueError, assemble, ['jr far', 'ds 200', 'far:'])
+
+
+class TestRomBuilder(unittest.TestCase):
+    def test_header(self):
+        rom = RomBuilder('TEST', banks=4).code('main: jr main').build()
+        self.assertEqual(0x10000, len(rom))
+        self.assertEqual(bytes([0x00, 0xc3, 0x50, 0x01]), rom[0x100:0x104])
+        self.assertEqual(b'TEST', rom[0x134:0x138])
+        self.assertEqual(0x01, rom[0x147])  # MBC1
+        self.assertEqual(0x01, rom[0x148])  # 64KB
+        checksum = 0
+        for byte in rom[0x134:0x14d]:
+            checksum = (checksum - byte - 1) & 0xff
+        self.assertEqual(checksum, rom[0x14d])
+        total = (sum(rom) - rom[0x14e] - rom[0x14f]) & 0xffff
+        self.assertEqual(total, (rom[0x14e] << 8) | rom[0x14f])
+
+    def test_banks(self):
+        rom = (RomBuilder(banks=4).code('main: jr main')
+               .code('data: db 1, 2', bank=2).fill(3, 0xff).build())
+        self.assertEqual(bytes([1, 2, 0]), rom[0x8000:0x8003])
+        self.assertEqual(0xff, rom[0xc000])
+
+    def test_build_twice(self):
+        source = ['main: ld a, 1', 'jr main']
+        builder = RomBuilder().code(source).code('data: db 7', bank=1)
+        first = builder.build()
+        self.assertEqual(first, builder.build())
+        self.assertEqual(bytes.fromhex('3e0118fc00'), first[0x150:0x155])
+        self.assertEqual({'main': 0x150, 'data': 0x4000}, builder.labels)
+        builder.code('text: db 1, 2\ndb 3', origin=0x160)
+        self.assertEqual(bytes([1, 2, 3, 0]), builder.build()[0x160:0x164])
+        self.assertEqual(bytes([1, 2, 3, 0]), builder.build()[0x160:0x164])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import threading
+import time
+import unittest
+import numpy as np
+import apu
+from audio import AudioOutput, Resampler, RingBuffer
+from core import Core
+
+
+def tone(frequency, seconds, rate=apu.RATE):
+    t = np.arange(int(rate * seconds)) / float(rate)
+    wave = np.sin(2 * np.pi * frequency * t).astype(np.float32) * 0.5
+    return np.column_stack((wave, wave))
+
+
+class TestResampler(unittest.TestCase):
+    def test_passes_audible_tone(self):
+        resampler = Resampler(rate_out=48000)
+        out = resampler.process(tone(1000, 0.5))
+        self.assertAlmostEqual(24000, len(out), delta=40)
+        steady = out[4800:, 0]
+        self.assertAlmostEqual(0.5, float(np.abs(steady).max()), delta=0.02)
+        # one rising zero crossing per period
+        rises = np.count_nonzero((steady[1:] > 0) & (steady[:-1] <= 0))
+        self.assertAlmostEqual(1000 * len(steady) / 48000.0, rises, delta=2)
+
+    def test_removes_ultrasonic_tone(self):
+        resampler = Resampler(rate_out=44100)
+        out = resampler.process(tone(40000, 0.2))
+        self.assertLess(float(np.abs(out[2000:]).max()), 0.02)
+
+    def test_attenuates_above_nyquist(self):
+        # tones above 24 kHz that a 16 sample mean would fold to 15.5, 8.5
+        # and 2.1 kHz, at least 60 dB down
+        for frequency in (26000, 50000, 57000, 63400):
+            out = Resampler(rate_out=48000).process(tone(frequency, 0.25))
+            rms = float(np.sqrt(np.mean(out[2400:] ** 2)))
+            self.assertLess(20 * np.log10(rms / (0.5 / np.sqrt(2))), -60,
+                            frequency)
+
+    def test_square_wave_has_no_aliases(self):
+        # 100 sample period, 10486 Hz: decimating to 65536 Hz would fold
+        # its harmonics above 32 kHz onto frequencies of their own
+        square = np.where(np.arange(apu.RATE) % 100 < 50, 0.5, -0.5)
+        out = Resampler(rate_out=48000).process(
+            np.column_stack((square, square)).astype(np.float32))[4800:, 0]
+        spectrum = np.abs(np.fft.rfft(out * np.kaiser(len(out), 20))) ** 2
+        frequencies = np.fft.rfftfreq(len(out), 1 / 48000.0)
+        fundamental = apu.RATE / 100.0
+        power = spectrum[np.abs(frequencies - fundamental) < 30].sum()
+        for harmonic in range(3, 16, 2):
+            folded = harmonic * fundamental % 65536
+            folded = min(folded, 65536 - folded)
+            if 100 < folded < 23000:
+                alias = spectrum[np.abs(frequencies - folded) < 30].sum()
+                self.assertLess(10 * np.log10(alias / power), -80, harmonic)
+
+    def test_removes_dc(self):
+        resampler = Resampler()
+        for _ in range(100):
+            out = resampler.process(np.full((17556, 2), 0.75, dtype=np.float32))
+        self.assertLess(float(np.abs(out).max()), 0.01)
+
+    def test_chunks_match_one_block(self):
+        signal = tone(440, 0.1) + tone(3000, 0.1)
+        whole = Resampler().process(signal)
+        resampler = Resampler()
+        parts = [resampler.process(signal[i:i + 1237])
+                 for i in range(0, len(signal), 1237)]
+        parts = np.concatenate(parts)
+        n = min(len(whole), len(parts))
+        self.assertGreater(n, len(whole) - 3)
+        # the DC tracker updates per block, everything else is identical
+        self.assertLess(float(np.abs(whole[:n] - parts[:n]).max()), 0.01)
+
+    def test_adjust_changes_count(self):
+        slow = Resampler()
+        slow.adjust = 0.005
+        fast = Resampler()
+        fast.adjust = -0.005
+        signal = tone(440, 1.0)
+        self.assertLess(len(slow.process(signal)), 47800)
+        self.assertGreater(len(fast.process(signal)), 48200)
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wraps(self):
+        ring = RingBuffer(8)
+        frames = np.arange(20, dtype=np.float32).reshape(10, 2)
+        self.assertEqual(6, ring.write(frames[:6]))
+        self.assertTrue(np.array_equal(frames[:4], ring.read(4)))
+        self.assertEqual(4, ring.write(frames[6:]))
+        self.assertEqual(6, ring.available)
+        self.assertTrue(np.array_equal(frames[4:], ring.read(10)))
+
+    def test_overflow_and_underrun(self):
+        ring = RingBuffer(4)
+        frames = np.ones((6, 2), dtype=np.float32)
+        self.assertEqual(4, ring.write(frames))
+        self.assertEqual(0, ring.free)
+        out = np.full((6, 2), 9, dtype=np.float32)
+        self.assertEqual(4, ring.read_into(out))
+        self.assertTrue(np.array_equal(out[:4], frames[:4]))
+        self.assertFalse(np.any(out[4:]))
+
+    def test_threads(self):
+        ring = RingBuffer(64)
+        data = np.arange(20000, dtype=np.float32).repeat(2).reshape(-1, 2)
+        received = []
+
+        def consume():
+            out = np.zeros((7, 2), dtype=np.float32)
+            while sum(len(r) for r in received) < len(data):
+                count = ring.read_into(out)
+                received.append(out[:count].copy())
+                time.sleep(0)
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        sent = 0
+        while sent < len(data):
+            sent += ring.write(data[sent:sent + 13])
+            time.sleep(0)
+        consumer.join(10)
+        self.assertTrue(np.array_equal(data, np.concatenate(received)))
+
+
+class TestAudioOutput(unittest.TestCase):
+    def test_rate_control(self):
+        core = Core(audio=True)
+        output = AudioOutput(core.apu, rate=48000, latency=0.05)
+        core.mmu.write_byte(0xff12, 0xf0)
+        core.mmu.write_byte(0xff14, 0x86)
+        core.scheduler.advance(70224)
+        self.assertGreater(output.update(), 700)
+        self.assertLess(output.resampler.adjust, 0)
+        output.ring.write(np.zeros((output.target * 2, 2), dtype=np.float32))
+        core.scheduler.advance(70224)
+        output.update()
+        self.assertAlmostEqual(output.max_adjust, output.resampler.adjust)
+        self.assertGreater(output.dropped, 700)
+
+
+if __name__ == '__main__':
+    unittest.main()
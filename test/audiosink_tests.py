@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+import numpy as np
+from assembler import RomBuilder
+from audiosink import AudioSink
+from core import Core
+from movie import Movie, replay
+
+
+class TestAudioSink(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def samples(self, count):
+        t = np.arange(count) / 48000.0
+        left = np.sin(2 * np.pi * 440 * t) * 0.5
+        return np.column_stack((left, -left)).astype(np.float32)
+
+    def test_wav(self):
+        path = os.path.join(self.dir, 'out.wav')
+        samples = self.samples(10000)
+        with AudioSink(path, chunk=0.05) as sink:
+            for i in range(0, len(samples), 777):
+                sink.write(samples[i:i + 777])
+        self.assertEqual(10000, sink.frames)
+        with wave.open(path) as f:
+            self.assertEqual((2, 2, 48000, 10000),
+                             (f.getnchannels(), f.getsampwidth(),
+                              f.getframerate(), f.getnframes()))
+            data = np.frombuffer(f.readframes(10000), dtype='<i2').reshape(-1, 2)
+        self.assertTrue(np.array_equal((samples * 32767).astype('<i2'), data))
+
+    def test_raw(self):
+        path = os.path.join(self.dir, 'out.pcm')
+        samples = self.samples(5000)
+        sink = AudioSink(path, chunk=1.0)
+        sink.write(samples)
+        sink.write(np.full((2, 2), 4.0))
+        sink.close()
+        data = np.fromfile(path, dtype='<i2').reshape(-1, 2)
+        self.assertEqual(5002, len(data))
+        self.assertEqual(32767, data[-1, 0])
+
+    def test_update_without_source(self):
+        with AudioSink(os.path.join(self.dir, 'out.pcm')) as sink:
+            self.assertRaises(ValueError, sink.update)
+
+    def test_write_error(self):
+        def fail(data):
+            raise OSError("disk full")
+        path = os.path.join(self.dir, 'out.pcm')
+        sink = AudioSink(path, chunk=0.01)
+        sink._write = fail
+        sink.write(self.samples(1000))
+        self.assertRaises(IOError, sink.close)
+        # inside a with block the exception raised there is the one seen
+        with self.assertRaises(KeyError):
+            with AudioSink(path, chunk=0.01) as sink:
+                sink._write = fail
+                sink.write(self.samples(1000))
+                raise KeyError('stop')
+        self.assertIsNone(sink._thread)
+
+    def test_records_replay(self):
+        rom = RomBuilder().code("""
+            main:   ld a, $f0
+                    ldh ($12), a
+                    ld a, $86
+                    ldh ($14), a
+            done:   jr done
+        """)
+        core = Core(audio=True)
+        core.mmu.rom = list(rom.build())
+        path = os.path.join(self.dir, 'replay.wav')
+        with AudioSink(path, 44100, source=core.apu) as sink:
+            replay(core, Movie(), 30, on_frame=sink.update)
+        with wave.open(path) as f:
+            # 30 frames at about 59.7 frames a second
+            self.assertAlmostEqual(30 * 70224 * 44100 / 4194304.0,
+                                   f.getnframes(), delta=60)
+            data = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+        self.assertGreater(int(np.abs(data).max()), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import batch
+import joypad
+from assembler import RomBuilder
+from movie import Movie
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.loop = self.rom('loop.gb', 'main: jr main')
+        self.passed = self.rom('passed.gb', 'main: ' + '\n'.join(
+            'ld a, %d\nldh ($01), a\nld a, $81\nldh ($02), a' % ord(c)
+            for c in 'Passed') + '\ndone: jr done')
+        # copies JOYP to SB, so the serial output records the input
+        self.echo = self.rom('echo.gb', """
+            main:   ld a, $10
+                    ldh ($00), a
+            loop:   ldh a, ($00)
+                    ldh ($01), a
+                    ld a, $81
+                    ldh ($02), a
+                    jr loop
+        """)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rom(self, name, source):
+        path = os.path.join(self.dir, name)
+        RomBuilder().code(source).save(path)
+        return path
+
+    def test_run_job(self):
+        result = batch.run_job({'rom': self.loop, 'frames': 3})
+        self.assertListEqual(sorted(batch.FIELDS), sorted(result))
+        self.assertEqual(3, result['frames'])
+        self.assertIsNone(result['error'])
+        self.assertGreaterEqual(result['cycles'], 2 * 70224)
+        self.assertEqual(40, len(result['frame_hash']))
+
+    def test_until_result(self):
+        result = batch.run_job({'rom': self.passed, 'frames': 100,
+                                'until_result': True})
+        self.assertEqual('passed', result['result'])
+        self.assertEqual('Passed', result['serial'])
+        self.assertLess(result['cycles'], 70224)
+
+    def test_movie(self):
+        path = os.path.join(self.dir, 'start.gbm')
+        Movie([(1, joypad.START)]).save(path)
+        result = batch.run_job({'rom': self.echo, 'movie': path, 'frames': 2})
+        self.assertIn('\xd7', result['serial'])
+        self.assertEqual('\xdf', result['serial'][0])
+
+    def test_error_reported(self):
+        result = batch.run_job({'rom': os.path.join(self.dir, 'missing.gb')})
+        self.assertIn('FileNotFoundError', result['error'])
+
+    def test_run_batch(self):
+        jobs = [{'rom': self.loop, 'frames': 2},
+                {'rom': self.passed, 'frames': 50, 'until_result': True},
+                {'rom': self.loop, 'frames': 2}]
+        results = batch.run_batch(jobs, workers=2)
+        self.assertListEqual([self.loop, self.passed, self.loop],
+                             [r['rom'] for r in results])
+        self.assertEqual('passed', results[1]['result'])
+        # same rom and frames give the same frame and cycles in any worker
+        self.assertEqual(results[0]['frame_hash'], results[2]['frame_hash'])
+        self.assertEqual(results[0]['cycles'], results[2]['cycles'])
+
+    def test_reports(self):
+        results = [batch.run_job({'rom': self.loop, 'frames': 1})]
+        f = io.StringIO()
+        batch.write_report(results, f, 'json')
+        self.assertEqual(results, json.loads(f.getvalue()))
+        f = io.StringIO()
+        batch.write_report(results, f, 'csv')
+        rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+        self.assertEqual(1, len(rows))
+        self.assertEqual(results[0]['frame_hash'], rows[0]['frame_hash'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from benchmarks import mmu_access, throughput
+from core import Core
+
+
+def result(cycles, instructions):
+    return {'cycles_per_second': cycles,
+            'instructions_per_second': instructions,
+            'frames_per_second': cycles / 70224.0}
+
+
+class TestThroughput(unittest.TestCase):
+    def test_compare_on_cycles(self):
+        baseline = {'alu': result(1e6, 2e5), 'memcopy': result(1e6, 2e5)}
+        # fused runs count fewer instructions for the same cycles
+        fused = {'alu': result(1.2e6, 1e5), 'memcopy': result(0.8e6, 2e5),
+                 'callret': result(1, 1)}
+        regressions = throughput.compare(fused, baseline, 0.1)
+        self.assertEqual(1, len(regressions))
+        self.assertTrue(regressions[0].startswith('memcopy'))
+        self.assertIn('cycles/s', regressions[0])
+        table = throughput.format_results(fused, baseline)
+        self.assertIn('+20.0%', table)
+        self.assertIn('-20.0%', table)
+
+    def test_run_suite(self):
+        results = throughput.run_suite(['alu', 'bank_switch'], frames=1,
+                                       repeat=1, fuse=True)
+        self.assertListEqual(['alu', 'bank_switch'], sorted(results))
+        for run in results.values():
+            self.assertEqual(1, run['frames'])
+            self.assertGreater(run['cycles'], 0)
+            self.assertGreater(run['cycles_per_second'], 0)
+
+
+class TestMMUAccess(unittest.TestCase):
+    def test_io_writes_have_no_handlers(self):
+        emulator = Core(audio=True)
+        addrs = dict(mmu_access.REGIONS)['io']
+        self.assertEqual(64, len(addrs))
+        for addr in addrs:
+            self.assertNotIn(addr, emulator.mmu.io_write)
+            self.assertNotIn(addr + 1, emulator.mmu.io_write)
+
+    def test_ie_checks_drained(self):
+        emulator = Core()
+        scheduler = emulator.scheduler
+        events = len(scheduler.events)
+        mmu_access.time_access(emulator.mmu.write_byte, [0xffff] * 64, True,
+                               rounds=10, repeat=1, between=scheduler.run)
+        self.assertEqual(events, len(scheduler.events))
+
+
+if __name__ == '__main__':
+    unittest.main()
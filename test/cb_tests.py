@@ -0,0 +1,67 @@
+import unittest
+from core import Core
+
+
+class TestCbOpcodes(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.core.mmu.rom = [0] * 0x8000
+        self.registers = self.core.cpu.registers
+
+    def run_cb(self, op, value, carry=0, target='b'):
+        registers = self.registers
+        registers.pc = 0xc000
+        registers.carry_flag = carry
+        self.core.mmu.write_byte(0xc000, 0xcb)
+        self.core.mmu.write_byte(0xc001, op)
+        if target is None:
+            registers.h, registers.l = 0xc1, 0x00
+            self.core.mmu.write_byte(0xc100, value)
+        else:
+            setattr(registers, target, value)
+        self.core.cpu.cycle()
+        self.assertEqual(0xc002, registers.pc)
+        if target is None:
+            return self.core.mmu.read_byte(0xc100)
+        return getattr(registers, target)
+
+    def flags(self):
+        r = self.registers
+        return r.zero_flag, r.sub_flag, r.hc_flag, r.carry_flag
+
+    def test_rotates(self):
+        self.assertEqual(0x0b, self.run_cb(0x00, 0x85))
+        self.assertEqual((0, 0, 0, 1), self.flags())
+        self.assertEqual(0x80, self.run_cb(0x09, 0x01, target='c'))
+        self.assertEqual(1, self.registers.carry_flag)
+        self.assertEqual(0x0b, self.run_cb(0x16, 0x85, carry=1, target=None))
+        self.assertEqual(1, self.registers.carry_flag)
+        self.assertEqual(0x00, self.run_cb(0x1f, 0x01, target='a'))
+        self.assertEqual((1, 0, 0, 1), self.flags())
+
+    def test_shifts(self):
+        self.assertEqual(0x02, self.run_cb(0x20, 0x81))
+        self.assertEqual(1, self.registers.carry_flag)
+        self.assertEqual(0xc0, self.run_cb(0x2a, 0x81, target='d'))
+        self.assertEqual(1, self.registers.carry_flag)
+        self.assertEqual(0x40, self.run_cb(0x3e, 0x81, target=None))
+        self.assertEqual(0x0f, self.run_cb(0x33, 0xf0, carry=1, target='e'))
+        self.assertEqual((0, 0, 0, 0), self.flags())
+
+    def test_bit_res_set(self):
+        self.run_cb(0x7c, 0x7f, carry=1, target='h')
+        self.assertEqual((1, 0, 1, 1), self.flags())
+        self.run_cb(0x46, 0x01, target=None)
+        self.assertEqual(0, self.registers.zero_flag)
+        self.assertEqual(0xf7, self.run_cb(0x9f, 0xff, target='a'))
+        self.assertEqual(0x10, self.run_cb(0xe6, 0x00, target=None))
+        self.assertEqual(0x81, self.run_cb(0xfd, 0x01, target='l'))
+
+    def test_every_opcode_has_handler(self):
+        ext_opcodes = self.registers.ext_opcodes
+        self.assertEqual(list(range(256)), sorted(ext_opcodes))
+        self.assertEqual('SET 5,A', ext_opcodes[0xef].__doc__.strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
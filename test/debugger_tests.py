@@ -0,0 +1,71 @@
+import unittest
+from assembler import RomBuilder
+from core import Core
+from debugger import Debugger, DebugBreak
+
+
+class TestDebugger(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        builder = RomBuilder(banks=4).code("""
+            main:   ld b, 2
+            loop:   ld a, b
+                    ld ($c000), a
+                    ld a, ($c001)
+                    dec b
+                    jr nz, loop
+                    ld a, 2
+                    ld ($2000), a
+                    call $4000
+            done:   jr done
+        """).code("""
+            far:    ret
+        """, bank=2)
+        self.core.mmu.rom = list(builder.build())
+        self.labels = builder.labels
+        self.debugger = Debugger(self.core.cpu)
+
+    def run_until_break(self, limit=1000):
+        for _ in range(limit):
+            try:
+                self.core.step()
+            except DebugBreak as hit:
+                return hit
+        self.fail("no break")
+
+    def test_fast_path_when_unused(self):
+        self.debugger.add_breakpoint(self.labels['loop'])
+        self.debugger.add_watchpoint(0xc000, read=True)
+        self.assertIn('cycle', self.core.cpu.__dict__)
+        self.assertIn('read_byte', self.core.mmu.__dict__)
+        self.debugger.clear()
+        self.assertNotIn('cycle', self.core.cpu.__dict__)
+        self.assertNotIn('read_byte', self.core.mmu.__dict__)
+        self.assertNotIn('write_byte', self.core.mmu.__dict__)
+
+    def test_breakpoint_and_resume(self):
+        self.debugger.add_breakpoint(self.labels['loop'])
+        for b in (2, 1):
+            hit = self.run_until_break()
+            self.assertEqual('breakpoint', hit.kind)
+            self.assertEqual(self.labels['loop'], hit.pc)
+            self.assertEqual(b, self.core.cpu.registers.b)
+
+    def test_banked_breakpoint(self):
+        self.debugger.add_breakpoint(0x4000, bank=3)
+        self.debugger.add_breakpoint(0x4000, bank=2)
+        hit = self.run_until_break()
+        self.assertEqual((2, 0x4000), (hit.bank, hit.pc))
+
+    def test_watchpoints(self):
+        self.debugger.add_watchpoint(0xc000, write=True)
+        self.debugger.add_watchpoint(0xc001, read=True, write=False)
+        hit = self.run_until_break()
+        self.assertEqual(('write', 0xc000, 2), (hit.kind, hit.addr, hit.value))
+        self.assertEqual(self.labels['loop'] + 1, hit.pc)
+        hit = self.run_until_break()
+        self.assertEqual(('read', 0xc001), (hit.kind, hit.addr))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import opcodes
+from assembler import RomBuilder, assemble
+from disasm import Disassembler, decode
+
+
+class TestDecode(unittest.TestCase):
+    def decode(self, code, addr=0x150):
+        return decode(lambda a: code[a - addr] if a - addr < len(code) else 0,
+                      addr)
+
+    def test_round_trip(self):
+        for op in range(256):
+            if op == 0xcb:
+                continue
+            code = [op, 0x85, 0x12][:opcodes.LENGTHS[op]]
+            if op == 0x10:
+                code = [0x10, 0x00]
+            instruction = self.decode(code)
+            self.assertEqual(bytes(code), assemble([instruction.text]),
+                             instruction.text)
+        for op in range(256):
+            instruction = self.decode([0xcb, op])
+            self.assertEqual(bytes([0xcb, op]), assemble([instruction.text]))
+
+    def test_cycles(self):
+        self.assertEqual((8, 12), (self.decode([0x20, 0]).cycles,
+                                   self.decode([0x20, 0]).branch_cycles))
+        self.assertEqual(24, self.decode([0xcd, 0, 0]).cycles)
+        self.assertEqual(16, self.decode([0xcb, 0x06]).cycles)
+        self.assertEqual(12, self.decode([0xcb, 0x46]).cycles)
+
+    def test_flow(self):
+        jr = self.decode([0x18, 0xfe])
+        self.assertEqual((0x150, True), (jr.target, jr.ends))
+        call = self.decode([0xc4, 0x00, 0x40])
+        self.assertEqual((0x4000, True, False), (call.target, call.call, call.ends))
+        self.assertTrue(self.decode([0xd3]).ends)
+
+
+class TestDisassembler(unittest.TestCase):
+    def setUp(self):
+        builder = RomBuilder(banks=4).code("""
+            main:   ld b, 3
+            loop:   call sub
+                    dec b
+                    jr nz, loop
+                    call $4000
+            done:   jr done
+            sub:    ret z
+                    inc a
+                    ret
+        """).code("""
+            far:    jp done
+        """, bank=2)
+        self.rom = builder.build()
+        self.labels = builder.labels
+        self.disassembler = Disassembler(self.rom)
+
+    def test_blocks(self):
+        blocks = self.disassembler.analyse([0x100, (2, 0x4000)])
+        labels = self.labels
+        starts = sorted(addr for bank, addr in blocks if bank == 0)
+        self.assertEqual([0x100, labels['main'], labels['loop'],
+                          labels['loop'] + 3, labels['loop'] + 6,
+                          labels['done'], labels['sub'], labels['sub'] + 1],
+                         starts)
+        self.assertEqual({(0, labels['sub']), (1, 0x4000)},
+                         self.disassembler.calls)
+        loop = self.disassembler.block_at(labels['loop'] + 3)
+        self.assertEqual([(0, labels['loop']), (0, labels['loop'] + 6)],
+                         loop.successors)
+        far = self.disassembler.block_at(0x4000, 2)
+        self.assertEqual([(0, labels['done'])], far.successors)
+
+    def test_cache(self):
+        first = self.disassembler.instruction(0x4000, 2)
+        self.assertIs(first, self.disassembler.instruction(0x4000, 2))
+        self.assertIsNot(first, self.disassembler.instruction(0x4000, 1))
+        self.assertIs(self.disassembler.instruction(0x150, 3),
+                      self.disassembler.instruction(0x150))
+
+    def test_bank_zero_selects_one(self):
+        rom = RomBuilder(banks=4).fill(1, 0x3c).build()
+        disassembler = Disassembler(rom)
+        instruction = disassembler.instruction(0x4000, 0)
+        self.assertEqual((1, 'INC A'), (instruction.bank, instruction.text))
+        self.assertIs(instruction, disassembler.instruction(0x4000, 1))
+        self.assertEqual((1, 0x4000), disassembler.key(0x4000, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
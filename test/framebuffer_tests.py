@@ -0,0 +1,62 @@
+import unittest
+import framebuffer
+import gpu
+from assembler import RomBuilder
+from core import Core
+
+
+class TestSharedFramebuffer(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        # draws the first frame black and the second white
+        self.core.mmu.rom = list(RomBuilder().code("""
+            main:   ld a, $ff
+                    ldh ($47), a
+            wait:   ldh a, ($44)
+                    cp 144
+                    jr nz, wait
+                    xor a
+                    ldh ($47), a
+            loop:   jr loop
+        """).build())
+        self.writer = framebuffer.SharedFramebuffer()
+        self.writer.attach(self.core.gpu)
+        self.reader = framebuffer.FramebufferReader(self.writer.name)
+
+    def tearDown(self):
+        self.reader.close()
+        if self.writer.gpu is not None:
+            self.writer.close()
+
+    def test_header(self):
+        self.assertEqual((gpu.WIDTH, gpu.HEIGHT),
+                         (self.reader.width, self.reader.height))
+        frame, pixels = self.reader.read()
+        self.assertEqual(0, frame)
+        self.assertEqual(framebuffer.FRAME_SIZE, len(pixels))
+
+    def test_publish_read(self):
+        self.core.run_frame()
+        frame, pixels = self.reader.read()
+        self.assertEqual(1, frame)
+        self.assertEqual(bytes([3]) * framebuffer.FRAME_SIZE, pixels)
+        self.assertEqual(0, self.writer.sequence & 1)
+        self.core.run_frame()
+        frame, pixels = self.reader.wait(1)
+        self.assertEqual(2, frame)
+        self.assertEqual(bytes(framebuffer.FRAME_SIZE), pixels)
+        # the gpu draws into the other slot than the one just published
+        self.core.gpu.framebuffer[0] = 2
+        self.assertEqual((2, pixels), self.reader.read())
+
+    def test_close_detaches(self):
+        self.core.run_frame()
+        self.writer.close()
+        self.assertIsNone(self.core.gpu.export)
+        self.assertIsInstance(self.core.gpu.framebuffer, bytearray)
+        self.core.run_frame()
+        self.assertEqual(2, self.core.gpu.frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
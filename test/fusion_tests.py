@@ -0,0 +1,139 @@
+import unittest
+from assembler import RomBuilder
+from core import Core
+from fusion import Fusion
+from register import Register
+
+
+class TestFusion(unittest.TestCase):
+    def setUp(self):
+        builder = RomBuilder().code("""
+            main:   ld hl, data
+                    ld de, $c000
+                    ld b, 16
+            copy:   ld a, (hl+)
+                    ld (de), a
+                    inc de
+                    dec b
+                    jr nz, copy
+                    ld bc, $0020
+            delay:  dec bc
+                    ld a, b
+                    or c
+                    jr nz, delay
+            done:   jr done
+            data:   db 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16
+        """)
+        self.rom = list(builder.build())
+        self.labels = builder.labels
+
+    def run_to_done(self, fuse):
+        emulator = Core()
+        emulator.mmu.rom = list(self.rom)
+        fusion = Fusion(emulator.cpu, emulator.scheduler, profile=True)
+        if fuse:
+            fusion.enable()
+        steps = 0
+        while emulator.cpu.registers.pc != self.labels['done']:
+            emulator.step()
+            steps += 1
+        return emulator, fusion, steps
+
+    def state(self, emulator):
+        r = emulator.cpu.registers
+        return ([int(getattr(r, name)) for name in 'abcdehl'] + [r.flags()],
+                emulator.mmu.wram[:16], emulator.cycles)
+
+    def test_same_result(self):
+        plain, _, plain_steps = self.run_to_done(False)
+        fused, fusion, fused_steps = self.run_to_done(True)
+        self.assertEqual(self.state(plain), self.state(fused))
+        self.assertEqual(list(range(1, 17)), fused.mmu.wram[:16])
+        self.assertLess(fused_steps, plain_steps / 3)
+        self.assertEqual(16, fusion.counts[(0x2a, 0x12, 0x13, 0x05, 0x20)])
+        self.assertEqual(0x20, fusion.counts[(0x0b, 0x78, 0xb1, 0x20)])
+        self.assertEqual(0, fusion.counts[(0x05, 0x20)])
+        self.assertIn('DEC BC / LD A,B / OR C / JR NZ,r8', fusion.report())
+
+    def test_disable_restores_dispatch(self):
+        emulator = Core()
+        table = emulator.cpu.opcodes
+        fusion = Fusion(emulator.cpu, emulator.scheduler)
+        with fusion:
+            self.assertIsNot(table, emulator.cpu.opcodes)
+        self.assertIs(table, emulator.cpu.opcodes)
+
+    def test_ram_code_not_fused(self):
+        emulator = Core()
+        emulator.mmu.rom = list(self.rom)
+        for i, value in enumerate((0x05, 0x20, 0xfd)):
+            emulator.mmu.write_byte(0xc100 + i, value)
+        emulator.cpu.registers.pc = 0xc100
+        emulator.cpu.registers.b = 2
+        fusion = Fusion(emulator.cpu, emulator.scheduler, profile=True)
+        fusion.enable()
+        for _ in range(4):
+            emulator.step()
+        self.assertEqual(0, emulator.cpu.registers.b)
+        self.assertEqual(0, sum(fusion.counts.values()))
+        self.assertEqual({}, fusion.sites)
+
+    def test_branch_inside_pattern(self):
+        emulator = Core()
+        self.assertRaises(ValueError, Fusion, emulator.cpu,
+                          emulator.scheduler, [(0x20, 0x05)])
+
+    def test_pc_stays_register(self):
+        emulator, _, _ = self.run_to_done(True)
+        pc = emulator.cpu.registers.pc
+        self.assertIsInstance(pc, Register)
+        self.assertEqual(0xffff, pc._limit)
+
+    def test_timing_inside_sequence(self):
+        # samples DIV and LY after a nop, with v-blank interrupts recording
+        # DIV on entry, so any skew in time or interrupts changes the log
+        builder = RomBuilder()
+        builder.code("""
+            main:   ld hl, $c000
+                    ld bc, $d000
+                    ld a, 1
+                    ldh ($ff), a
+                    ei
+            loop:   nop
+                    ldh a, ($04)
+                    ld (hl+), a
+                    nop
+                    ldh a, ($44)
+                    ld (hl+), a
+                    ld a, h
+                    cp $d0
+                    jr nz, loop
+            done:   jr done
+        """)
+        builder.code("""
+                    ldh a, ($04)
+                    ld (bc), a
+                    inc bc
+                    reti
+        """, origin=0x40)
+        rom = list(builder.build())
+        done = builder.labels['done']
+        results = []
+        for fuse in (False, True):
+            emulator = Core()
+            emulator.mmu.rom = list(rom)
+            fusion = Fusion(emulator.cpu, emulator.scheduler,
+                            [(0x00, 0xf0, 0x22)], profile=True)
+            if fuse:
+                fusion.enable()
+            while emulator.cpu.registers.pc != done:
+                emulator.step()
+            results.append((emulator.mmu.wram[:], emulator.cycles))
+            if fuse:
+                self.assertGreater(fusion.counts[(0x00, 0xf0, 0x22)], 1000)
+        self.assertTrue(any(results[0][0][0x1000:0x1004]))
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import unittest
+import gpu
+import interrupts
+from assembler import RomBuilder
+from core import Core
+from scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def test_events_run_in_order(self):
+        scheduler = Scheduler()
+        ran = []
+        scheduler.schedule(30, lambda when: ran.append(('b', when)))
+        scheduler.schedule(10, lambda when: ran.append(('a', when)))
+        scheduler.schedule(30, lambda when: ran.append(('c', when)))
+        scheduler.advance(12)
+        self.assertListEqual([('a', 10)], ran)
+        self.assertEqual(30, scheduler.deadline)
+        scheduler.advance(100)
+        self.assertListEqual([('a', 10), ('b', 30), ('c', 30)], ran)
+
+    def test_cancel(self):
+        scheduler = Scheduler()
+        ran = []
+        event = scheduler.schedule(10, ran.append)
+        scheduler.cancel(event)
+        scheduler.advance(20)
+        self.assertListEqual([], ran)
+
+    def test_callback_schedules_past_event(self):
+        scheduler = Scheduler()
+        ran = []
+        scheduler.schedule(10, lambda when: scheduler.schedule(when + 5, ran.append))
+        scheduler.advance(40)
+        self.assertListEqual([15], ran)
+
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.gpu = self.core.gpu
+        self.mmu = self.core.mmu
+        # tile 1: rows of colours 0, 1, 2, 3 two pixels each
+        self.tile(0x0010, [0x33, 0x0f] * 8)
+        # tile 1 again at 0x9010 for signed addressing, colour 3 throughout
+        self.tile(0x1010, [0xff, 0xff] * 8)
+        self.mmu.write_byte(0xff47, 0xe4)  # shade = colour
+
+    def tile(self, offset, data):
+        for i, value in enumerate(data):
+            self.gpu.vram[offset + i] = value
+
+    def row(self, line):
+        return list(self.gpu.framebuffer[line * gpu.WIDTH:(line + 1) * gpu.WIDTH])
+
+    def test_unsigned_tiles(self):
+        self.mmu.write_byte(0xff40, gpu.DISPON | gpu.BGSET | gpu.BGON)
+        self.gpu.vram[0x1800 + 32 + 1] = 1  # map row 1, column 1
+        self.gpu.render_scanline(9)
+        self.assertListEqual([0] * 8 + [0, 0, 1, 1, 2, 2, 3, 3] + [0] * 144,
+                             self.row(9))
+
+    def test_signed_tiles_and_second_map(self):
+        self.mmu.write_byte(0xff40, gpu.DISPON | gpu.BGMAP | gpu.BGON)
+        self.gpu.vram[0x1c00] = 1
+        self.gpu.render_scanline(0)
+        self.assertListEqual([3] * 8 + [0] * 152, self.row(0))
+
+    def test_scroll_and_palette(self):
+        self.mmu.write_byte(0xff40, gpu.DISPON | gpu.BGSET | gpu.BGON)
+        self.gpu.vram[0x1800 + 31] = 1  # last column, wraps to the left
+        self.mmu.write_byte(0xff42, 3)   # SCY
+        self.mmu.write_byte(0xff43, 252)  # SCX
+        self.mmu.write_byte(0xff47, 0x1b)  # shades reversed
+        self.gpu.render_scanline(2)
+        self.assertListEqual([1, 1, 0, 0] + [3] * 156, self.row(2))
+
+    def test_background_off(self):
+        self.gpu.framebuffer[0:gpu.WIDTH] = bytes([2]) * gpu.WIDTH
+        self.mmu.write_byte(0xff40, gpu.DISPON)
+        self.gpu.render_scanline(0)
+        self.assertListEqual([0] * gpu.WIDTH, self.row(0))
+
+    def test_frame_drawn_while_running(self):
+        self.mmu.write_byte(0xff40, gpu.DISPON | gpu.BGSET | gpu.BGON)
+        for i in range(0x400):
+            self.gpu.vram[0x1800 + i] = 1
+        self.mmu.rom = list(RomBuilder().code('main: jr main').build())
+        self.core.run_frame()
+        self.assertListEqual([0, 0, 1, 1, 2, 2, 3, 3] * 20,
+                             self.row(gpu.HEIGHT - 1))
+
+
+class TestLazyLCD(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.mmu = self.core.mmu
+
+    def at(self, cycles):
+        self.core.scheduler.advance(cycles - self.core.cycles)
+
+    def test_ly_from_cycles(self):
+        self.assertEqual(0, self.mmu.read_byte(0xff44))
+        self.at(gpu.LINE_CYCLES * 3 + 5)
+        self.assertEqual(3, self.mmu.read_byte(0xff44))
+        self.at(gpu.FRAME_CYCLES - 1)
+        self.assertEqual(153, self.mmu.read_byte(0xff44))
+        self.at(gpu.FRAME_CYCLES)
+        self.assertEqual(0, self.mmu.read_byte(0xff44))
+
+    def test_stat_mode_and_coincidence(self):
+        self.mmu.write_byte(0xff41, 0x40)
+        self.mmu.write_byte(0xff45, 2)
+        for cycles, bits in ((0, 2), (80, 3), (252, 0), (456, 2),
+                             (2 * gpu.LINE_CYCLES + 100, 0x04 | 3),
+                             (gpu.HEIGHT * gpu.LINE_CYCLES, 1)):
+            self.at(cycles)
+            self.assertEqual(0xc0 | bits, self.mmu.read_byte(0xff41))
+
+    def test_frame_counted_once_per_frame(self):
+        self.at(gpu.FRAME_CYCLES * 3 + 10)
+        self.assertEqual(3, self.core.gpu.frame)
+
+    def test_poll_ly(self):
+        builder = RomBuilder().code("""
+            main:   ldh a, ($44)
+                    cp $90
+                    jr nz, main
+            done:   jr done
+        """)
+        self.mmu.rom = list(builder.build())
+        while int(self.core.cpu.registers.pc) != builder.labels['done']:
+            self.core.step()
+        self.assertEqual(0x90, self.mmu.read_byte(0xff44))
+        self.assertEqual(1, self.core.gpu.frame)
+
+
+class TestLCDInterrupts(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.mmu = self.core.mmu
+
+    def at(self, cycles):
+        self.core.scheduler.advance(cycles - self.core.cycles)
+
+    def requested(self):
+        flags = self.core.interrupts.flags
+        self.core.interrupts.flags = 0
+        return flags
+
+    def test_stat_edges(self):
+        self.assertEqual((), gpu.stat_edges(0, 0))
+        self.assertEqual((5 * gpu.LINE_CYCLES,), gpu.stat_edges(gpu.STAT_LYC, 5))
+        self.assertEqual((gpu.HEIGHT * gpu.LINE_CYCLES,),
+                         gpu.stat_edges(gpu.STAT_VBLANK, 0))
+        hblank = gpu.stat_edges(gpu.STAT_HBLANK, 0)
+        self.assertEqual(gpu.HEIGHT, len(hblank))
+        self.assertEqual(gpu.MODE0_START, hblank[0])
+        # the line stays high from line 2's h-blank through LY == LYC on
+        # line 3, so neither raises it again
+        both = gpu.stat_edges(gpu.STAT_HBLANK | gpu.STAT_LYC, 3)
+        self.assertNotIn(3 * gpu.LINE_CYCLES, both)
+        self.assertNotIn(3 * gpu.LINE_CYCLES + gpu.MODE0_START, both)
+        self.assertEqual(gpu.HEIGHT - 1, len(both))
+
+    def test_vblank_requested(self):
+        self.at(gpu.HEIGHT * gpu.LINE_CYCLES - 1)
+        self.assertEqual(0, self.requested())
+        self.at(gpu.HEIGHT * gpu.LINE_CYCLES)
+        self.assertEqual(interrupts.VBLANK, self.requested())
+
+    def test_lyc_interrupt_every_frame(self):
+        self.mmu.write_byte(0xff45, 10)
+        self.mmu.write_byte(0xff41, gpu.STAT_LYC)
+        self.assertEqual(0, self.requested())
+        for frame in range(3):
+            start = frame * gpu.FRAME_CYCLES + 10 * gpu.LINE_CYCLES
+            self.at(start - 1)
+            self.assertEqual(0, self.requested() & interrupts.STAT)
+            self.at(start)
+            self.assertEqual(interrupts.STAT, self.requested() & interrupts.STAT)
+
+    def test_write_raising_line_requests(self):
+        self.at(4 * gpu.LINE_CYCLES + 10)
+        self.mmu.write_byte(0xff45, 4)
+        self.mmu.write_byte(0xff41, gpu.STAT_LYC)
+        self.assertEqual(interrupts.STAT, self.requested())
+        self.at(5 * gpu.LINE_CYCLES)
+        self.assertEqual(0, self.requested() & interrupts.STAT)
+
+    def test_lcd_off(self):
+        self.mmu.write_byte(0xff41, gpu.STAT_OAM)
+        self.at(1000)
+        self.mmu.write_byte(0xff40, 0x11)
+        self.requested()
+        self.at(gpu.FRAME_CYCLES * 2)
+        self.assertEqual(0, self.mmu.read_byte(0xff44))
+        self.assertEqual(0, self.mmu.read_byte(0xff41) & 0x03)
+        self.assertEqual(0, self.requested())
+        self.mmu.write_byte(0xff40, 0x91)
+        self.at(gpu.FRAME_CYCLES * 2)
+        self.assertEqual(interrupts.STAT, self.requested())
+        self.at(gpu.FRAME_CYCLES * 2 + gpu.LINE_CYCLES * 2 + 100)
+        self.assertEqual(2, self.mmu.read_byte(0xff44))
+
+    def test_raster_handler(self):
+        builder = RomBuilder().code("""
+                    inc b
+                    reti
+        """, origin=0x48).code("""
+            main:   ld a, $02
+                    ld ($ffff), a
+                    ld a, 100
+                    ldh ($45), a
+                    ld a, $40
+                    ldh ($41), a
+                    ld b, 0
+                    ei
+            wait:   ld a, b
+                    cp 2
+                    jr nz, wait
+            done:   jr done
+        """)
+        self.mmu.rom = list(builder.build())
+        while int(self.core.cpu.registers.pc) != builder.labels['done']:
+            self.core.step()
+        self.assertEqual(1, self.core.gpu.frame)
+        self.assertEqual(100, self.mmu.read_byte(0xff44))
+
+
+if __name__ == '__main__':
+    unittest.main()
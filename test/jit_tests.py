@@ -0,0 +1,182 @@
+import unittest
+from assembler import RomBuilder
+from core import Core
+from jit import TraceJit
+from register import Register
+
+
+class TestTraceJit(unittest.TestCase):
+    def build(self, code, banks=2):
+        builder = RomBuilder(banks=banks).code(code)
+        return list(builder.build()), builder.labels
+
+    def run_to(self, rom, stop, use_jit, limit=200000):
+        emulator = Core()
+        emulator.mmu.rom = list(rom)
+        tracer = TraceJit(emulator.cpu, emulator.scheduler, threshold=4)
+        if use_jit:
+            tracer.enable()
+        steps = 0
+        while int(emulator.cpu.registers.pc) != stop:
+            emulator.step()
+            steps += 1
+            self.assertLess(steps, limit)
+        r = emulator.cpu.registers
+        state = ([int(getattr(r, name)) for name in ('a', 'b', 'c', 'd', 'e', 'h', 'l', 'sp')],
+                 r.flags(), emulator.mmu.wram[:0x300], emulator.cycles)
+        return state, steps, tracer
+
+    def test_same_result(self):
+        rom, labels = self.build("""
+            main:   ld hl, $c000
+                    ld de, $0150
+                    ld b, 0
+            copy:   ld a, (de)
+                    inc de
+                    ld (hl+), a
+                    dec b
+                    jr nz, copy
+                    ld bc, $0300
+                    xor a
+            sum:    add a, c
+                    adc a, b
+                    swap a
+                    rl e
+                    daa
+                    dec bc
+                    ld d, a
+                    ld a, b
+                    or c
+                    ld a, d
+                    jr nz, sum
+                    ld ($c200), a
+                    ld hl, $c100
+            bits:   set 3, (hl)
+                    bit 0, l
+                    jr z, even
+                    inc (hl)
+            even:   inc l
+                    jr nz, bits
+            done:   jr done
+        """)
+        plain, plain_steps, _ = self.run_to(rom, labels['done'], False)
+        traced, traced_steps, tracer = self.run_to(rom, labels['done'], True)
+        self.assertEqual(plain, traced)
+        self.assertLess(traced_steps * 4, plain_steps)
+        self.assertEqual(3, len(tracer.traces))
+
+    def test_side_exit_on_bank_switch(self):
+        rom, labels = self.build("""
+            main:   ld b, 40
+            loop:   ld a, 1
+                    ld ($2000), a
+                    ld a, ($4000)
+                    dec b
+                    jr nz, loop
+            done:   jr done
+        """, banks=4)
+        plain, _, _ = self.run_to(rom, labels['done'], False)
+        traced, _, tracer = self.run_to(rom, labels['done'], True)
+        self.assertEqual(plain, traced)
+        self.assertIn('if addr < 0x8000', list(tracer.sources.values())[0])
+
+    def test_unsupported_loop_stays_interpreted(self):
+        rom, labels = self.build("""
+            main:   ld b, 40
+            loop:   call sub
+                    dec b
+                    jr nz, loop
+            done:   jr done
+            sub:    ret
+        """)
+        traced, _, tracer = self.run_to(rom, labels['done'], True)
+        self.assertEqual({}, tracer.traces)
+        self.assertIn(labels['loop'], tracer.failed)
+
+    def test_timing_inside_trace(self):
+        # samples DIV and LY, with v-blank interrupts recording DIV on entry,
+        # so any skew in time or interrupts changes the log
+        builder = RomBuilder()
+        builder.code("""
+            main:   ld hl, $c000
+                    ld bc, $d000
+                    ld a, 1
+                    ldh ($ff), a
+                    ei
+            loop:   nop
+                    ldh a, ($04)
+                    ld (hl+), a
+                    ldh a, ($44)
+                    ld (hl+), a
+                    ld a, h
+                    cp $d0
+                    jr nz, loop
+            done:   jr done
+        """)
+        builder.code("""
+                    ldh a, ($04)
+                    ld (bc), a
+                    inc bc
+                    reti
+        """, origin=0x40)
+        rom = list(builder.build())
+        plain, _, _ = self.run_to(rom, builder.labels['done'], False)
+        traced, _, tracer = self.run_to(rom, builder.labels['done'], True)
+        self.assertEqual(plain, traced)
+        self.assertIn(builder.labels['loop'], tracer.traces)
+
+    def test_interrupt_while_recording(self):
+        builder = RomBuilder()
+        builder.code("""
+            main:   ld a, 4
+                    ldh ($ff), a
+                    ei
+            loop:   inc b
+                    jr loop
+        """)
+        builder.code('reti', origin=0x50)
+        emulator = Core()
+        emulator.mmu.rom = list(builder.build())
+        tracer = TraceJit(emulator.cpu, emulator.scheduler, threshold=4)
+        tracer.enable()
+        while tracer.recording is None:
+            emulator.step()
+        # taken right after the first recorded instruction
+        emulator.interrupts.request(0x04)
+        for _ in range(20):
+            emulator.step()
+        loop = builder.labels['loop']
+        self.assertNotIn(loop, tracer.failed)
+        self.assertIn(loop, tracer.traces)
+        self.assertIsInstance(emulator.cpu.registers.pc, Register)
+
+    def test_rom_replaced(self):
+        rom, labels = self.build("""
+            main:   ld b, 40
+            loop:   dec b
+                    jr nz, loop
+            done:   jr done
+        """)
+        emulator = Core()
+        emulator.mmu.rom = list(rom)
+        tracer = TraceJit(emulator.cpu, emulator.scheduler, threshold=4)
+        tracer.enable()
+        while int(emulator.cpu.registers.pc) != labels['done']:
+            emulator.step()
+        self.assertIn(labels['loop'], tracer.traces)
+        emulator.mmu.rom = list(rom)
+        emulator.step()
+        self.assertEqual({}, tracer.traces)
+        self.assertEqual({}, tracer.counts)
+        tracer.disable()
+
+    def test_disable(self):
+        emulator = Core()
+        tracer = TraceJit(emulator.cpu, emulator.scheduler)
+        with tracer:
+            self.assertIn('cycle', emulator.cpu.__dict__)
+        self.assertNotIn('cycle', emulator.cpu.__dict__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+from assembler import RomBuilder
+from mmu import MMU
+
+
+class TestBanking(unittest.TestCase):
+    def setUp(self):
+        self.mmu = MMU()
+        builder = RomBuilder(banks=4)
+        for bank in range(1, 4):
+            builder.fill(bank, bank)
+        self.rom = builder.build()
+        self.mmu.rom = list(self.rom)
+
+    def test_bank_select(self):
+        self.assertEqual(1, self.mmu.read_byte(0x4000))
+        self.mmu.write_byte(0x2000, 3)
+        self.assertEqual(3, self.mmu.read_byte(0x7fff))
+        # bank 0 maps to bank 1, numbers wrap at the ROM size
+        self.mmu.write_byte(0x3fff, 0)
+        self.assertEqual(1, self.mmu.read_byte(0x4000))
+        self.mmu.write_byte(0x2000, 6)
+        self.assertEqual(2, self.mmu.read_byte(0x4000))
+
+    def test_rom_not_written(self):
+        for addr in (0x0000, 0x0100, 0x1fff, 0x4000, 0x5fff, 0x6000, 0x7fff):
+            self.mmu.write_byte(addr, 0x0a)
+        self.assertEqual(list(self.rom), self.mmu.rom)
+        self.assertEqual(1, self.mmu.rom_bank)
+
+    def test_load_replaces_rom(self):
+        path = tempfile.mkdtemp()
+        try:
+            rom = os.path.join(path, 'test.gb')
+            RomBuilder().code('main: jr main').save(rom)
+            self.mmu.load(rom)
+            self.mmu.load(rom)
+            with open(rom, 'rb') as f:
+                self.assertEqual(list(f.read()), self.mmu.rom)
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
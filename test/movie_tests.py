@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+import joypad
+from assembler import RomBuilder
+from core import Core
+from movie import Movie, Recorder, replay
+
+
+class TestJoypad(unittest.TestCase):
+    def setUp(self):
+        self.joypad = joypad.Joypad()
+
+    def test_nothing_pressed(self):
+        self.joypad.write(0x20)
+        self.assertEqual(self.joypad.read(), 0xef)
+        self.joypad.write(0x10)
+        self.assertEqual(self.joypad.read(), 0xdf)
+
+    def test_groups_selected(self):
+        self.joypad.press(joypad.LEFT | joypad.START)
+        self.joypad.write(0x20)  # directions
+        self.assertEqual(self.joypad.read(), 0xed)
+        self.joypad.write(0x10)  # actions
+        self.assertEqual(self.joypad.read(), 0xd7)
+        self.joypad.release(joypad.START)
+        self.assertEqual(self.joypad.read(), 0xdf)
+
+    def test_mmu_routes_joyp(self):
+        core = Core()
+        core.joypad.press(joypad.A)
+        core.mmu.write_byte(0xff00, 0x10)
+        self.assertEqual(core.mmu.read_byte(0xff00), 0xde)
+
+
+class TestMovie(unittest.TestCase):
+    def test_only_transitions_recorded(self):
+        movie = Movie()
+        movie.record(0, 0)
+        movie.record(3, joypad.A)
+        movie.record(4, joypad.A)
+        movie.record(9, 0)
+        self.assertListEqual([(3, joypad.A), (9, 0)], list(movie))
+        self.assertEqual(movie.mask_at(2), 0)
+        self.assertEqual(movie.mask_at(5), joypad.A)
+        self.assertEqual(movie.mask_at(12), 0)
+
+    def test_same_frame_replaced(self):
+        movie = Movie()
+        movie.record(3, joypad.A)
+        movie.record(3, joypad.A | joypad.B)
+        self.assertListEqual([(3, joypad.A | joypad.B)], list(movie))
+
+    def test_save_load(self):
+        movie = Movie([(1, joypad.UP), (5, joypad.UP | joypad.B), (7, 0)])
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            movie.save(path)
+            self.assertListEqual(list(movie), list(Movie.load(path)))
+        finally:
+            os.remove(path)
+
+    def test_replay(self):
+        core = Core()
+        core.mmu.rom = list(RomBuilder().code("""
+            main:   ld a, $10      ; select action buttons
+                    ldh ($00), a
+            loop:   ldh a, ($00)   ; copy JOYP into HRAM forever
+                    ldh ($80), a
+                    jr loop
+        """).build())
+        replay(core, Movie([(1, joypad.START)]), 1)
+        self.assertEqual(core.mmu.read_byte(0xff80), 0xdf)
+        replay(core, Movie([(0, joypad.START)]), 1)
+        self.assertEqual(core.mmu.read_byte(0xff80), 0xd7)
+
+    def test_record_replay_deterministic(self):
+        source = """
+            main:   ld a, $10      ; select action buttons
+                    ldh ($00), a
+                    ld hl, 0
+            loop:   ldh a, ($00)   ; count iterations with start held
+                    bit 3, a
+                    jr nz, loop
+                    inc hl
+                    jr loop
+        """
+        recording = Core()
+        recording.mmu.rom = list(RomBuilder().code(source).build())
+        movie = Movie()
+        recorder = Recorder(recording, movie)
+        # press and release in the middle of frames
+        for frame, action in ((2, recorder.press), (5, recorder.release)):
+            while recording.gpu.frame < frame:
+                recorder.step()
+            for _ in range(500):
+                recorder.step()
+            action(joypad.START)
+        while recording.gpu.frame < 8:
+            recorder.step()
+        self.assertListEqual([(3, joypad.START), (6, 0)], list(movie))
+        registers = recording.cpu.registers
+        held = (int(registers.h), int(registers.l))
+        self.assertNotEqual(held, (0, 0))
+
+        replayed = Core()
+        replayed.mmu.rom = list(RomBuilder().code(source).build())
+        self.assertEqual(replay(replayed, movie, 8), 8)
+        registers = replayed.cpu.registers
+        self.assertEqual((int(registers.h), int(registers.l)), held)
+        self.assertEqual(replayed.cycles, recording.cycles)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import profiler
+import tracer
+from assembler import RomBuilder
+from core import Core
+
+
+class TestOpcodeProfiler(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.core.mmu.rom = list(RomBuilder().code("""
+            main:   ld b, 3
+            loop:   dec b
+                    jr nz, loop
+                    swap a
+            done:   jr done
+        """).build())
+        self.profiler = profiler.OpcodeProfiler(self.core.cpu)
+
+    def run_instructions(self, count):
+        for _ in range(count):
+            self.core.step()
+
+    def test_counts_and_cycles(self):
+        with self.profiler:
+            # the header's nop and jp main, then the program
+            self.run_instructions(10)
+        self.assertEqual(4, self.profiler.cycles[0x00])
+        self.assertEqual(16, self.profiler.cycles[0xc3])
+        self.assertEqual(1, self.profiler.counts[0x06])
+        self.assertEqual(8, self.profiler.cycles[0x06])
+        self.assertEqual(3, self.profiler.counts[0x05])
+        self.assertEqual(12, self.profiler.cycles[0x05])
+        # taken twice, then falls through
+        self.assertEqual(3, self.profiler.counts[0x20])
+        self.assertEqual(12 + 12 + 8, self.profiler.cycles[0x20])
+        self.assertEqual(1, self.profiler.counts[0xcb])
+        self.assertEqual(1, self.profiler.cb_counts[0x37])
+        self.assertEqual(8, self.profiler.cb_cycles[0x37])
+        self.assertEqual(10, sum(self.profiler.counts))
+        self.assertEqual(self.core.cycles, sum(self.profiler.cycles))
+
+    def test_rows_and_report(self):
+        with self.profiler:
+            self.run_instructions(10)
+        rows = dict((row[0], row) for row in self.profiler.rows())
+        self.assertListEqual(['00', '05', '06', '20', 'c3', 'cb', 'cb 37'],
+                             sorted(rows))
+        self.assertEqual((3, 12), rows['05'][2:4])
+        self.assertEqual('DEC B', rows['05'][1])
+        self.assertEqual('SWAP A', rows['cb 37'][1])
+        report = self.profiler.report()
+        self.assertEqual(8, len(report.splitlines()))
+        self.assertIn('cycles', report.splitlines()[0])
+
+    def test_disable_restores_tables(self):
+        opcodes = self.core.cpu.opcodes
+        self.profiler.enable()
+        self.assertIsNot(opcodes, self.core.cpu.opcodes)
+        self.profiler.disable()
+        self.assertIs(opcodes, self.core.cpu.opcodes)
+        self.run_instructions(4)
+        self.assertEqual(0, sum(self.profiler.counts))
+
+    def test_reset(self):
+        with self.profiler:
+            self.run_instructions(3)
+        self.profiler.reset()
+        self.assertEqual(0, sum(self.profiler.counts))
+        self.assertEqual(0, sum(self.profiler.cycles))
+        self.assertListEqual([], self.profiler.rows())
+
+
+class TestHotspotSampler(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        # built before any ROM is loaded
+        self.sampler = profiler.HotspotSampler(self.core.cpu, 64)
+
+    def load_banked(self):
+        builder = RomBuilder(banks=8)
+        builder.code("""
+            main:   ld a, 6
+                    ld ($2000), a
+                    jp $4000
+        """)
+        builder.code("""
+            spin:   ld b, 10
+            loop:   dec b
+                    jr nz, loop
+                    jr spin
+        """, bank=6)
+        self.core.mmu.rom = list(builder.build())
+
+    def test_rom_loaded_after_construction(self):
+        self.load_banked()
+        with self.sampler:
+            self.core.run_frames(2)
+        self.assertEqual(8 * 0x4000, self.sampler.rom_size)
+        bank, start, count, hits = self.sampler.hotspots(limit=1)[0]
+        self.assertEqual((6, 0x4000), (bank, start))
+        self.assertGreater(count, 2000)
+        self.assertTrue(all(0x4000 <= addr < 0x4007 for addr, _ in hits))
+        self.assertIn('06:4000-400f', self.sampler.report(limit=1))
+
+    def test_rom_grows_while_enabled(self):
+        self.core.mmu.rom = list(RomBuilder().code('main: jr main').build())
+        self.sampler.enable()
+        self.core.run_frame()
+        self.load_banked()
+        self.core.mmu.rom_bank = 1
+        self.core.cpu.registers.jump(0x100)
+        self.core.run_frame()
+        self.sampler.disable()
+        bank, start, count, hits = self.sampler.hotspots(limit=1)[0]
+        self.assertEqual((6, 0x4000), (bank, start))
+
+    def test_ram(self):
+        self.core.mmu.rom = list(RomBuilder().code('main: jp $c000').build())
+        self.core.mmu.wram[0:2] = [0x18, 0xfe]  # jr -2
+        with self.sampler:
+            self.core.run_frame()
+        bank, start, count, hits = self.sampler.hotspots(limit=1)[0]
+        self.assertEqual((None, 0xc000), (bank, start))
+        self.assertIn('ram:c000', self.sampler.report(limit=1))
+
+    def test_disable_keeps_later_wrapper(self):
+        self.load_banked()
+        self.sampler.enable()
+        instruction_tracer = tracer.Tracer(self.core.cpu, self.core.scheduler,
+                                           16)
+        instruction_tracer.enable()
+        self.sampler.disable()
+        self.core.run_frame()
+        self.assertEqual(16, instruction_tracer.count)
+        # the sampler the tracer still calls no longer samples
+        samples = sum(self.sampler.samples)
+        self.core.run_frame()
+        self.assertEqual(samples, sum(self.sampler.samples))
+        instruction_tracer.disable()
+        self.sampler.enable()
+        self.core.run_frame()
+        samples = sum(self.sampler.samples)
+        self.assertGreater(samples, 0)
+        self.sampler.disable()
+        self.core.run_frame()
+        self.assertEqual(samples, sum(self.sampler.samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
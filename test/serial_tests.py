@@ -0,0 +1,110 @@
+import unittest
+import conformance
+import interrupts
+import serialport
+from assembler import RomBuilder
+from core import Core
+
+
+def print_rom(text, then='done: jr done'):
+    """
+    ROM sending text over the serial port, followed by the code in then.
+    """
+    lines = []
+    for char in text:
+        lines += ['ld a, %d' % ord(char), 'ldh ($01), a',
+                  'ld a, $81', 'ldh ($02), a']
+    return RomBuilder().code('main: ' + '\n'.join(lines) + '\n' + then)
+
+
+class TestSerial(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.mmu = self.core.mmu
+
+    def load(self, builder):
+        self.mmu.rom = list(builder.build())
+
+    def test_capture(self):
+        self.mmu.write_byte(0xff01, 0x48)
+        self.mmu.write_byte(0xff02, 0x81)
+        self.assertEqual(b'H', bytes(self.core.serial.output))
+        self.assertEqual(0xff, self.mmu.read_byte(0xff01))
+        self.assertEqual(0x7f, self.mmu.read_byte(0xff02))
+        self.assertEqual(interrupts.SERIAL, self.core.interrupts.flags)
+
+    def test_external_clock_never_completes(self):
+        self.mmu.write_byte(0xff01, 0x48)
+        self.mmu.write_byte(0xff02, 0x80)
+        self.assertEqual(b'', bytes(self.core.serial.output))
+        self.assertEqual(0xfe, self.mmu.read_byte(0xff02))
+
+    def test_contains(self):
+        condition = serialport.contains('Passed', 'passed')
+        self.assertIsNone(condition(bytearray(b'cpu_instrs Pass')))
+        self.assertEqual('passed', condition(bytearray(b'cpu_instrs Passed')))
+
+    def test_stops_on_output(self):
+        self.load(print_rom('ok\nPassed'))
+        self.assertEqual('passed', conformance.run(self.core, 10))
+        self.assertEqual('ok\nPassed', self.core.serial.text)
+        self.assertEqual([], self.core.serial.conditions)
+        self.assertLess(self.core.cycles, 1000)
+
+    def test_stop_counts_the_instruction(self):
+        self.load(print_rom('P'))
+        conditions = [serialport.contains('P', 'passed')]
+        self.assertEqual('passed', conformance.run(self.core, 10, conditions))
+        # nop, jp main, ld a, ldh, ld a and the ldh that sent the byte
+        self.assertEqual(4 + 16 + 8 + 12 + 8 + 12, self.core.cycles)
+        self.assertEqual(0x150 + 8, int(self.core.cpu.registers.pc))
+
+    def test_write_records_result(self):
+        serial = self.core.serial
+        serial.conditions = [serialport.contains('P', 'passed')]
+        self.mmu.write_byte(0xff01, ord('P'))
+        self.mmu.write_byte(0xff02, 0x81)
+        self.assertEqual('passed', serial.result)
+        serial.reset()
+        self.assertIsNone(serial.result)
+
+    def test_timeout(self):
+        self.load(print_rom('running'))
+        self.assertIsNone(conformance.run(self.core, 2))
+        self.assertEqual(2, self.core.gpu.frame)
+
+    def test_magic_breakpoint(self):
+        self.load(RomBuilder().code("""
+            main:   ld b, b
+                    ld b, 3
+                    ld c, 5
+                    ld d, 8
+                    ld e, 13
+                    ld h, 21
+                    ld l, 34
+                    ld b, b
+            done:   jr done
+        """))
+        opcodes = self.core.cpu.opcodes
+        self.assertEqual('passed', conformance.run(self.core, 10, conditions=()))
+        self.assertIs(self.core.cpu.opcodes[0x40], opcodes[0x40])
+        # stopped after the second ld b, b, its cycles counted
+        self.assertEqual(4 + 16 + 4 + 6 * 8 + 4, self.core.cycles)
+
+    def test_magic_failure(self):
+        self.load(RomBuilder().code("""
+            main:   ld a, $42
+                    ld b, a
+                    ld c, a
+                    ld d, a
+                    ld e, a
+                    ld h, a
+                    ld l, a
+                    ld b, b
+            done:   jr done
+        """))
+        self.assertEqual('failed', conformance.run(self.core, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
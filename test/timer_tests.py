@@ -0,0 +1,132 @@
+import unittest
+import interrupts
+from assembler import RomBuilder
+from core import Core
+
+
+class TestTimer(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        self.mmu = self.core.mmu
+
+    def at(self, cycles):
+        self.core.scheduler.advance(cycles - self.core.cycles)
+
+    def test_div(self):
+        self.at(0x1234)
+        self.assertEqual(0x12, self.mmu.read_byte(0xff04))
+        self.mmu.write_byte(0xff04, 0x99)
+        self.assertEqual(0, self.mmu.read_byte(0xff04))
+        self.at(0x1234 + 0x300)
+        self.assertEqual(0x03, self.mmu.read_byte(0xff04))
+
+    def test_tima_counts_when_enabled(self):
+        self.at(1000)
+        self.assertEqual(0, self.mmu.read_byte(0xff05))
+        self.mmu.write_byte(0xff07, 0x05)  # 16 cycles
+        self.assertEqual(0xfd, self.mmu.read_byte(0xff07))
+        # counter increments on multiples of 16 after the enable
+        self.at(1000 + 8)
+        self.assertEqual(1, self.mmu.read_byte(0xff05))
+        self.at(1000 + 8 + 16 * 10)
+        self.assertEqual(11, self.mmu.read_byte(0xff05))
+        self.mmu.write_byte(0xff07, 0x01)
+        self.at(5000)
+        self.assertEqual(11, self.mmu.read_byte(0xff05))
+
+    def test_overflow_reloads_and_requests(self):
+        self.mmu.write_byte(0xff06, 0xf0)
+        self.mmu.write_byte(0xff05, 0xfe)
+        self.mmu.write_byte(0xff07, 0x04)  # 1024 cycles
+        self.at(1023)
+        self.assertEqual(0xfe, self.mmu.read_byte(0xff05))
+        self.assertEqual(0xe0, self.mmu.read_byte(0xff0f))
+        self.at(2048)
+        self.assertEqual(0xf0, self.mmu.read_byte(0xff05))
+        self.assertEqual(0xe0 | interrupts.TIMER, self.mmu.read_byte(0xff0f))
+        self.at(2048 + 1024 * 5)
+        self.assertEqual(0xf5, self.mmu.read_byte(0xff05))
+
+    def test_write_tima_reschedules(self):
+        self.mmu.write_byte(0xff07, 0x05)
+        self.at(100)
+        self.mmu.write_byte(0xff05, 0xff)
+        self.at(111)
+        self.assertEqual(0, self.mmu.read_byte(0xff0f) & interrupts.TIMER)
+        self.at(112)
+        self.assertEqual(interrupts.TIMER, self.mmu.read_byte(0xff0f) & interrupts.TIMER)
+
+    def test_timer_interrupt_wakes_halt(self):
+        builder = RomBuilder().code("""
+                    inc b
+                    reti
+        """, origin=0x50).code("""
+            main:   ld a, $04
+                    ld ($ffff), a
+                    ld a, $fc
+                    ldh ($05), a
+                    ldh ($06), a
+                    ld a, $05
+                    ldh ($07), a
+                    ld b, 0
+                    ei
+            wait:   halt
+                    ld a, b
+                    cp 3
+                    jr nz, wait
+            done:   jr done
+        """)
+        self.mmu.rom = list(builder.build())
+        steps = 0
+        while int(self.core.cpu.registers.pc) != builder.labels['done']:
+            self.core.step()
+            steps += 1
+            self.assertLess(steps, 2000)
+        self.assertEqual(3, self.core.cpu.registers.b)
+        self.assertTrue(self.core.cpu.interrupts)
+        self.assertFalse(self.core.cpu.halted)
+        # three overflows of four increments of 16 cycles, plus the set up
+        self.assertLess(self.core.cycles, 4 * 16 * 3 + 200)
+
+    def run_ei(self, between):
+        # the timer interrupt is pending before EI and taken as soon as IME
+        # is set, the handler stores B and stops
+        builder = RomBuilder().code("""
+                    ld a, b
+                    ld ($c000), a
+            done:   jr done
+        """, origin=0x50).code("""
+            main:   ld a, $04
+                    ldh ($ff), a
+                    ldh ($0f), a
+                    ld b, 0
+                    ei
+                    %s
+                    inc b
+                    inc b
+                    inc b
+            end:    jr end
+        """ % between)
+        self.mmu.rom = list(builder.build())
+        steps = 0
+        while int(self.core.cpu.registers.pc) not in (builder.labels['done'],
+                                                      builder.labels['end']):
+            self.core.step()
+            steps += 1
+            self.assertLess(steps, 100)
+        return int(self.core.cpu.registers.pc) == builder.labels['done']
+
+    def test_ei_delay(self):
+        self.assertTrue(self.run_ei('inc b'))
+        # exactly the instruction after EI ran before the vector
+        self.assertEqual(1, self.mmu.read_byte(0xc000))
+        self.assertFalse(self.core.cpu.interrupts)
+
+    def test_di_after_ei(self):
+        self.assertFalse(self.run_ei('di'))
+        self.assertFalse(self.core.cpu.interrupts)
+        self.assertEqual(3, self.core.cpu.registers.b)
+
+
+if __name__ == '__main__':
+    unittest.main()
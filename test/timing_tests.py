@@ -0,0 +1,66 @@
+import unittest
+import opcodes
+from core import Core
+
+
+class TestOpcodeTable(unittest.TestCase):
+    def test_table(self):
+        self.assertEqual(256, len(opcodes.TABLE))
+        self.assertEqual('Z0HC', opcodes.TABLE[0x80].flags)
+        self.assertEqual(('A', '(a16)'), opcodes.TABLE[0xfa].operands)
+        self.assertEqual((3, 12, 24), (opcodes.TABLE[0xc4].length,
+                                       opcodes.TABLE[0xc4].cycles,
+                                       opcodes.TABLE[0xc4].branch_cycles))
+        self.assertEqual((2, 16, 'Z00C'), (opcodes.CB_TABLE[0x16].length,
+                                           opcodes.CB_TABLE[0x16].cycles,
+                                           opcodes.CB_TABLE[0x16].flags))
+        self.assertTrue(opcodes.TABLE[0xd3].illegal)
+
+
+class TestHandlerTiming(unittest.TestCase):
+    def execute(self, code, flag):
+        core = Core()
+        core.mmu.rom = [0] * 0x8000
+        registers = core.cpu.registers
+        registers.pc = 0xc000
+        registers.h, registers.l = 0xc1, 0x00
+        registers.zero_flag = registers.sub_flag = flag
+        registers.hc_flag = registers.carry_flag = flag
+        for i, value in enumerate(code):
+            core.mmu.write_byte(0xc000 + i, value)
+        return core.cpu.cycle()
+
+    def expected(self, op, flag):
+        opcode = opcodes.TABLE[op]
+        if opcode.cycles == opcode.branch_cycles:
+            return opcode.cycles
+        # bit 3 picks the condition: clear for NZ/NC, set for Z/C
+        taken = flag if op & 0x08 else not flag
+        return opcode.branch_cycles if taken else opcode.cycles
+
+    def test_base_opcodes(self):
+        for op in range(256):
+            if op == 0xcb:
+                continue
+            for flag in (0, 1):
+                self.assertEqual(self.expected(op, flag),
+                                 self.execute([op, 0x10, 0xc0], flag),
+                                 '%02x %s flags=%d' % (op, opcodes.OPCODES[op], flag))
+
+    def test_cb_opcodes(self):
+        for op in range(256):
+            self.assertEqual(opcodes.CB_CYCLES[op], self.execute([0xcb, op], 0),
+                             'cb %02x %s' % (op, opcodes.CB_OPCODES[op]))
+
+    def test_illegal_opcode_locks_up(self):
+        core = Core()
+        core.mmu.rom = [0] * 0x8000
+        core.cpu.registers.pc = 0xc000
+        core.mmu.write_byte(0xc000, 0xd3)
+        for _ in range(3):
+            self.assertEqual(4, core.cpu.cycle())
+        self.assertEqual(0xc000, core.cpu.registers.pc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+import tracediff
+import tracer
+from assembler import RomBuilder
+from core import Core
+
+SOURCE = """
+    main:   ld b, 5
+    loop:   inc c
+            dec b
+            jr nz, loop
+    done:   jr done
+"""
+
+
+class TestTraceDiff(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'reference.log')
+        reference = self.core()
+        self.lines = []
+        for _ in range(20):
+            self.lines.append(tracer.format_doctor(
+                tracer.snapshot(reference.cpu)))
+            reference.step()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def core(self):
+        emulator = Core()
+        emulator.mmu.rom = list(RomBuilder().code(SOURCE).build())
+        return emulator
+
+    def write(self, lines):
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def test_parse_line(self):
+        fields = tracediff.parse_line(self.lines[0])
+        self.assertEqual('0100', fields['PC'])
+        self.assertEqual('00,C3,50,01', fields['PCMEM'])
+
+    def test_whole_log_matches(self):
+        self.write(self.lines)
+        self.assertEqual((20, None), tracediff.diff(self.core(), self.path))
+        self.assertEqual((5, None),
+                         tracediff.diff(self.core(), self.path, max_lines=5))
+
+    def test_divergence(self):
+        # register C counted one too high from the ninth line on
+        lines = list(self.lines)
+        for i in range(8, len(lines)):
+            fields = tracediff.parse_line(lines[i])
+            lines[i] = lines[i].replace('C:%s' % fields['C'],
+                                        'C:%02X' % (int(fields['C'], 16) + 1))
+        self.write(lines)
+        matched, divergence = tracediff.diff(self.core(), self.path, context=3)
+        self.assertEqual(8, matched)
+        self.assertEqual(9, divergence.line_number)
+        self.assertEqual(lines[8], divergence.reference)
+        self.assertEqual(self.lines[8], divergence.ours)
+        self.assertEqual(['C'], divergence.fields())
+        self.assertEqual(lines[5:8], divergence.context)
+        self.assertIn('Diverged at line 9', str(divergence))
+
+    def test_crash(self):
+        self.write(self.lines)
+        emulator = self.core()
+
+        def crash():
+            raise RuntimeError("crash")
+        emulator.cpu.opcodes[0x05] = crash
+        matched, divergence = tracediff.diff(emulator, self.path, context=2)
+        # nop, jp, ld b, inc c match, then dec b raises
+        self.assertEqual(5, matched)
+        self.assertEqual(5, divergence.line_number)
+        self.assertEqual(self.lines[4], divergence.reference)
+        self.assertEqual(self.lines[4], divergence.ours)
+        self.assertIn('PCMEM:05', divergence.reference)
+        self.assertEqual(self.lines[2:4], divergence.context)
+        self.assertEqual([], divergence.fields())
+        text = str(divergence)
+        self.assertIn('Crashed at line 5', text)
+        self.assertIn('Crashed:  %s' % self.lines[4], text)
+        self.assertNotIn('Expected', text)
+
+    def test_stub_ly(self):
+        emulator = self.core()
+        tracediff.stub_ly(emulator)
+        self.assertEqual(0x90, emulator.mmu.read_byte(0xff44))
+
+
+if __name__ == '__main__':
+    unittest.main()
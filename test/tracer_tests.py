@@ -0,0 +1,109 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import tracer
+from assembler import RomBuilder
+from core import Core
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.core = Core()
+        builder = RomBuilder()
+        builder.code("""
+            main:   ld a, 1
+                    ldh ($ff), a   ; v-blank interrupt only
+                    ei
+            loop:   inc b
+                    jr loop
+        """)
+        builder.code('reti', origin=0x40)
+        self.core.mmu.rom = list(builder.build())
+        self.tracer = tracer.Tracer(self.core.cpu, self.core.scheduler, 4)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def steps(self, count):
+        for _ in range(count):
+            self.core.step()
+
+    def test_ring_keeps_last(self):
+        with self.tracer:
+            self.steps(3)
+            self.assertEqual([0x100, 0x101, 0x150],
+                             [r[1] for r in self.tracer.records()])
+            self.steps(6)
+        records = self.tracer.records()
+        self.assertEqual(4, len(records))
+        # inc b, jr loop, inc b, jr loop with b counting up
+        self.assertEqual([0x155, 0x156, 0x155, 0x156], [r[1] for r in records])
+        self.assertEqual([0x04, 0x18, 0x04, 0x18],
+                         [r[2] & 0xff for r in records])
+        self.assertEqual([0, 1, 1, 2], [r[4] >> 8 for r in records])
+
+    def test_cycles_from_scheduler(self):
+        self.steps(2)
+        start = self.core.cycles
+        self.tracer.enable()
+        self.steps(3)
+        self.assertEqual([start, start + 8, start + 20],
+                         [r[0] for r in self.tracer.records()[:3]])
+        # the v-blank dispatch shows up as a gap before the vector
+        while self.core.cpu.registers.pc != 0x40:
+            self.core.step()
+        self.core.step()
+        before, vector = self.tracer.records()[-2:]
+        self.assertEqual(0x40, vector[1])
+        taken = 4 if before[2] & 0xff == 0x04 else 12
+        self.assertEqual(taken + 20, vector[0] - before[0])
+        self.tracer.disable()
+
+    def test_doctor_format(self):
+        with self.tracer:
+            self.steps(1)
+        f = io.StringIO()
+        self.tracer.dump_text(f)
+        self.assertEqual('A:01 F:B0 B:00 C:13 D:00 E:D8 H:01 L:4D '
+                         'SP:FFFE PC:0100 PCMEM:00,C3,50,01\n', f.getvalue())
+
+    def test_dumps(self):
+        with self.tracer:
+            self.steps(6)
+        binary = os.path.join(self.dir, 'trace.bin')
+        text = os.path.join(self.dir, 'trace.log')
+        self.tracer.dump(binary)
+        self.tracer.dump(text)
+        self.assertEqual(self.tracer.records(), tracer.load_binary(binary))
+        with open(text) as f:
+            lines = f.read().splitlines()
+        self.assertEqual([tracer.format_doctor(r)
+                          for r in self.tracer.records()], lines)
+
+    def test_crash_dump(self):
+        path = os.path.join(self.dir, 'crash.log')
+        self.tracer.crash_path = path
+
+        def crash():
+            raise RuntimeError("crash")
+        self.core.cpu.opcodes[0x04] = crash
+        with self.tracer:
+            with self.assertRaises(RuntimeError):
+                self.steps(10)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertIn('PC:0155 PCMEM:04,18', lines[-1])
+
+    def test_disable_restores_cycle(self):
+        self.tracer.enable()
+        self.assertIn('cycle', self.core.cpu.__dict__)
+        self.tracer.disable()
+        self.assertNotIn('cycle', self.core.cpu.__dict__)
+
+
+if __name__ == '__main__':
+    unittest.main()
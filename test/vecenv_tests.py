@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import joypad
+from assembler import RomBuilder
+from vecenv import VecEnv
+
+
+def held_buttons(emulator):
+    """
+    Reward of the buttons held, crashing the instance on START.
+    """
+    if emulator.joypad.buttons & joypad.START:
+        raise RuntimeError("crash")
+    return emulator.joypad.buttons
+
+
+class TestVecEnv(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rom = os.path.join(self.dir, 'dark.gb')
+        # every background colour drawn black
+        RomBuilder().code("""
+            main:   ld a, $ff
+                    ldh ($47), a
+            loop:   jr loop
+        """).save(self.rom)
+        self.env = VecEnv(self.rom, 4, workers=2, frameskip=2,
+                          reward_fn=held_buttons)
+
+    def tearDown(self):
+        self.env.close()
+        shutil.rmtree(self.dir)
+
+    def test_step_before_reset(self):
+        observations, rewards, dones, infos = self.env.step([0] * 4)
+        self.assertFalse(dones.any())
+        self.assertListEqual([2] * 4, [info['frame'] for info in infos])
+        self.assertTrue((observations == 3).all())
+
+    def test_reset_and_step(self):
+        for _ in range(3):
+            observations = self.env.reset()
+            self.assertEqual((4, 144, 160), observations.shape)
+            self.assertTrue((observations == 0).all())
+            observations, rewards, dones, infos = self.env.step(
+                [0, joypad.A, joypad.B, joypad.UP])
+            self.assertListEqual([0, joypad.A, joypad.B, joypad.UP],
+                                 rewards.tolist())
+            self.assertTrue((observations == 3).all())
+            self.assertListEqual([2] * 4, [info['frame'] for info in infos])
+
+    def test_auto_reset(self):
+        self.env.reset()
+        for _ in range(2):
+            observations, rewards, dones, infos = self.env.step(
+                [0, 0, joypad.START, 0])
+            self.assertListEqual([False, False, True, False], dones.tolist())
+            self.assertIn('RuntimeError', infos[2]['error'])
+            self.assertNotIn('error', infos[1])
+            # the crashed instance starts over with a blank frame
+            self.assertTrue((observations[2] == 0).all())
+            self.assertTrue((observations[3] == 3).all())
+        observations, rewards, dones, infos = self.env.step([0] * 4)
+        self.assertFalse(dones.any())
+        self.assertListEqual([6, 6, 2, 6], [info['frame'] for info in infos])
+
+    def test_bad_actions(self):
+        with self.assertRaises(ValueError):
+            self.env.step([0] * 3)
+
+    def test_close(self):
+        self.env.reset()
+        self.env.reset()
+        self.env.step([joypad.START] * 4)
+        self.env.close()
+        self.assertListEqual([0, 0], [p.exitcode for p in self.env._processes])
+        self.env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Timer for the GameBoy emulator, DIV, TIMA, TMA and TAC (0xFF04-0xFF07).
+
+DIV is the upper byte of a 16 bit counter that runs at the cpu clock and
+TIMA counts up each time the counter passes a multiple of the period picked
+by TAC. Neither is counted: both are worked out from the scheduler's cycle
+counter when read. The only thing that has to happen at a given cycle is
+TIMA overflowing, which reloads it from TMA and requests the timer
+interrupt, so that is scheduled as a single event and moved whenever TIMA,
+TMA, TAC or DIV are written.
+"""
+__author__ = 'Clayton Powell'
+import interrupts
+
+# cycles between TIMA increments for TAC bits 0-1
+PERIODS = (1024, 16, 64, 256)
+ENABLE = 0x04
+
+
+class Timer(object):
+    """
+    Timer class that provides the timer registers to the mmu.
+
+    Parameters
+    ----------
+    mmu : mmu.MMU
+        mmu the registers are mapped into
+    scheduler : scheduler.Scheduler
+        cycle counter and scheduler for the overflow event
+    irq : interrupts.Interrupts
+        interrupt controller the timer interrupt is requested from
+    """
+
+    def __init__(self, mmu, scheduler, irq):
+        self.scheduler = scheduler
+        self.irq = irq
+        # cycle the divider counter was last reset at
+        self.origin = 0
+        # TIMA as it was at cycle self.since
+        self.tima = 0
+        self.since = 0
+        self.tma = 0
+        self.tac = 0
+        self._event = None
+        for addr, read, write in ((0xff04, self.read_div, self.write_div),
+                                  (0xff05, self.read_tima, self.write_tima),
+                                  (0xff06, self.read_tma, self.write_tma),
+                                  (0xff07, self.read_tac, self.write_tac)):
+            mmu.io_read[addr] = read
+            mmu.io_write[addr] = write
+
+    def read_div(self):
+        return ((self.scheduler.now - self.origin) >> 8) & 0xff
+
+    def read_tima(self):
+        if not self.tac & ENABLE:
+            return self.tima
+        period = PERIODS[self.tac & 3]
+        value = self.tima + ((self.scheduler.now - self.origin) // period -
+                             (self.since - self.origin) // period)
+        if value > 0xff:
+            # overflowed during the current instruction, the overflow event
+            # runs once it is finished
+            value = self.tma + (value - 0x100) % (0x100 - self.tma)
+        return value
+
+    def read_tma(self):
+        return self.tma
+
+    def read_tac(self):
+        return 0xf8 | self.tac
+
+    def write_div(self, value):
+        # any write resets the counter
+        self._sync()
+        self.origin = self.scheduler.now
+        self._schedule()
+
+    def write_tima(self, value):
+        self._sync()
+        self.tima = value
+        self._schedule()
+
+    def write_tma(self, value):
+        self._sync()
+        self.tma = value
+        self._schedule()
+
+    def write_tac(self, value):
+        self._sync()
+        self.tac = value & 0x07
+        self._schedule()
+
+    def _sync(self):
+        """
+        Brings TIMA up to date before a register it depends on changes.
+        """
+        now = self.scheduler.now
+        event = self._event
+        if event is not None and event[0] <= now:
+            # due during the current instruction, do not lose the interrupt
+            self.scheduler.cancel(event)
+            self._overflow(event[0])
+        self.tima = self.read_tima()
+        self.since = now
+
+    def _schedule(self):
+        """
+        Schedules the next overflow, if the timer is running.
+        """
+        self.scheduler.cancel(self._event)
+        self._event = None
+        if not self.tac & ENABLE:
+            return
+        period = PERIODS[self.tac & 3]
+        increments = (self.since - self.origin) // period + 0x100 - self.tima
+        self._event = self.scheduler.schedule(self.origin + increments * period,
+                                              self._overflow)
+
+    def _overflow(self, when):
+        self.tima = self.tma
+        self.since = when
+        self.irq.request(interrupts.TIMER)
+        self._schedule()
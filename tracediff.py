@@ -0,0 +1,190 @@
+"""
+Streaming trace diff against reference logs.
+
+Runs a ROM on the headless core and compares the register state before
+every instruction with the matching line of a reference log in the Gameboy
+Doctor format (A:01 F:B0 B:00 C:13 ... SP:FFFE PC:0100 PCMEM:00,C3,13,02),
+as written by other emulators or by tracer.Tracer. The log is memory mapped
+and read one line at a time, so logs of many gigabytes never have to fit in
+memory. The run stops at the first divergence and reports it with the
+preceding instructions as context.
+
+    python tracediff.py rom.gb reference.log --context 20 --stub-ly
+"""
+__author__ = 'Clayton Powell'
+import argparse
+import collections
+import mmap
+import re
+import sys
+import core
+import tracer
+
+FIELD = re.compile(r'([A-Z]+):([0-9A-Fa-f,]+)')
+
+
+def parse_line(line):
+    """
+    Splits a log line into its fields.
+
+    Parameters
+    ----------
+    line : String
+        Gameboy Doctor style log line
+
+    Returns
+    -------
+    dict
+        field name to upper case value, e.g. {'A': '01', 'PC': '0100'}
+    """
+    return dict((name, value.upper()) for name, value in FIELD.findall(line))
+
+
+def iter_lines(path):
+    """
+    Yields the lines of a file through a read only memory map.
+
+    Parameters
+    ----------
+    path : String
+        Path on system of the log
+
+    Returns
+    -------
+    generator of String
+        lines without line endings, blank lines skipped
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pos = 0
+            size = len(mm)
+            while pos < size:
+                end = mm.find(b'\n', pos)
+                if end < 0:
+                    end = size
+                line = mm[pos:end].strip()
+                pos = end + 1
+                if line:
+                    yield line.decode('ascii', 'replace')
+        finally:
+            mm.close()
+
+
+class Divergence(object):
+    """
+    Divergence class describing where the run stopped matching the log.
+
+    For a crash, line_number is the line of the instruction that raised,
+    which matched the log before it ran, and error describes the exception.
+    """
+
+    def __init__(self, line_number, ours, reference, context, error=None):
+        self.line_number = line_number
+        self.ours = ours
+        self.reference = reference
+        self.context = context
+        self.error = error
+
+    def fields(self):
+        """
+        Names of the fields that differ, none for a crash.
+        """
+        if self.error:
+            return []
+        ours = parse_line(self.ours)
+        reference = parse_line(self.reference)
+        return [name for name in reference
+                if name in ours and ours[name] != reference[name]]
+
+    def __str__(self):
+        if self.error:
+            lines = ['Crashed at line %d: %s' % (self.line_number, self.error)]
+        else:
+            lines = ['Diverged at line %d' % self.line_number]
+        lines.append('Context (matched):')
+        lines.extend('  %s' % line for line in self.context)
+        if self.error:
+            lines.append('Crashed:  %s' % self.reference)
+        else:
+            lines.append('Expected: %s' % self.reference)
+            lines.append('Got:      %s' % self.ours)
+            lines.append('Fields:   %s' % ', '.join(self.fields()))
+        return '\n'.join(lines)
+
+
+def diff(emulator, reference_path, context=10, max_lines=None):
+    """
+    Steps the core against the reference log until they disagree.
+
+    Parameters
+    ----------
+    emulator : core.Core
+        core with the ROM loaded, in the state of the first log line
+    reference_path : String
+        Path on system of the reference log
+    context : int
+        matched lines to keep for the report
+    max_lines : int
+        stop after comparing this many lines
+
+    Returns
+    -------
+    tuple
+        number of lines that matched and a Divergence, or None if the whole
+        log (or max_lines of it) matched
+    """
+    history = collections.deque(maxlen=context)
+    matched = 0
+    for line_number, reference in enumerate(iter_lines(reference_path), 1):
+        if max_lines is not None and matched >= max_lines:
+            break
+        ours = tracer.format_doctor(tracer.snapshot(emulator.cpu))
+        expected = parse_line(reference)
+        got = parse_line(ours)
+        if any(got.get(name, value) != value for name, value in expected.items()):
+            return matched, Divergence(line_number, ours, reference,
+                                       list(history))
+        matched += 1
+        try:
+            emulator.step()
+        except (Exception, SystemExit) as e:
+            # the state matched, running the instruction is what failed
+            return matched, Divergence(line_number, ours, reference,
+                                       list(history), repr(e))
+        history.append(reference)
+    return matched, None
+
+
+def stub_ly(emulator, value=0x90):
+    """
+    Pins LY to a fixed value, as Gameboy Doctor logs expect.
+    """
+    emulator.mmu.io_read[0xff44] = lambda: value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rom", type=str, metavar='FILE',
+                        help="File path to the GameBoy Rom you wish to run.")
+    parser.add_argument("reference", type=str, metavar='LOG',
+                        help="Reference log to compare against.")
+    parser.add_argument("--context", type=int, default=10,
+                        help="Matched lines shown before a divergence.")
+    parser.add_argument("--max-lines", type=int, default=None,
+                        help="Stop after this many lines.")
+    parser.add_argument("--stub-ly", action='store_true',
+                        help="Pin LY to 0x90 like Gameboy Doctor logs expect.")
+    args = parser.parse_args()
+    emulator = core.Core()
+    emulator.load_rom(args.rom)
+    if args.stub_ly:
+        stub_ly(emulator)
+    matched, divergence = diff(emulator, args.reference, args.context,
+                               args.max_lines)
+    print("Matched %d lines" % matched)
+    if divergence is not None:
+        print(divergence)
+        sys.exit(1)
@@ -0,0 +1,242 @@
+"""
+Instruction trace ring buffer for the GameBoy emulator.
+
+While enabled, the state before every instruction (the scheduler's cycle
+counter, PC, the four bytes at PC, A, F, BC, DE, HL, SP) is written into
+preallocated arrays holding the last N instructions, so tracing allocates
+nothing per instruction. The ring can be dumped on demand or automatically
+when the cpu crashes, either in a compact binary format or as text in the
+Gameboy Doctor log format
+(A:01 F:B0 B:00 C:13 ... SP:FFFE PC:0100 PCMEM:00,C3,13,02) that trace
+diffing tools understand.
+
+Binary format: the HEADER struct followed by `count` RECORD structs, oldest
+first.
+"""
+__author__ = 'Clayton Powell'
+import array
+import struct
+import sys
+
+HEADER = struct.Struct('<4sII')
+MAGIC = b'GBTR'
+VERSION = 1
+# cycle, pc, pcmem, af, bc, de, hl, sp
+RECORD = struct.Struct('<QHIHHHHH')
+
+
+def format_doctor(record):
+    """
+    Formats one trace record as a Gameboy Doctor log line.
+
+    Parameters
+    ----------
+    record : tuple
+        (cycle, pc, pcmem, af, bc, de, hl, sp)
+
+    Returns
+    -------
+    String
+        log line without a newline
+    """
+    cycle, pc, pcmem, af, bc, de, hl, sp = record
+    return ('A:%02X F:%02X B:%02X C:%02X D:%02X E:%02X H:%02X L:%02X '
+            'SP:%04X PC:%04X PCMEM:%02X,%02X,%02X,%02X' %
+            (af >> 8, af & 0xff, bc >> 8, bc & 0xff, de >> 8, de & 0xff,
+             hl >> 8, hl & 0xff, sp, pc, pcmem & 0xff, (pcmem >> 8) & 0xff,
+             (pcmem >> 16) & 0xff, pcmem >> 24))
+
+
+def snapshot(cpu, clock=0):
+    """
+    Captures the state a trace record holds, outside of a Tracer.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to read the state from
+    clock : int
+        cycle count to store in the record
+
+    Returns
+    -------
+    tuple
+        (cycle, pc, pcmem, af, bc, de, hl, sp)
+    """
+    registers = cpu.registers
+    read = cpu.mmu.read_byte
+    pc = int(registers.pc) & 0xffff
+    pcmem = 0
+    for n in range(4):
+        pcmem |= (read((pc + n) & 0xffff) or 0) << (8 * n)
+    return (clock, pc, pcmem,
+            (int(registers.a) & 0xff) << 8 | registers.flags(),
+            (int(registers.b) & 0xff) << 8 | (int(registers.c) & 0xff),
+            (int(registers.d) & 0xff) << 8 | (int(registers.e) & 0xff),
+            (int(registers.h) & 0xff) << 8 | (int(registers.l) & 0xff),
+            int(registers.sp) & 0xffff)
+
+
+def load_binary(path):
+    """
+    Reads a binary trace dump.
+
+    Parameters
+    ----------
+    path : String
+        Path on system of the dump
+
+    Returns
+    -------
+    list of tuple
+        records, oldest first
+    """
+    with open(path, 'rb') as f:
+        magic, version, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a gbpy trace" % path)
+        data = f.read(count * RECORD.size)
+    return [RECORD.unpack_from(data, i * RECORD.size) for i in range(count)]
+
+
+class Tracer(object):
+    """
+    Tracer class that keeps the last `size` instructions a cpu executed.
+
+    While enabled the cpu's cycle method is shadowed by a recording wrapper.
+
+    Parameters
+    ----------
+    cpu : cpu.Cpu
+        cpu to trace
+    scheduler : scheduler.Scheduler
+        scheduler of the core, whose cycle counter is recorded so traces
+        line up with the core's cycles and include interrupt dispatch
+    size : int
+        number of instructions kept
+    crash_path : String
+        if given, the ring is dumped here when an instruction raises or the
+        cpu exits on an unknown opcode. A .bin extension selects the binary
+        format, anything else the text format.
+    """
+
+    def __init__(self, cpu, scheduler, size=4096, crash_path=None):
+        self.cpu = cpu
+        self.scheduler = scheduler
+        self.size = size
+        self.crash_path = crash_path
+        self.cycles = array.array('Q', bytes(8 * size))
+        self.pc = array.array('H', bytes(2 * size))
+        self.pcmem = array.array('L', bytes(array.array('L').itemsize * size))
+        self.af = array.array('H', bytes(2 * size))
+        self.bc = array.array('H', bytes(2 * size))
+        self.de = array.array('H', bytes(2 * size))
+        self.hl = array.array('H', bytes(2 * size))
+        self.sp = array.array('H', bytes(2 * size))
+        self.index = 0
+        self.count = 0
+        self.enabled = False
+
+    def enable(self):
+        """
+        Shadows the cpu cycle method with the recording wrapper.
+        """
+        if self.enabled:
+            return
+        # another wrapper may already shadow cycle, put it back on disable
+        self._shadowed = self.cpu.__dict__.get('cycle')
+        cycle = self.cpu.cycle
+        registers = self.cpu.registers
+        read = self.cpu.mmu.read_byte
+        scheduler = self.scheduler
+        size = self.size
+        cycles, pcs, pcmems = self.cycles, self.pc, self.pcmem
+        afs, bcs, des, hls, sps = self.af, self.bc, self.de, self.hl, self.sp
+
+        def traced_cycle():
+            i = self.index
+            # Register instances wrap on shifts, so convert to int first
+            pc = int(registers.pc) & 0xffff
+            cycles[i] = scheduler.now
+            pcs[i] = pc
+            pcmems[i] = (read(pc) | (read((pc + 1) & 0xffff) or 0) << 8 |
+                         (read((pc + 2) & 0xffff) or 0) << 16 |
+                         (read((pc + 3) & 0xffff) or 0) << 24)
+            afs[i] = (int(registers.a) & 0xff) << 8 | registers.flags()
+            bcs[i] = (int(registers.b) & 0xff) << 8 | (int(registers.c) & 0xff)
+            des[i] = (int(registers.d) & 0xff) << 8 | (int(registers.e) & 0xff)
+            hls[i] = (int(registers.h) & 0xff) << 8 | (int(registers.l) & 0xff)
+            sps[i] = int(registers.sp) & 0xffff
+            self.index = (i + 1) % size
+            if self.count < size:
+                self.count += 1
+            try:
+                return cycle()
+            except BaseException:
+                if self.crash_path:
+                    self.dump(self.crash_path)
+                raise
+        self.cpu.cycle = traced_cycle
+        self.enabled = True
+
+    def disable(self):
+        """
+        Removes the recording wrapper. The ring is kept.
+        """
+        if not self.enabled:
+            return
+        if self._shadowed is None:
+            del self.cpu.cycle
+        else:
+            self.cpu.cycle = self._shadowed
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def records(self):
+        """
+        Recorded instructions, oldest first.
+
+        Returns
+        -------
+        list of tuple
+            (cycle, pc, pcmem, af, bc, de, hl, sp) per instruction
+        """
+        start = (self.index - self.count) % self.size
+        return [(self.cycles[i], self.pc[i], self.pcmem[i], self.af[i],
+                 self.bc[i], self.de[i], self.hl[i], self.sp[i])
+                for i in ((start + n) % self.size for n in range(self.count))]
+
+    def dump_binary(self, f):
+        """
+        Writes the ring to a binary file opened for writing.
+        """
+        f.write(HEADER.pack(MAGIC, VERSION, self.count))
+        for record in self.records():
+            f.write(RECORD.pack(*record))
+
+    def dump_text(self, f):
+        """
+        Writes the ring as Gameboy Doctor log lines to a text file.
+        """
+        for record in self.records():
+            f.write(format_doctor(record) + '\n')
+
+    def dump(self, path=None):
+        """
+        Writes the ring to path, binary for a .bin extension and text
+        otherwise, or as text to stdout if no path is given.
+        """
+        if path is None:
+            self.dump_text(sys.stdout)
+        elif path.endswith('.bin'):
+            with open(path, 'wb') as f:
+                self.dump_binary(f)
+        else:
+            with open(path, 'w') as f:
+                self.dump_text(f)
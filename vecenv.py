@@ -0,0 +1,198 @@
+"""
+Vectorized multi-instance environment for reinforcement learning.
+
+Steps N headless cores in lockstep, split over a number of worker processes.
+Every core's gpu draws straight into its own slice of one shared memory
+block, which the trainer sees as a NumPy array of shape (N, 144, 160) holding
+shade indices 0-3. Observations are therefore never pickled or copied
+between processes.
+
+Each step takes one joypad button mask per instance, holds it for
+`frameskip` frames and returns once every instance is done. Instances are
+powered on when the workers start, so reset is only needed to start over.
+"""
+__author__ = 'Clayton Powell'
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import core
+import gpu
+
+FRAME_SIZE = gpu.WIDTH * gpu.HEIGHT
+
+
+def _worker(conn, shm_name, rom_path, first, count, frameskip, reward_fn):
+    """
+    Worker process loop owning instances first to first + count.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # one view per instance for the life of the worker, every core drawing
+    # into that slot reuses it so there is exactly one view to release
+    views = [shm.buf[(first + i) * FRAME_SIZE:(first + i + 1) * FRAME_SIZE]
+             for i in range(count)]
+    cores = [None] * count
+
+    def reset(i):
+        emulator = core.Core()
+        emulator.gpu.framebuffer = views[i]
+        views[i][:] = bytes(FRAME_SIZE)
+        emulator.load_rom(rom_path)
+        cores[i] = emulator
+
+    try:
+        # ready to step straight away, reset only restarts the instances
+        for i in range(count):
+            reset(i)
+        while True:
+            command, data = conn.recv()
+            if command == 'reset':
+                for i in range(count):
+                    reset(i)
+                conn.send(None)
+            elif command == 'step':
+                rewards = [0.0] * count
+                dones = [False] * count
+                infos = [None] * count
+                for i, emulator in enumerate(cores):
+                    emulator.joypad.set_state(data[i])
+                    info = {}
+                    try:
+                        emulator.run_frames(frameskip)
+                        if reward_fn is not None:
+                            rewards[i] = reward_fn(emulator)
+                    except (Exception, SystemExit) as e:
+                        # A crashed instance ends its episode and starts over
+                        info['error'] = repr(e)
+                        dones[i] = True
+                    info['frame'] = emulator.gpu.frame
+                    info['cycles'] = emulator.cycles
+                    infos[i] = info
+                    if dones[i]:
+                        reset(i)
+                conn.send((rewards, dones, infos))
+            elif command == 'close':
+                break
+    finally:
+        # memoryviews into the block must go before it can be closed
+        cores = None
+        for view in views:
+            view.release()
+        shm.close()
+        conn.close()
+
+
+class VecEnv(object):
+    """
+    VecEnv class that runs num_envs emulator instances over worker processes.
+
+    Parameters
+    ----------
+    rom_path : String
+        Path on system of the ROM every instance runs
+    num_envs : int
+        number of emulator instances
+    workers : int
+        number of worker processes, defaults to the number of cpus
+    frameskip : int
+        frames each action is held for per step
+    reward_fn : callable
+        optional picklable function of a core returning the step reward
+    """
+
+    def __init__(self, rom_path, num_envs, workers=None, frameskip=1,
+                 reward_fn=None):
+        self.num_envs = num_envs
+        workers = min(workers or multiprocessing.cpu_count(), num_envs)
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=num_envs * FRAME_SIZE)
+        self.observations = np.ndarray((num_envs, gpu.HEIGHT, gpu.WIDTH),
+                                       dtype=np.uint8, buffer=self._shm.buf)
+        self.observations[:] = 0
+        self._slices = []
+        self._conns = []
+        self._processes = []
+        first = 0
+        for w in range(workers):
+            count = num_envs // workers + (1 if w < num_envs % workers else 0)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child, self._shm.name, rom_path, first, count, frameskip,
+                      reward_fn),
+                daemon=True)
+            process.start()
+            child.close()
+            self._slices.append(slice(first, first + count))
+            self._conns.append(parent)
+            self._processes.append(process)
+            first += count
+        self.closed = False
+
+    def reset(self):
+        """
+        Restarts every instance from power on.
+
+        Returns
+        -------
+        numpy.ndarray
+            observations, shape (num_envs, 144, 160), shared with the workers
+        """
+        for conn in self._conns:
+            conn.send(('reset', None))
+        for conn in self._conns:
+            conn.recv()
+        return self.observations
+
+    def step(self, actions):
+        """
+        Applies one button mask per instance and runs every instance.
+
+        Parameters
+        ----------
+        actions : array like of int
+            num_envs joypad button masks
+
+        Returns
+        -------
+        tuple
+            observations, rewards, dones and a list of info dicts. Instances
+            that crashed are flagged done and have already been reset.
+        """
+        actions = np.asarray(actions, dtype=np.uint8)
+        if actions.shape != (self.num_envs,):
+            raise ValueError("Expected %d actions, got shape %s" %
+                             (self.num_envs, actions.shape))
+        for conn, part in zip(self._conns, self._slices):
+            conn.send(('step', actions[part].tolist()))
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for conn, part in zip(self._conns, self._slices):
+            r, d, i = conn.recv()
+            rewards[part] = r
+            dones[part] = d
+            infos.extend(i)
+        return self.observations, rewards, dones, infos
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory block.
+        """
+        if self.closed:
+            return
+        for conn in self._conns:
+            conn.send(('close', None))
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        del self.observations
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()